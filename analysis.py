@@ -0,0 +1,203 @@
+"""
+CPU-bound catch analysis for the `/analyze/` endpoint.
+
+Everything here is pure: it takes a frame (a dict of NumPy arrays, one entry
+per catch, as built by catch_cache.py) and returns a JSON-ready dict. Every
+analysis type is a handful of vectorised NumPy operations: rows are grouped by
+integer key (a categorical code, an hour, a day number or a bin index) and
+summed with np.bincount. Results match the pandas groupby implementation they
+replace: NaN weights are skipped, empty groups are dropped except for
+water-temperature bins, and keys come out in the same order.
+
+This module is imported by every analysis worker process, so it must not
+import the web app, the database driver or anything else it doesn't need.
+"""
+
+import math
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+ANALYSIS_TYPES = ("bait_success", "time_analysis", "structure_analysis", "lake_analysis",
+                  "date_analysis", "bait_depth_analysis", "water_temp_analysis")
+NUMERIC_COLUMNS = ("water_temp", "boat_depth", "bait_depth", "fish_weight", "line_weight")
+CATEGORICAL_COLUMNS = ("bait", "bait_type", "structure", "lake", "species")
+# Frame columns each analysis type reads, so only those are shipped to a worker process
+FRAME_COLUMNS = {
+    "bait_success": ("fish_weight", "bait_type"),
+    "time_analysis": ("fish_weight", "hour"),
+    "structure_analysis": ("fish_weight", "structure"),
+    "lake_analysis": ("fish_weight", "lake"),
+    "date_analysis": ("fish_weight", "day"),
+    "bait_depth_analysis": ("fish_weight", "bait", "bait_depth"),
+    "water_temp_analysis": ("fish_weight", "water_temp"),
+}
+# Code for a missing category or hour; days before 1970 are negative, so a missing day has its own
+MISSING = -1
+MISSING_DAY = -2 ** 31
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# pd.cut's default label precision
+LABEL_PRECISION = 3
+
+
+def warm_up():
+    """Process pool initializer: import NumPy before the first analysis arrives"""
+    np.bincount(np.zeros(1, dtype=np.int64))
+
+
+def clean_for_json(data):
+    """Clean data for JSON serialization by replacing infinite values and NaN"""
+    if isinstance(data, dict):
+        cleaned = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                cleaned[key] = clean_for_json(value)
+            elif isinstance(value, (int, float)):
+                if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+                    cleaned[key] = None
+                else:
+                    cleaned[key] = value
+            else:
+                cleaned[key] = value
+        return cleaned
+    return data
+
+
+def group_totals(keys: np.ndarray, weights: np.ndarray, groups: int) -> Tuple[np.ndarray, ...]:
+    """Rows, non-NaN weight count, weight sum and mean per group key in [0, groups); keys < 0 are skipped"""
+    present = keys >= 0
+    keys, weights = keys[present], weights[present]
+    rows = np.bincount(keys, minlength=groups)
+    weighed = ~np.isnan(weights)
+    count = np.bincount(keys[weighed], minlength=groups)
+    total = np.bincount(keys[weighed], weights=weights[weighed], minlength=groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    return rows, count, total, mean
+
+
+def _by_category(frame: Dict[str, Any], column: str) -> Dict[Any, Dict[str, Any]]:
+    """groupby(column).agg(total, mean, count).sort_values('total_weight', ascending=False)"""
+    categories = frame["categories"][column]
+    rows, count, total, mean = group_totals(frame[column], frame["fish_weight"], len(categories))
+    present = [code for code in np.flatnonzero(rows)]
+    try:
+        present.sort(key=lambda code: categories[code])
+    except TypeError:
+        present.sort(key=lambda code: str(categories[code]))
+    present.sort(key=lambda code: -total[code])
+    return clean_for_json({
+        categories[code]: {
+            "total_weight": float(total[code]),
+            "average_weight": float(mean[code]),
+            "count": int(count[code]),
+        }
+        for code in present
+    })
+
+
+def _round_frac(x: float, precision: int) -> float:
+    """pd.cut's rounding of bin edges for labels"""
+    if not math.isfinite(x) or x == 0:
+        return x
+    fraction, whole = math.modf(x)
+    digits = -int(math.floor(math.log10(abs(fraction)))) - 1 + precision if whole == 0 else precision
+    return float(np.around(x, digits))
+
+
+def interval_labels(bins) -> list:
+    """The labels pd.cut(bins=bins, include_lowest=True) gives its intervals, e.g. "(11.999, 14.0]" """
+    precision = LABEL_PRECISION
+    for candidate in range(LABEL_PRECISION, 20):
+        if len({_round_frac(edge, candidate) for edge in bins}) == len(bins):
+            precision = candidate
+            break
+    breaks = [_round_frac(edge, precision) for edge in bins]
+    breaks[0] = breaks[0] - 10 ** (-precision)
+    return [f"({float(left)}, {float(right)}]" for left, right in zip(breaks, breaks[1:])]
+
+
+def water_temp_analysis(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """Group catches into 5 equal-width water temperature bins"""
+    temps = frame["water_temp"]
+    valid = np.isfinite(temps)
+    if not valid.any():
+        return {"message": "No valid water temperature data available for analysis."}
+    temps, weights = temps[valid], frame["fish_weight"][valid]
+
+    min_temp, max_temp = float(temps.min()), float(temps.max())
+    if min_temp == max_temp:
+        # If all temperatures are the same, create a single bin
+        bins = [min_temp - 1, max_temp + 1]
+    else:
+        bin_width = (max_temp - min_temp) / 5
+        bins = [min_temp + i * bin_width for i in range(6)]
+
+    # Right-closed bins with the lowest edge included, as pd.cut(include_lowest=True)
+    edges = np.asarray(bins)
+    codes = np.searchsorted(edges, temps, side="left") - 1
+    codes[temps == edges[0]] = 0
+    codes[(codes < 0) | (codes >= len(bins) - 1)] = MISSING
+    _, count, total, mean = group_totals(codes, weights, len(bins) - 1)
+
+    return clean_for_json({
+        label: {
+            "total_weight": float(total[i]),
+            "average_weight": float(mean[i]),
+            "count": int(count[i]),
+        }
+        for i, label in enumerate(interval_labels(bins))
+    })
+
+
+def run_analysis(analysis_type: str, frame: Dict[str, Any], parameter: Optional[str] = None) -> Dict[str, Any]:
+    """Run one analysis type over a frame from catch_cache"""
+    if analysis_type in ("bait_success", "structure_analysis", "lake_analysis"):
+        column = {"bait_success": "bait_type", "structure_analysis": "structure", "lake_analysis": "lake"}
+        return _by_category(frame, column[analysis_type])
+
+    elif analysis_type == "time_analysis":
+        rows, count, _, mean = group_totals(frame["hour"].astype(np.int64), frame["fish_weight"], 24)
+        return clean_for_json({
+            int(hour): {"average_weight": float(mean[hour]), "count": int(count[hour])}
+            for hour in np.flatnonzero(rows)
+        })
+
+    elif analysis_type == "date_analysis":
+        days = frame["day"]
+        present = days != MISSING_DAY
+        unique_days, codes = np.unique(days[present], return_inverse=True)
+        rows, count, total, _ = group_totals(codes, frame["fish_weight"][present], len(unique_days))
+        labels = unique_days.astype("datetime64[D]").astype(str)
+        return clean_for_json({
+            str(label): {
+                "total_weight": float(total[i]),
+                "count": int(count[i]),
+            }
+            for i, label in enumerate(labels)
+        })
+
+    elif analysis_type == "bait_depth_analysis":
+        depths, weights = frame["bait_depth"], frame["fish_weight"]
+        if parameter:
+            categories = frame["categories"]["bait"]
+            code = categories.index(parameter) if parameter in categories else None
+            selected = frame["bait"] == code if code is not None else np.zeros(len(depths), dtype=bool)
+            depths, weights = depths[selected], weights[selected]
+        present = ~np.isnan(depths)
+        unique_depths, codes = np.unique(depths[present], return_inverse=True)
+        _, count, total, mean = group_totals(codes, weights[present], len(unique_depths))
+        return clean_for_json({
+            float(depth): {
+                "total_weight": float(total[i]),
+                "average_weight": float(mean[i]),
+                "count": int(count[i]),
+            }
+            for i, depth in enumerate(unique_depths)
+        })
+
+    elif analysis_type == "water_temp_analysis":
+        return water_temp_analysis(frame)
+
+    raise ValueError(f"Unknown analysis type: {analysis_type}")
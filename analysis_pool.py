@@ -0,0 +1,115 @@
+"""
+Process pool for CPU-bound analysis, with timeouts and cancellation.
+
+Each uvicorn worker owns a pool of ANALYSIS_WORKERS spawned processes (spawn,
+not fork: the parent has Motor and logging threads running). Work is shipped
+as column arrays, not whole documents. The pool is created on first use, and
+shut down from the app lifespan.
+
+A pending job is dropped when its caller gives up: on a per-request timeout
+(ANALYSIS_TIMEOUT_SECONDS, answered with 504), when the client disconnects,
+or when the last single-flight waiter leaves. A job already running in a
+worker process can't be interrupted; it finishes and its result is
+discarded, and the pool size bounds how much of that can pile up.
+
+ANALYSIS_WORKERS=0 runs analysis inline on the event loop, as before the pool
+existed; useful on hosts that can't afford the extra processes.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+import analysis
+import metrics
+
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", str(min(2, os.cpu_count() or 1))))
+ANALYSIS_TIMEOUT_SECONDS = float(os.environ.get("ANALYSIS_TIMEOUT_SECONDS", "30"))
+# How often a waiting request checks whether its client has gone away
+DISCONNECT_POLL_SECONDS = 0.5
+
+ANALYSIS_DURATION = metrics.REGISTRY.histogram(
+    "analysis_duration_seconds", "Time to run one analysis job, including queueing for a worker process",
+    ("analysis_type",))
+ANALYSIS_ABANDONED = metrics.REGISTRY.counter(
+    "analysis_abandoned_total", "Analysis requests given up before finishing, by reason "
+    "(timeout or disconnect)", ("route", "reason"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=analysis.warm_up,
+        )
+    return _pool
+
+
+async def warm_up():
+    """Start the worker processes ahead of the first request"""
+    if ANALYSIS_WORKERS == 0:
+        await asyncio.get_running_loop().run_in_executor(None, analysis.warm_up)
+        return
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, analysis.warm_up) for _ in range(ANALYSIS_WORKERS)))
+
+
+async def run(function: Callable[..., Any], *args, label: str = "") -> Any:
+    """Run function(*args) in the pool; cancelling the caller drops the job if it hasn't started"""
+    global _pool
+    started = time.perf_counter()
+    try:
+        if ANALYSIS_WORKERS == 0:
+            return function(*args)
+        pool = _get_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); reap the broken pool and start a fresh one for the
+            # next request, unless a concurrent failure already replaced it
+            pool.shutdown(wait=False, cancel_futures=True)
+            if _pool is pool:
+                _pool = None
+            raise
+    finally:
+        ANALYSIS_DURATION.observe(time.perf_counter() - started, analysis_type=label)
+
+
+async def with_deadline(request, awaitable, route: str, timeout: float = ANALYSIS_TIMEOUT_SECONDS):
+    """Await `awaitable`, cancelling it if it runs past `timeout` or the client disconnects.
+
+    Raises asyncio.TimeoutError on timeout and ConnectionAbortedError on disconnect.
+    """
+    task = asyncio.ensure_future(awaitable)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                ANALYSIS_ABANDONED.inc(route=route, reason="timeout")
+                raise asyncio.TimeoutError()
+            done, _ = await asyncio.wait({task}, timeout=min(remaining, DISCONNECT_POLL_SECONDS))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                ANALYSIS_ABANDONED.inc(route=route, reason="disconnect")
+                raise ConnectionAbortedError()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
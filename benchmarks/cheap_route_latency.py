@@ -0,0 +1,154 @@
+"""
+Cheap-route latency while analysis requests are running.
+
+Starts the API once per analysis mode (ANALYSIS_WORKERS=0 runs analysis inline
+on the event loop; the default runs it in the process pool), then measures
+`GET /auth/me` latency twice: with no other traffic, and while virtual users
+hammer `POST /analyze/` with time_analysis, the most CPU-heavy type. With the
+pool, cheap requests should no longer queue behind the analysis.
+
+    DB_NAME=bite_tracker_bench python benchmarks/cheap_route_latency.py --scale 20x5000 --modes 0,2
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+from datetime import datetime
+from typing import Any, Dict, List
+
+import httpx
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import load_test  # noqa: E402
+import worker_scaling  # noqa: E402
+
+
+async def login(client: httpx.AsyncClient, username: str) -> Dict[str, str]:
+    response = await client.post("/auth/login", json={"username": username, "password": load_test.PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def measure(base_url: str, usernames: List[str], cheap_users: int, heavy_users: int,
+                  duration: float) -> Dict[str, Any]:
+    """Run cheap users (and optionally heavy users) for `duration` seconds"""
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=cheap_users + heavy_users)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        # Heavy users each get their own account so single-flight can't merge their requests
+        cheap_headers = [await login(client, usernames[i % len(usernames)]) for i in range(cheap_users)]
+        heavy_headers = [await login(client, usernames[i % len(usernames)]) for i in range(heavy_users)]
+        deadline = time.perf_counter() + duration
+
+        async def drive(route: str, method: str, path: str, headers: Dict[str, str], body=None):
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body, headers=headers)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    samples.setdefault(route, []).append(time.perf_counter() - started)
+                else:
+                    errors[route] = errors.get(route, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(drive("cheap", "GET", "/auth/me", headers) for headers in cheap_headers),
+            *(drive("analyze", "POST", "/analyze/", headers, {"analysis_type": "time_analysis"})
+              for headers in heavy_headers),
+        )
+        elapsed = time.perf_counter() - started
+    return load_test.summarise(samples, errors, elapsed)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure cheap-route latency under concurrent analysis load")
+    parser.add_argument("--modes", default="0,2", help="Comma-separated ANALYSIS_WORKERS values to compare")
+    parser.add_argument("--cheap-users", type=int, default=8, help="Virtual users calling GET /auth/me")
+    parser.add_argument("--heavy-users", type=int, default=4, help="Virtual users calling POST /analyze/")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per measurement")
+    parser.add_argument("--scale", default="20x5000", help="USERSxCATCHES_PER_USER dataset to seed")
+    parser.add_argument("--port", type=int, default=8767, help="Port to start the API on")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset seed")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the synthetic data already in the database")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/cheap-<timestamp>.json)")
+    args = parser.parse_args()
+
+    env_file = ".env.local" if os.path.exists(".env.local") else ".env"
+    load_dotenv(env_file)
+    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    db_name = os.getenv("DB_NAME", "bite_tracker_db")
+    scale = load_test.parse_scales(args.scale)[0]
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": load_test.git_revision(),
+        "database": db_name,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "cheap_users": args.cheap_users,
+        "heavy_users": args.heavy_users,
+        "duration_s": args.duration,
+        "runs": [],
+    }
+
+    async def run():
+        if not args.no_seed:
+            client = AsyncIOMotorClient(mongo_uri)
+            try:
+                seeded = await load_test.seed_scale(client[db_name], scale["users"], scale["catches_per_user"],
+                                                    args.seed)
+                print(f"Seeded {seeded['catches_inserted']} catches for {seeded['users']} users "
+                      f"in {seeded['seconds']}s")
+            finally:
+                client.close()
+        usernames = [load_test.synthetic_data.synthetic_username(i) for i in range(scale["users"])]
+
+        for mode in args.modes.split(","):
+            env = dict(os.environ, MONGODB_URI=mongo_uri, DB_NAME=db_name, ANALYSIS_WORKERS=mode.strip())
+            process = worker_scaling.start_server(1, args.port, env)
+            try:
+                await worker_scaling.wait_until_ready(base_url)
+                # Let the deferred start-up warm the analysis processes before measuring
+                await asyncio.sleep(5)
+                idle = await measure(base_url, usernames, args.cheap_users, 0, args.duration)
+                loaded = await measure(base_url, usernames, args.cheap_users, args.heavy_users, args.duration)
+            finally:
+                worker_scaling.stop_server(process)
+            results["runs"].append({"analysis_workers": int(mode), "idle": idle, "loaded": loaded})
+
+    asyncio.run(run())
+
+    print(f"\n{'ANALYSIS_WORKERS':>16}{'load':>8}{'cheap p50':>11}{'cheap p95':>11}{'cheap p99':>11}"
+          f"{'analyze/s':>11}")
+    for run_result in results["runs"]:
+        for label in ("idle", "loaded"):
+            routes = run_result[label]["routes"]
+            cheap = routes.get("cheap", {})
+            analyze = routes.get("analyze", {})
+            print(f"{run_result['analysis_workers']:>16}{label:>8}{cheap.get('p50_ms') or 0:>11}"
+                  f"{cheap.get('p95_ms') or 0:>11}{cheap.get('p99_ms') or 0:>11}"
+                  f"{analyze.get('throughput_rps') or 0:>11}")
+
+    output = args.output or os.path.join(load_test.RESULTS_DIR, f"cheap-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
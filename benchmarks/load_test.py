@@ -0,0 +1,301 @@
+"""
+End-to-end load test for the BiteTracker API.
+
+Seeds a local mongod with synthetic data at one or more scales, then drives a
+weighted mix of API calls at each concurrency level and reports p50/p95/p99
+latency and throughput per route. Results are written as JSON so runs from
+different releases can be compared with --compare.
+
+The API server must be running against the same database, e.g.:
+
+    DB_NAME=bite_tracker_bench RATE_LIMIT_ENABLED=false uvicorn main:app --port 8000
+    DB_NAME=bite_tracker_bench python benchmarks/load_test.py --scales 10x100,100x1000 --concurrency 1,16,64
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic_data  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PASSWORD = "bench-password"
+
+# Relative frequency of each route in the traffic mix
+DEFAULT_MIX = {
+    "login": 2,
+    "create_catch": 10,
+    "list_catches": 15,
+    "get_catch": 8,
+    "stats_overview": 10,
+    "analyze": 15,
+    "analyze_advanced": 10,
+    "options": 15,
+    "bulk_upload": 1,
+    "achievements": 8,
+    "achievements_check": 6,
+}
+
+ANALYSIS_TYPES = ["bait_success", "time_analysis", "structure_analysis", "lake_analysis",
+                  "date_analysis", "bait_depth_analysis", "water_temp_analysis"]
+GROUP_BY_CHOICES = [["bait"], ["bait", "time_of_day"], ["lake", "structure"], ["species", "bait_type"]]
+OPTION_FIELDS = ["lake", "bait", "bait_type", "structure", "species", "bait_colour"]
+BULK_ROWS = 50
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarise(samples: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    routes = {}
+    for route in sorted(set(samples) | set(errors)):
+        latencies = sorted(samples.get(route, []))
+        routes[route] = {
+            "count": len(latencies),
+            "errors": errors.get(route, 0),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        }
+    total = sum(route["count"] for route in routes.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "total_errors": sum(errors.values()),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "routes": routes,
+    }
+
+
+class VirtualUser:
+    """One simulated angler issuing requests back to back"""
+
+    def __init__(self, client: httpx.AsyncClient, username: str, user_index: int, seed: int):
+        self.client = client
+        self.username = username
+        self.rng = random.Random(f"load:{seed}:{user_index}")
+        self.generator = synthetic_data.CatchGenerator(seed + 1, user_index, date(2022, 1, 1), date(2024, 12, 31))
+        self.headers: Dict[str, str] = {}
+        self.catch_ids: List[str] = []
+
+    async def login(self):
+        response = await self.client.post("/auth/login", json={"username": self.username, "password": PASSWORD})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def create_catch(self):
+        response = await self.client.post("/catches/", json=self.generator.catch(), headers=self.headers)
+        if response.status_code == 200:
+            self.catch_ids.append(response.json()["_id"])
+        return response
+
+    async def list_catches(self):
+        return await self.client.get("/catches/", headers=self.headers)
+
+    async def get_catch(self):
+        if not self.catch_ids:
+            return await self.create_catch()
+        return await self.client.get(f"/catches/{self.rng.choice(self.catch_ids)}", headers=self.headers)
+
+    async def stats_overview(self):
+        return await self.client.get("/catches/stats/overview", headers=self.headers)
+
+    async def analyze(self):
+        body = {"analysis_type": self.rng.choice(ANALYSIS_TYPES)}
+        return await self.client.post("/analyze/", json=body, headers=self.headers)
+
+    async def analyze_advanced(self):
+        body = {"group_by": self.rng.choice(GROUP_BY_CHOICES), "success_metric": "total_weight", "limit": 10}
+        return await self.client.post("/analyze/advanced/", json=body, headers=self.headers)
+
+    async def options(self):
+        return await self.client.get(f"/catches/options/{self.rng.choice(OPTION_FIELDS)}", headers=self.headers)
+
+    async def bulk_upload(self):
+        rows = [{k: v for k, v in self.generator.catch().items() if v is not None} for _ in range(BULK_ROWS)]
+        files = {"file": ("bench.json", json.dumps(rows).encode("utf-8"), "application/json")}
+        return await self.client.post("/catches/bulk", files=files, headers=self.headers)
+
+    async def achievements(self):
+        return await self.client.get("/achievements/", headers=self.headers)
+
+    async def achievements_check(self):
+        return await self.client.post("/achievements/check", headers=self.headers)
+
+
+async def run_level(base_url: str, usernames: List[str], concurrency: int, duration: float,
+                    mix: Dict[str, int], seed: int) -> Dict[str, Any]:
+    """Run `concurrency` virtual users for `duration` seconds and summarise latencies"""
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        users = [VirtualUser(client, usernames[i % len(usernames)], i, seed) for i in range(concurrency)]
+        await asyncio.gather(*(user.login() for user in users))
+
+        deadline = time.perf_counter() + duration
+
+        async def drive(user: VirtualUser):
+            while time.perf_counter() < deadline:
+                route = user.rng.choices(routes, weights=weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await getattr(user, route)()
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    samples.setdefault(route, []).append(time.perf_counter() - started)
+                else:
+                    errors[route] = errors.get(route, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(user) for user in users))
+        elapsed = time.perf_counter() - started
+
+    return summarise(samples, errors, elapsed)
+
+
+async def seed_scale(db, users: int, catches_per_user: int, seed: int) -> Dict[str, Any]:
+    hashed_password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD)
+    return await synthetic_data.seed_dataset(
+        db, users=users, catches_per_user=catches_per_user, hashed_password=hashed_password,
+        seed=seed, clear=True,
+    )
+
+
+def parse_scales(value: str) -> List[Dict[str, int]]:
+    scales = []
+    for item in value.split(","):
+        users, catches = item.lower().split("x")
+        scales.append({"users": int(users), "catches_per_user": int(catches)})
+    return scales
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(scale: Dict[str, int], concurrency: int, summary: Dict[str, Any]):
+    print(f"\n== {scale['users']} users x {scale['catches_per_user']} catches, concurrency {concurrency}: "
+          f"{summary['throughput_rps']} req/s, {summary['total_errors']} errors")
+    print(f"{'route':<20}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in summary["routes"].items():
+        print(f"{route:<20}{stats['count']:>8}{stats['errors']:>6}{stats['throughput_rps'] or 0:>9}"
+              f"{stats['p50_ms'] or 0:>10}{stats['p95_ms'] or 0:>10}{stats['p99_ms'] or 0:>10}")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print the p95 change per route for every (scale, concurrency) run present in both files"""
+    def key(run):
+        return (run["scale"]["users"], run["scale"]["catches_per_user"], run["concurrency"])
+
+    previous = {key(run): run for run in baseline["runs"]}
+    print(f"\n== p95 compared with {baseline.get('revision')} ({baseline.get('started_at')})")
+    for run in current["runs"]:
+        old = previous.get(key(run))
+        if not old:
+            continue
+        print(f"-- {key(run)[0]}x{key(run)[1]} @ {key(run)[2]}")
+        for route, stats in run["summary"]["routes"].items():
+            old_stats = old["summary"]["routes"].get(route)
+            if not old_stats or not old_stats["p95_ms"] or not stats["p95_ms"]:
+                continue
+            change = (stats["p95_ms"] - old_stats["p95_ms"]) / old_stats["p95_ms"] * 100
+            print(f"   {route:<20}{old_stats['p95_ms']:>10} -> {stats['p95_ms']:<10}({change:+.1f}%)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test every BiteTracker API route")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="URL of the running API")
+    parser.add_argument("--scales", default="10x100,100x1000",
+                        help="Comma-separated USERSxCATCHES_PER_USER datasets to seed and test")
+    parser.add_argument("--concurrency", default="1,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset and traffic seed")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the synthetic data already in the database")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", help="Previous results JSON to compare p95 latencies against")
+    args = parser.parse_args()
+
+    env_file = ".env.local" if os.path.exists(".env.local") else ".env"
+    load_dotenv(env_file)
+    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    db_name = os.getenv("DB_NAME", "bite_tracker_db")
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "base_url": args.base_url,
+        "database": db_name,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "duration_s": args.duration,
+        "mix": DEFAULT_MIX,
+        "runs": [],
+    }
+
+    async def run():
+        client = AsyncIOMotorClient(mongo_uri)
+        try:
+            for scale in parse_scales(args.scales):
+                if not args.no_seed:
+                    seeded = await seed_scale(client[db_name], scale["users"], scale["catches_per_user"], args.seed)
+                    print(f"Seeded {seeded['catches_inserted']} catches for {seeded['users']} users "
+                          f"in {seeded['seconds']}s")
+                usernames = [synthetic_data.synthetic_username(i) for i in range(scale["users"])]
+                for concurrency in concurrency_levels:
+                    summary = await run_level(args.base_url, usernames, concurrency, args.duration,
+                                              DEFAULT_MIX, args.seed)
+                    print_level(scale, concurrency, summary)
+                    results["runs"].append({"scale": scale, "concurrency": concurrency, "summary": summary})
+        finally:
+            client.close()
+
+    asyncio.run(run())
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Microbenchmark regression suite for the CPU-bound helpers in main.py and analysis.py.
+
+Every case runs on fixed synthetic inputs at several sizes. Timings are
+normalised by a pure-Python calibration loop so baselines recorded on one
+machine remain meaningful on another, then compared against
+benchmarks/baselines/microbench.json.
+
+    python benchmarks/microbench.py                    # compare, exit 1 on regression
+    python benchmarks/microbench.py --threshold 0.25   # fail beyond a 25% slowdown
+    python benchmarks/microbench.py --save-baseline    # record a new baseline
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import contextlib
+from datetime import date
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "microbench.json")
+SIZES = [100, 1000, 10000]
+SEED = 1234
+
+
+def calibrate() -> float:
+    """Seconds for a fixed mix of dict, string and float work, used to normalise timings"""
+    def workload():
+        total = 0.0
+        data = {}
+        for i in range(20000):
+            key = f"k{i % 500}"
+            data[key] = data.get(key, 0) + i
+            total += float(str(i * 1.5))
+        return total, data
+
+    return measure(workload, repeat=5, min_time=0.1)
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, min_time: float = 0.2) -> float:
+    """Best-of-`repeat` seconds per call, looping each sample until it lasts at least min_time"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def synthetic_catches(size: int) -> List[Dict[str, Any]]:
+    import synthetic_data
+
+    generator = synthetic_data.CatchGenerator(SEED, 0, date(2022, 1, 1), date(2024, 12, 31))
+    return [generator.catch() for _ in range(size)]
+
+
+def build_cases(size: int) -> Dict[str, Callable[[], Any]]:
+    """Fixed inputs of `size` rows for every benchmarked helper"""
+    import analysis
+    import catch_cache
+    import main
+
+    catches = synthetic_catches(size)
+    # Bulk upload rows arrive as strings from csv.DictReader
+    csv_rows = [{key: "" if value is None else str(value) for key, value in catch.items()} for catch in catches]
+    analysis_rows = {
+        f"group {i}": {
+            "total_weight": float("nan") if i % 7 == 0 else i * 1.5,
+            "average_weight": float("inf") if i % 11 == 0 else i / 3,
+            "count": i,
+        }
+        for i in range(size)
+    }
+    documents = [dict(catch, _id=i, time=catch["time"] if i % 3 else catch["time"][:5])
+                 for i, catch in enumerate(catches)]
+    columns = catch_cache.UserColumns(0)
+    columns.add(documents)
+    loop = asyncio.new_event_loop()
+
+    def validate():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for row in csv_rows:
+                main.validate_catch_data(row)
+
+    def check_requirements():
+        async def run():
+            for achievement in main.DEFAULT_ACHIEVEMENTS:
+                await main.check_achievement_requirement(achievement, catches)
+        loop.run_until_complete(run())
+
+    def achievement_progress():
+        async def run():
+            for achievement in main.DEFAULT_ACHIEVEMENTS:
+                await main.calculate_achievement_progress(achievement, catches)
+        loop.run_until_complete(run())
+
+    return {
+        "validate_catch_data": validate,
+        "clean_for_json": lambda: analysis.clean_for_json(analysis_rows),
+        "check_achievement_requirement": check_requirements,
+        "calculate_achievement_progress": achievement_progress,
+        "build_catch_columns": lambda: catch_cache.UserColumns(0).add(documents),
+        **{
+            analysis_type: lambda analysis_type=analysis_type: analysis.run_analysis(
+                analysis_type, columns.frame(analysis.FRAME_COLUMNS[analysis_type]))
+            for analysis_type in analysis.ANALYSIS_TYPES
+        },
+    }
+
+
+def run_suite(sizes: List[int], only: List[str]) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, Any]] = {}
+    calibrations = []
+    for size in sizes:
+        for name, fn in build_cases(size).items():
+            if only and name not in only:
+                continue
+            # Calibrate next to every case so CPU frequency and noisy neighbours affect both equally
+            calibration = calibrate()
+            calibrations.append(calibration)
+            seconds = measure(fn, repeat=7)
+            results.setdefault(name, {})[str(size)] = {
+                "seconds": seconds,
+                "normalised": seconds / calibration,
+            }
+            print(f"{name:<34}{size:>7} rows {seconds * 1000:>11.3f} ms")
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_seconds": min(calibrations) if calibrations else None,
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return a description of every case that is more than `threshold` slower than baseline"""
+    regressions = []
+    print(f"\n{'case':<34}{'rows':>7}{'baseline':>11}{'current':>11}{'change':>9}")
+    for name, sizes in current["results"].items():
+        for size, result in sizes.items():
+            previous = baseline["results"].get(name, {}).get(size)
+            if not previous:
+                continue
+            change = result["normalised"] / previous["normalised"] - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{name:<34}{size:>7}{previous['normalised']:>11.3f}{result['normalised']:>11.3f}"
+                  f"{change:>+8.0%}{flag}")
+            if flag:
+                regressions.append(f"{name} @ {size} rows: {change:+.0%}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for BiteTracker hot helpers")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES), help="Comma-separated row counts")
+    parser.add_argument("--only", default="", help="Comma-separated case names to run")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="Allowed slowdown versus baseline before failing (0.5 = 50%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = [name for name in args.only.split(",") if name]
+    current = run_suite(sizes, only)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline first")
+        return 2
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print("\nRegressions beyond threshold:")
+        for regression in regressions:
+            print(f"- {regression}")
+        return 1
+    print("\nNo regressions beyond threshold")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
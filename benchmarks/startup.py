@@ -0,0 +1,141 @@
+"""
+Cold-start benchmark.
+
+Measures, each in a fresh interpreter:
+  * import time of main.py (what every worker pays before it can accept a connection)
+  * time from launching uvicorn to the first successful response from / (which needs no database round-trip)
+
+and fails when the median exceeds the budget, so regressions such as a new
+heavy top-level import are caught before they reach scale-to-zero hosts.
+
+    python benchmarks/startup.py                      # exits 1 if over budget
+    python benchmarks/startup.py --runs 10 --max-import-ms 1500 --max-first-response-ms 3000
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import platform
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import load_test  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def heavy_imports(env: Dict[str, str], top: int = 10) -> List[Dict[str, Any]]:
+    """Top-level packages with the largest cumulative import time, from python -X importtime"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    packages: Dict[str, int] = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative.strip()))
+    ranked = sorted(packages.items(), key=lambda item: -item[1])
+    return [{"package": package, "ms": round(micros / 1000, 1)} for package, micros in ranked
+            if package != "main"][:top]
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1]) * 1000
+
+
+def measure_first_response(env: Dict[str, str], port: int, timeout: float = 60.0) -> Optional[float]:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.01)
+        return None
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-response")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--port", type=int, default=8766, help="Port to start the API on")
+    parser.add_argument("--max-import-ms", type=float, default=2000.0, help="Budget for the median import time")
+    parser.add_argument("--max-first-response-ms", type=float, default=4000.0,
+                        help="Budget for the median time from launch to first response")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/startup-<timestamp>.json)")
+    args = parser.parse_args()
+
+    # Keep the measured processes quiet; their log output is discarded anyway
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+
+    import_ms = [measure_import(env) for _ in range(args.runs)]
+    first_response_ms = [measure_first_response(env, args.port) for _ in range(args.runs)]
+    completed = [value for value in first_response_ms if value is not None]
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": load_test.git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "runs": args.runs,
+        "import_ms": {"median": round(statistics.median(import_ms), 1), "min": round(min(import_ms), 1),
+                      "max": round(max(import_ms), 1)},
+        "first_response_ms": {
+            "median": round(statistics.median(completed), 1) if completed else None,
+            "min": round(min(completed), 1) if completed else None,
+            "max": round(max(completed), 1) if completed else None,
+            "timeouts": len(first_response_ms) - len(completed),
+        },
+        "heavy_imports": heavy_imports(env),
+    }
+
+    print(f"import main:          median {results['import_ms']['median']} ms "
+          f"(budget {args.max_import_ms:.0f} ms)")
+    print(f"first response:       median {results['first_response_ms']['median']} ms "
+          f"(budget {args.max_first_response_ms:.0f} ms, {results['first_response_ms']['timeouts']} timeouts)")
+    print("\nslowest imports:")
+    for item in results["heavy_imports"]:
+        print(f"  {item['package']:<24}{item['ms']:>9} ms")
+
+    output = args.output or os.path.join(load_test.RESULTS_DIR, f"startup-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    over_budget = results["import_ms"]["median"] > args.max_import_ms or not completed or \
+        results["first_response_ms"]["median"] > args.max_first_response_ms
+    if over_budget:
+        print("Start-up is over budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Throughput versus uvicorn worker count.
+
+Starts the API with 1..N workers in turn (each with WEB_CONCURRENCY set so the
+MongoDB pool budget is split the way it is in production), drives the load
+test mix against it, and reports throughput and p95 latency per worker count.
+The dataset is seeded once up front and reused for every run.
+
+    DB_NAME=bite_tracker_bench python benchmarks/worker_scaling.py --workers 1,2,4 --concurrency 64
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List
+
+import httpx
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import load_test  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    # Virtual users far exceed a real angler's request rate; measure capacity, not the limiter
+    env = dict(env, WEB_CONCURRENCY=str(workers), LOG_LEVEL=env.get("LOG_LEVEL", "WARNING"),
+               RATE_LIMIT_ENABLED=env.get("RATE_LIMIT_ENABLED", "false"))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2.0) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def print_table(runs: List[Dict[str, Any]]):
+    baseline = runs[0]["summary"]["throughput_rps"] if runs else None
+    print(f"\n{'workers':>8}{'req/s':>10}{'speedup':>9}{'errors':>8}{'p95 ms (worst route)':>22}")
+    for run in runs:
+        summary = run["summary"]
+        p95s = [stats["p95_ms"] for stats in summary["routes"].values() if stats["p95_ms"]]
+        speedup = summary["throughput_rps"] / baseline if baseline else 0
+        print(f"{run['workers']:>8}{summary['throughput_rps']:>10}{speedup:>8.2f}x"
+              f"{summary['total_errors']:>8}{max(p95s) if p95s else 0:>22}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure API throughput as uvicorn workers are added")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=64, help="Virtual users per run")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per worker count")
+    parser.add_argument("--scale", default="100x1000", help="USERSxCATCHES_PER_USER dataset to seed")
+    parser.add_argument("--port", type=int, default=8765, help="Port to start the API on")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset and traffic seed")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the synthetic data already in the database")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/workers-<timestamp>.json)")
+    args = parser.parse_args()
+
+    env_file = ".env.local" if os.path.exists(".env.local") else ".env"
+    load_dotenv(env_file)
+    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    db_name = os.getenv("DB_NAME", "bite_tracker_db")
+    scale = load_test.parse_scales(args.scale)[0]
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": load_test.git_revision(),
+        "database": db_name,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "mix": load_test.DEFAULT_MIX,
+        "runs": [],
+    }
+
+    async def run():
+        if not args.no_seed:
+            client = AsyncIOMotorClient(mongo_uri)
+            try:
+                seeded = await load_test.seed_scale(client[db_name], scale["users"], scale["catches_per_user"],
+                                                    args.seed)
+                print(f"Seeded {seeded['catches_inserted']} catches for {seeded['users']} users "
+                      f"in {seeded['seconds']}s")
+            finally:
+                client.close()
+        usernames = [load_test.synthetic_data.synthetic_username(i) for i in range(scale["users"])]
+
+        for workers in [int(count) for count in args.workers.split(",")]:
+            process = start_server(workers, args.port, dict(os.environ, MONGODB_URI=mongo_uri, DB_NAME=db_name))
+            try:
+                await wait_until_ready(base_url)
+                summary = await load_test.run_level(base_url, usernames, args.concurrency, args.duration,
+                                                    load_test.DEFAULT_MIX, args.seed)
+            finally:
+                stop_server(process)
+            print(f"{workers} worker(s): {summary['throughput_rps']} req/s, {summary['total_errors']} errors")
+            results["runs"].append({"workers": workers, "summary": summary})
+
+    asyncio.run(run())
+    print_table(results["runs"])
+
+    output = args.output or os.path.join(load_test.RESULTS_DIR, f"workers-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
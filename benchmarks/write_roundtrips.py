@@ -0,0 +1,161 @@
+"""
+MongoDB round trips and latency of the CRUD and auth write paths.
+
+Each virtual user registers a fresh account, then loops through creating,
+updating and deleting a catch and updating their profile. Every response's
+`Server-Timing` header (added by the db_budget middleware) gives the MongoDB
+operations and time spent on that request, so the report shows round trips per
+request next to client-side latency. Run it on two revisions and pass the
+older results file to --compare to see the difference.
+
+    DB_NAME=bite_tracker_bench RATE_LIMIT_ENABLED=false uvicorn main:app --port 8000
+    python benchmarks/write_roundtrips.py --users 8 --iterations 50
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import platform
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import load_test  # noqa: E402
+
+ROUTES = ("register", "create_catch", "update_catch", "update_profile", "delete_catch")
+SERVER_TIMING = re.compile(r'db;dur=([0-9.]+);desc="(\d+) ops"')
+
+
+class Samples:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.operations: Dict[str, List[int]] = {}
+        self.db_ms: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, route: str, response: Optional[httpx.Response], started: float):
+        if response is None or response.status_code >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return
+        self.latencies.setdefault(route, []).append(time.perf_counter() - started)
+        match = SERVER_TIMING.search(response.headers.get("server-timing", ""))
+        if match:
+            self.db_ms.setdefault(route, []).append(float(match.group(1)))
+            self.operations.setdefault(route, []).append(int(match.group(2)))
+
+
+async def timed(samples: Samples, route: str, request) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        response = None
+    samples.record(route, response, started)
+    return response
+
+
+async def virtual_user(client: httpx.AsyncClient, run_id: str, index: int, iterations: int, samples: Samples):
+    username = f"wrt_{run_id}_{index}"
+    generator = load_test.synthetic_data.CatchGenerator(index, index, date(2022, 1, 1), date(2024, 12, 31))
+    response = await timed(samples, "register", client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": load_test.PASSWORD}))
+    if response is None or response.status_code >= 400:
+        return
+    login = await client.post("/auth/login", json={"username": username, "password": load_test.PASSWORD})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    for i in range(iterations):
+        created = await timed(samples, "create_catch", client.post("/catches/", json=generator.catch(), headers=headers))
+        if created is None or created.status_code >= 400:
+            continue
+        catch_id = created.json()["_id"]
+        await timed(samples, "update_catch",
+                    client.put(f"/catches/{catch_id}", json=generator.catch(), headers=headers))
+        await timed(samples, "update_profile",
+                    client.put("/auth/profile", data={"full_name": f"Angler {i}"}, headers=headers))
+        await timed(samples, "delete_catch", client.delete(f"/catches/{catch_id}", headers=headers))
+
+
+def summarise(samples: Samples, elapsed: float) -> Dict[str, Any]:
+    summary = load_test.summarise(samples.latencies, samples.errors, elapsed)
+    for route, stats in summary["routes"].items():
+        operations, db_ms = samples.operations.get(route, []), samples.db_ms.get(route, [])
+        stats["db_ops_mean"] = round(sum(operations) / len(operations), 2) if operations else None
+        stats["db_ms_mean"] = round(sum(db_ms) / len(db_ms), 2) if db_ms else None
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"{'route':<16}{'count':>7}{'err':>5}{'db ops':>8}{'db ms':>8}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for route in ROUTES:
+        stats = summary["routes"].get(route)
+        if stats is None:
+            continue
+        print(f"{route:<16}{stats['count']:>7}{stats['errors']:>5}{stats['db_ops_mean'] or 0:>8}"
+              f"{stats['db_ms_mean'] or 0:>8}{stats['mean_ms'] or 0:>9}{stats['p50_ms'] or 0:>9}"
+              f"{stats['p95_ms'] or 0:>9}")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print the change in round trips and mean latency per route"""
+    print(f"\n== compared with {baseline.get('revision')} ({baseline.get('started_at')})")
+    for route in ROUTES:
+        stats, old = current["summary"]["routes"].get(route), baseline["summary"]["routes"].get(route)
+        if not stats or not old or not stats["mean_ms"] or not old["mean_ms"]:
+            continue
+        change = (stats["mean_ms"] - old["mean_ms"]) / old["mean_ms"] * 100
+        print(f"   {route:<16} ops {old['db_ops_mean']} -> {stats['db_ops_mean']:<6} "
+              f"mean {old['mean_ms']} -> {stats['mean_ms']} ms ({change:+.1f}%)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure MongoDB round trips and latency of the write routes")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="URL of the running API")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users, each a new account")
+    parser.add_argument("--iterations", type=int, default=50, help="Create/update/profile/delete loops per user")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/writes-<timestamp>.json)")
+    args = parser.parse_args()
+
+    async def run() -> Dict[str, Any]:
+        samples = Samples()
+        run_id = uuid.uuid4().hex[:8]
+        limits = httpx.Limits(max_connections=args.users)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0, limits=limits) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(virtual_user(client, run_id, i, args.iterations, samples)
+                                   for i in range(args.users)))
+            elapsed = time.perf_counter() - started
+        return summarise(samples, elapsed)
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": load_test.git_revision(),
+        "python": platform.python_version(),
+        "users": args.users,
+        "iterations": args.iterations,
+        "summary": asyncio.run(run()),
+    }
+    print_summary(results["summary"])
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    output = args.output or os.path.join(load_test.RESULTS_DIR, f"writes-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 1 if results["summary"]["total_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Per-user columnar catch cache for `/analyze/`.
+
+Each app process keeps, per user, the columns analysis.py reads as NumPy
+arrays: floats for the numeric fields, integer codes for the categorical ones
+(bait, bait_type, structure, lake, species), and the hour and day of each
+catch parsed once. An analysis then ships only the arrays it needs to the
+pool instead of rebuilding a DataFrame from MongoDB documents.
+
+- Built lazily, on a user's first analysis in this process.
+- Bounded by CATCH_CACHE_MAX_MB per process, evicting least recently used
+  users first.
+- Patched in place on catch writes made by this process.
+
+Other processes' writes are caught by a per-user `catch_version` counter on
+the user's sketch document (sketches.py): every catch write increments it in
+the bulk write that updates the sketches (the API write paths here, data
+migrations in migrations.py), and a cached entry is only used while its
+version matches the stored one, read once per analysis. An entry that misses
+a version is rebuilt rather than patched.
+"""
+
+import asyncio
+import math
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import analysis
+import metrics
+import sketches
+
+CATCH_CACHE_MAX_BYTES = int(float(os.environ.get("CATCH_CACHE_MAX_MB", "64")) * 1024 * 1024)
+# Catch fields the cache holds
+PROJECTION = {name: 1 for name in analysis.NUMERIC_COLUMNS + analysis.CATEGORICAL_COLUMNS + ("time", "date")}
+LOAD_BATCH_SIZE = 5000
+# Rough per-row cost of the Python objects next to the arrays (id list and row index)
+ROW_OVERHEAD_BYTES = 150
+
+CATCH_CACHE_REQUESTS = metrics.REGISTRY.counter(
+    "catch_cache_requests_total", "Analysis cache lookups, by result (hit or miss)", ("result",))
+CATCH_CACHE_EVICTIONS = metrics.REGISTRY.counter(
+    "catch_cache_evictions_total", "Users evicted from the analysis cache to stay within its memory bound")
+CATCH_CACHE_BYTES = metrics.REGISTRY.gauge(
+    "catch_cache_bytes", "Estimated memory held by the analysis cache in this process")
+
+
+def hour_of(value) -> int:
+    """Hour of a catch time ("HH:MM" or "HH:MM:SS"), or MISSING"""
+    if not isinstance(value, str):
+        return analysis.MISSING
+    # What strptime("%H:%M:%S") or strptime("%H:%M") accepts, without its per-call overhead
+    parts = value.split(":")
+    if len(parts) not in (2, 3) or not all(part.isdigit() and 1 <= len(part) <= 2 for part in parts):
+        return analysis.MISSING
+    hour, minute = int(parts[0]), int(parts[1])
+    if hour > 23 or minute > 59 or (len(parts) == 3 and int(parts[2]) > 61):
+        return analysis.MISSING
+    return hour
+
+
+def day_of(value) -> int:
+    """Days since 1970-01-01 of a catch date ("YYYY-MM-DD"), or MISSING_DAY"""
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        try:
+            value = date.fromisoformat(value[:10])
+        except ValueError:
+            return analysis.MISSING_DAY
+    if not isinstance(value, date):
+        return analysis.MISSING_DAY
+    return value.toordinal() - analysis.EPOCH_ORDINAL
+
+
+def _number(value) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number if math.isfinite(number) else math.nan
+
+
+class UserColumns:
+    """One user's catches as column arrays; row order is arbitrary"""
+
+    def __init__(self, version: Tuple[Optional[str], int], capacity: int = 64):
+        self.version = version
+        self.size = 0
+        self.ids: List[Any] = []
+        self.rows: Dict[Any, int] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+        for name in analysis.NUMERIC_COLUMNS:
+            self.columns[name] = np.empty(capacity, dtype=np.float64)
+        for name in analysis.CATEGORICAL_COLUMNS:
+            self.columns[name] = np.empty(capacity, dtype=np.int32)
+        self.columns["hour"] = np.empty(capacity, dtype=np.int8)
+        self.columns["day"] = np.empty(capacity, dtype=np.int32)
+        self.categories: Dict[str, list] = {name: [] for name in analysis.CATEGORICAL_COLUMNS}
+        self._codes: Dict[str, Dict[Any, int]] = {name: {} for name in analysis.CATEGORICAL_COLUMNS}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.columns.values()) + len(self.ids) * ROW_OVERHEAD_BYTES
+
+    def _code(self, name: str, value) -> int:
+        if value is None:
+            return analysis.MISSING
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.categories[name])
+            self.categories[name].append(value)
+        return code
+
+    def _reserve(self, rows: int):
+        capacity = len(self.columns["day"])
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2)
+        for name, array in self.columns.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.columns[name] = grown
+
+    def add(self, documents: Iterable[Dict[str, Any]]):
+        documents = [document for document in documents if document["_id"] not in self.rows]
+        self._reserve(self.size + len(documents))
+        start, end = self.size, self.size + len(documents)
+        for name in analysis.NUMERIC_COLUMNS:
+            self.columns[name][start:end] = [_number(document.get(name)) for document in documents]
+        for name in analysis.CATEGORICAL_COLUMNS:
+            self.columns[name][start:end] = [self._code(name, document.get(name)) for document in documents]
+        self.columns["hour"][start:end] = [hour_of(document.get("time")) for document in documents]
+        self.columns["day"][start:end] = [day_of(document.get("date")) for document in documents]
+        for offset, document in enumerate(documents):
+            self.rows[document["_id"]] = start + offset
+            self.ids.append(document["_id"])
+        self.size = end
+
+    def remove(self, ids: Iterable[Any]):
+        """Drop rows by catch _id, moving the last row into each gap"""
+        for catch_id in ids:
+            row = self.rows.pop(catch_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                for array in self.columns.values():
+                    array[row] = array[last]
+                moved = self.ids[last]
+                self.ids[row] = moved
+                self.rows[moved] = row
+            self.ids.pop()
+            self.size = last
+
+    def frame(self, columns: Iterable[str], species: Optional[str] = None) -> Dict[str, Any]:
+        """The named columns of the live rows (optionally one species' only), for analysis.run_analysis"""
+        if species is None:
+            # Copies: the pool pickles a queued job later, and add()/remove() rewrite these buffers in place
+            frame: Dict[str, Any] = {name: self.columns[name][:self.size].copy() for name in columns}
+        else:
+            selected = self.columns["species"][:self.size] == self._codes["species"].get(species, -2)
+            frame = {name: self.columns[name][:self.size][selected] for name in columns}
+        frame["categories"] = {name: list(self.categories[name]) for name in columns
+                               if name in analysis.CATEGORICAL_COLUMNS}
+        return frame
+
+
+_entries: "OrderedDict[str, UserColumns]" = OrderedDict()
+_loading: Dict[Tuple[str, Any], asyncio.Task] = {}
+
+
+def _store(user_id: str, entry: UserColumns):
+    _entries[user_id] = entry
+    _entries.move_to_end(user_id)
+    total = sum(cached.nbytes for cached in _entries.values())
+    while total > CATCH_CACHE_MAX_BYTES and _entries:
+        _, evicted = _entries.popitem(last=False)
+        total -= evicted.nbytes
+        CATCH_CACHE_EVICTIONS.inc()
+    CATCH_CACHE_BYTES.set(total)
+
+
+async def _load(db, user_id: str, version: Optional[Tuple[Optional[str], int]]) -> UserColumns:
+    entry = UserColumns(version)
+    batch = []
+    async for document in db.catches.find({"user_id": user_id}, PROJECTION).batch_size(LOAD_BATCH_SIZE):
+        batch.append(document)
+        if len(batch) >= LOAD_BATCH_SIZE:
+            entry.add(batch)
+            batch = []
+    entry.add(batch)
+    return entry
+
+
+async def get(db, user: Dict[str, Any]) -> UserColumns:
+    """The user's cached columns, built from MongoDB if missing or out of date"""
+    user_id = str(user["_id"])
+    version = await sketches.version(db, user_id)
+    entry = _entries.get(user_id)
+    if entry is not None and version is not None and entry.version == version:
+        _entries.move_to_end(user_id)
+        CATCH_CACHE_REQUESTS.inc(result="hit")
+        return entry
+
+    CATCH_CACHE_REQUESTS.inc(result="miss")
+    # Concurrent analyses of one user share a single load, but only one started for the version they saw:
+    # a load started before their own write could be missing it
+    key = (user_id, version)
+    task = _loading.get(key)
+    if task is None:
+        task = _loading[key] = asyncio.ensure_future(_load(db, user_id, version))
+        task.add_done_callback(lambda finished: _loading.pop(key, None))
+    entry = await asyncio.shield(task)
+    if version is None:
+        # No sketch document yet, so nothing a later write bumps; don't keep it
+        return entry
+    current = _entries.get(user_id)
+    if current is None or current.version[0] != version[0] or current.version[1] < version[1]:
+        _store(user_id, entry)
+    return entry
+
+
+def record_write(user_id: str, added: Iterable[Dict[str, Any]] = (), removed_ids: Iterable[Any] = ()):
+    """Patch this process's cached columns for a catch write whose sketch update bumped the version by one.
+
+    If another process wrote in between, the stored version is ahead of the patched entry's, so the next
+    analysis rebuilds it; if the sketch update failed, it is behind, with the same result.
+    """
+    entry = _entries.get(user_id)
+    if entry is None:
+        return
+    entry.remove(removed_ids)
+    entry.add(added)
+    entry.version = (entry.version[0], entry.version[1] + 1)
+    _store(user_id, entry)
+
+
+async def invalidate(db, user_filter: Dict[str, Any]):
+    """Mark matching users' catches as changed outside the catch write paths (bulk tools, admin clears)"""
+    if user_filter:
+        await sketches.bump_versions(db, [str(user_id) for user_id in await db.users.distinct("_id", user_filter)])
+    else:
+        await sketches.bump_versions(db)
+    _entries.clear()
+    CATCH_CACHE_BYTES.set(0)
@@ -0,0 +1,150 @@
+"""
+Delta sync of a user's catches for offline-first clients.
+
+Every catch write path stamps `updated_at` (server time, millisecond
+precision as MongoDB stores it), and every delete leaves a tombstone in the
+`catch_tombstones` collection, expired by a TTL index after TOMBSTONE_DAYS.
+`GET /catches/sync?since=<cursor>` then returns the catches written and the
+ids deleted since the cursor, paged in (updated_at, _id) order on the
+(user_id, updated_at, _id) index.
+
+Timestamps come from each app worker's clock, and a write stamped just before
+a sync can commit just after it, so a caught-up cursor is re-read from
+OVERLAP_SECONDS before its position. Clients must therefore apply changes
+idempotently: upsert catches by `_id` and ignore tombstones for ids they
+don't have.
+
+A full resync (`reset: true` on its first page: drop the local copy, then
+apply the pages) is returned for a first sync, a cursor older than the
+tombstones, or after a bulk clear recorded as a reset tombstone.
+"""
+
+import base64
+import binascii
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+COLLECTION_NAME = "catch_tombstones"
+TOMBSTONE_DAYS = float(os.environ.get("SYNC_TOMBSTONE_DAYS", "30"))
+OVERLAP_SECONDS = float(os.environ.get("SYNC_OVERLAP_SECONDS", "10"))
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+# Reset tombstone user_id that applies to every user
+ALL_USERS = "*"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def now() -> datetime:
+    """The current time as MongoDB will store it, so cursors compare equal to stored values"""
+    current = datetime.utcnow()
+    return current.replace(microsecond=current.microsecond // 1000 * 1000)
+
+
+def _millis(value: datetime) -> int:
+    return int((value - datetime(1970, 1, 1)) / timedelta(milliseconds=1))
+
+
+def _datetime(millis: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(milliseconds=millis)
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    payload = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        # "t" is None only mid-way through catches that have no updated_at yet
+        if not (isinstance(position.get("t"), int) or (position.get("t") is None and "id" in position)) or \
+                ("id" in position and not (ObjectId.is_valid(position["id"]) and isinstance(position.get("s"), int))):
+            raise ValueError(cursor)
+        return position
+    except (ValueError, binascii.Error, AttributeError) as e:
+        raise InvalidCursor("Invalid sync cursor") from e
+
+
+async def record_deletes(db, user_id: str, catch_ids: Iterable[Any]):
+    deleted_at = now()
+    tombstones = [{"user_id": user_id, "catch_id": str(catch_id), "deleted_at": deleted_at} for catch_id in catch_ids]
+    if tombstones:
+        await db[COLLECTION_NAME].insert_many(tombstones, ordered=False)
+
+
+async def record_reset(db, user_ids: Iterable[str]):
+    """Catches removed in bulk: the users' next sync starts over instead of listing every deleted id"""
+    deleted_at = now()
+    tombstones = [{"user_id": user_id, "reset": True, "deleted_at": deleted_at} for user_id in user_ids]
+    if tombstones:
+        await db[COLLECTION_NAME].insert_many(tombstones, ordered=False)
+
+
+async def changes(db, user_id: str, since: Optional[str], limit: int = DEFAULT_LIMIT) -> Dict[str, Any]:
+    """One page of changes since a cursor; the returned cursor continues the sync or starts the next one"""
+    started = now()
+    position = decode_cursor(since) if since else None
+    reset = False
+    if position is None:
+        # First sync: everything
+        sync_start, window_start, full = started, None, True
+        reset = True
+    elif "id" in position:
+        # A later page of a sync in progress
+        sync_start = _datetime(position["s"])
+        window_start = _datetime(position["w"]) if position.get("w") is not None else None
+        full = window_start is None
+    else:
+        sync_start = started
+        window_start = _datetime(position["t"]) - timedelta(seconds=OVERLAP_SECONDS)
+        full = window_start < started - timedelta(days=TOMBSTONE_DAYS) or \
+            await db[COLLECTION_NAME].find_one({
+                "user_id": {"$in": [user_id, ALL_USERS]},
+                "deleted_at": {"$gte": window_start},
+                "reset": True,
+            }, {"_id": 1}) is not None
+        if full:
+            window_start, reset = None, True
+
+    query: Dict[str, Any] = {"user_id": user_id}
+    if position is not None and "id" in position and position["t"] is None:
+        # Catches not yet backfilled by migration 0005 sort first (no updated_at); finish them by _id, then the rest
+        query["$or"] = [{"updated_at": None, "_id": {"$gt": ObjectId(position["id"])}},
+                        {"updated_at": {"$ne": None}}]
+    elif position is not None and "id" in position:
+        after = _datetime(position["t"])
+        query["$or"] = [{"updated_at": {"$gt": after}},
+                        {"updated_at": after, "_id": {"$gt": ObjectId(position["id"])}}]
+    elif window_start is not None:
+        query["updated_at"] = {"$gte": window_start}
+    catches = await db.catches.find(query).sort([("updated_at", 1), ("_id", 1)]) \
+        .limit(limit + 1).to_list(length=limit + 1)
+
+    has_more = len(catches) > limit
+    deleted: List[str] = []
+    if has_more:
+        catches = catches[:limit]
+        last = catches[-1]
+        updated_at = last.get("updated_at")
+        cursor = encode_cursor({
+            "t": _millis(updated_at) if updated_at is not None else None, "id": str(last["_id"]), "s": _millis(sync_start),
+            "w": None if full else _millis(window_start),
+        })
+    else:
+        if not full:
+            deleted = [tombstone["catch_id"] async for tombstone in db[COLLECTION_NAME].find({
+                "user_id": user_id,
+                "deleted_at": {"$gte": window_start},
+                "catch_id": {"$exists": True},
+            }, {"catch_id": 1})]
+        # Everything stamped before this sync began has been returned
+        cursor = encode_cursor({"t": _millis(sync_start)})
+
+    return {"catches": catches, "deleted": deleted, "reset": reset, "cursor": cursor, "has_more": has_more}
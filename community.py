@@ -0,0 +1,356 @@
+"""
+Community lake analytics, computed by a background job.
+
+Every other analysis is scoped to one user. This module builds a
+cross-angler view per lake (top baits, hours, structures and bait-depth
+bands) without ever scanning the catches collection on a request:
+
+- A job in every app process wakes up every COMMUNITY_INTERVAL_SECONDS. A
+  lease on the `community_state` document lets only one of them work at a
+  time.
+- The job aggregates catches past its high-water mark (the last `_id` it
+  counted) in batches of COMMUNITY_BATCH_SIZE and `$inc`s the totals into
+  per-lake accumulators in `community_lake_stats`. Only new catches are
+  counted, so every COMMUNITY_REBUILD_HOURS the accumulators are rebuilt from
+  scratch to take edits and deletes into account.
+- Once caught up, it publishes the changed lakes to
+  `community_lake_snapshots`, which is all the API reads. A lake is published
+  only with at least COMMUNITY_MIN_ANGLERS anglers and COMMUNITY_MIN_CATCHES
+  catches, and a bait, hour, structure or depth band only with at least
+  COMMUNITY_MIN_ANGLERS anglers and COMMUNITY_MIN_BUCKET_CATCHES catches, so
+  no single angler's spots can be read off a snapshot.
+
+Distinct anglers are counted HyperLogLog-style, so a lake or bucket never
+stores its angler ids: each angler hashes to one of ANGLER_REGISTERS registers
+and the register keeps (`$max`) the longest run of leading zeros seen in the
+rest of the hash. Counting the same angler twice changes nothing, which is
+what lets batches be `$inc`ed in independently. The number of occupied
+registers never exceeds the true number of anglers, so the thresholds are
+checked against it; the published angler count is the HyperLogLog estimate.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+COMMUNITY_ENABLED = os.environ.get("COMMUNITY_ENABLED", "true").lower() in ("1", "true", "yes")
+COMMUNITY_INTERVAL_SECONDS = float(os.environ.get("COMMUNITY_INTERVAL_SECONDS", "300"))
+COMMUNITY_BATCH_SIZE = int(os.environ.get("COMMUNITY_BATCH_SIZE", "5000"))
+COMMUNITY_REBUILD_HOURS = float(os.environ.get("COMMUNITY_REBUILD_HOURS", "24"))
+COMMUNITY_MIN_ANGLERS = int(os.environ.get("COMMUNITY_MIN_ANGLERS", "5"))
+COMMUNITY_MIN_CATCHES = int(os.environ.get("COMMUNITY_MIN_CATCHES", "20"))
+COMMUNITY_MIN_BUCKET_CATCHES = int(os.environ.get("COMMUNITY_MIN_BUCKET_CATCHES", "5"))
+# Width of the bait-depth bands
+DEPTH_BAND = 5
+# Registers per distinct-angler counter (a power of two); the estimate is within about 7%, and only occupied
+# registers are stored, so a counter never holds more than this many entries
+ANGLER_REGISTERS = 256
+ANGLER_REGISTER_BITS = ANGLER_REGISTERS.bit_length() - 1
+# Bumped when the accumulator layout changes, so the next run rebuilds them
+ACCUMULATOR_VERSION = 2
+TOP_N = 10
+LEASE_SECONDS = 120
+
+STATE_COLLECTION = "community_state"
+STATS_COLLECTION = "community_lake_stats"
+SNAPSHOT_COLLECTION = "community_lake_snapshots"
+STATE_ID = "lake_snapshots"
+# Accumulator section -> expression for the bucket a catch falls in
+DIMENSIONS = {
+    "baits": "$bait",
+    "structures": "$structure",
+    "hours": {"$convert": {"input": {"$arrayElemAt": [{"$split": ["$time", ":"]}, 0]}, "to": "int",
+                           "onError": None, "onNull": None}},
+    "depth_bands": {"$multiply": [{"$floor": {"$divide": [
+        {"$convert": {"input": "$bait_depth", "to": "double", "onError": None, "onNull": None}}, DEPTH_BAND]}},
+        DEPTH_BAND]},
+}
+
+COMMUNITY_RUNS = metrics.REGISTRY.counter(
+    "community_job_runs_total", "Community snapshot job runs, by result (ok, skipped, error)", ("result",))
+COMMUNITY_CATCHES = metrics.REGISTRY.counter(
+    "community_job_catches_total", "Catches counted into the community lake accumulators")
+COMMUNITY_PUBLISHED = metrics.REGISTRY.counter(
+    "community_snapshots_published_total", "Lake snapshots written or withdrawn by the community job")
+
+_task: Optional[asyncio.Task] = None
+_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def bucket_key(value: Any) -> str:
+    """A field name safe for any bucket value (bait names may contain dots or start with $)"""
+    return hashlib.sha1(repr(value).encode()).hexdigest()[:16]
+
+
+def angler_registers(user_ids: List[Any]) -> Dict[str, int]:
+    """The register -> rank entries a set of anglers contributes to a distinct-angler counter"""
+    registers: Dict[str, int] = {}
+    for user_id in user_ids:
+        hashed = int.from_bytes(hashlib.sha1(str(user_id).encode()).digest()[:8], "big")
+        register = str(hashed & (ANGLER_REGISTERS - 1))
+        rest = hashed >> ANGLER_REGISTER_BITS
+        rank = 64 - ANGLER_REGISTER_BITS - rest.bit_length() + 1
+        registers[register] = max(registers.get(register, 0), rank)
+    return registers
+
+
+def anglers_at_least(registers: Dict[str, int]) -> int:
+    """A lower bound on the distinct anglers behind a counter: each occupied register is at least one"""
+    return len(registers or {})
+
+
+def anglers_estimate(registers: Dict[str, int]) -> int:
+    """HyperLogLog estimate of the distinct anglers behind a counter, never below the lower bound"""
+    registers = registers or {}
+    empty = ANGLER_REGISTERS - len(registers)
+    harmonic = empty + sum(2.0 ** -rank for rank in registers.values())
+    estimate = 0.7213 / (1 + 1.079 / ANGLER_REGISTERS) * ANGLER_REGISTERS ** 2 / harmonic
+    if estimate <= 2.5 * ANGLER_REGISTERS and empty:
+        # Linear counting is more accurate for small counts
+        estimate = ANGLER_REGISTERS * math.log(ANGLER_REGISTERS / empty)
+    return max(round(estimate), anglers_at_least(registers))
+
+
+def batch_pipeline(low, high) -> List[Dict[str, Any]]:
+    """Per-lake totals for the catches with low < _id <= high"""
+    id_range = {"$lte": high}
+    if low is not None:
+        id_range["$gt"] = low
+    weight = {"$convert": {"input": "$fish_weight", "to": "double", "onError": 0, "onNull": 0}}
+    facets = {
+        "lakes": [{"$group": {"_id": "$lake", "catches": {"$sum": 1}, "weight": {"$sum": weight},
+                              "anglers": {"$addToSet": "$user_id"}}}],
+    }
+    for section, expression in DIMENSIONS.items():
+        facets[section] = [
+            {"$group": {"_id": {"lake": "$lake", "value": expression}, "catches": {"$sum": 1},
+                        "weight": {"$sum": weight}, "anglers": {"$addToSet": "$user_id"}}},
+            {"$match": {"_id.value": {"$ne": None}}},
+        ]
+    return [
+        {"$match": {"_id": id_range, "lake": {"$type": "string", "$ne": ""}, "user_id": {"$exists": True}}},
+        {"$facet": facets},
+    ]
+
+
+def accumulator_ops(totals: Dict[str, List[Dict[str, Any]]]) -> List[UpdateOne]:
+    """Turn one batch's per-lake totals into $inc upserts on the lake accumulators"""
+    updates: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def lake_update(lake):
+        return updates.setdefault(lake, {"$inc": {}, "$set": {"dirty": True}, "$max": {}})
+
+    for row in totals.get("lakes", []):
+        update = lake_update(row["_id"])
+        update["$inc"]["catches"] = row["catches"]
+        update["$inc"]["weight"] = row["weight"]
+        for register, rank in angler_registers(row["anglers"]).items():
+            update["$max"][f"anglers.{register}"] = rank
+    for section in DIMENSIONS:
+        for row in totals.get(section, []):
+            update = lake_update(row["_id"]["lake"])
+            key = f"{section}.{bucket_key(row['_id']['value'])}"
+            update["$inc"][f"{key}.catches"] = row["catches"]
+            update["$inc"][f"{key}.weight"] = row["weight"]
+            update["$set"][f"{key}.value"] = row["_id"]["value"]
+            for register, rank in angler_registers(row["anglers"]).items():
+                update["$max"][f"{key}.anglers.{register}"] = rank
+
+    operations = []
+    for lake, update in updates.items():
+        if not update["$max"]:
+            del update["$max"]
+        operations.append(UpdateOne({"_id": lake}, update, upsert=True))
+    return operations
+
+
+def _ranked(section: Dict[str, Dict[str, Any]], by_value: bool = False) -> List[Dict[str, Any]]:
+    buckets = [bucket for bucket in section.values() if bucket["catches"] >= COMMUNITY_MIN_BUCKET_CATCHES
+               and anglers_at_least(bucket.get("anglers")) >= COMMUNITY_MIN_ANGLERS]
+    if by_value:
+        buckets.sort(key=lambda bucket: bucket["value"])
+    else:
+        buckets = sorted(buckets, key=lambda bucket: (-bucket["catches"], str(bucket["value"])))[:TOP_N]
+    return [{
+        "value": bucket["value"],
+        "catches": bucket["catches"],
+        "average_weight": round(bucket["weight"] / bucket["catches"], 2),
+    } for bucket in buckets]
+
+
+def snapshot(accumulator: Dict[str, Any], published_at: datetime) -> Optional[Dict[str, Any]]:
+    """The published view of one lake, or None while it is below the anonymisation thresholds"""
+    registers = accumulator.get("anglers")
+    catches = accumulator.get("catches", 0)
+    if anglers_at_least(registers) < COMMUNITY_MIN_ANGLERS or catches < COMMUNITY_MIN_CATCHES:
+        return None
+    return {
+        "_id": accumulator["_id"],
+        "lake": accumulator["_id"],
+        "anglers": anglers_estimate(registers),
+        "catches": catches,
+        "average_weight": round(accumulator.get("weight", 0) / catches, 2),
+        "top_baits": _ranked(accumulator.get("baits", {})),
+        "top_structures": _ranked(accumulator.get("structures", {})),
+        "hours": _ranked(accumulator.get("hours", {}), by_value=True),
+        "depth_bands": [{**band, "value": f"{band['value']:g}-{band['value'] + DEPTH_BAND:g}"}
+                        for band in _ranked(accumulator.get("depth_bands", {}), by_value=True)],
+        "updated_at": published_at,
+    }
+
+
+async def _acquire(db) -> Optional[Dict[str, Any]]:
+    """Take or renew the job lease; None when another process holds it"""
+    now = datetime.utcnow()
+    try:
+        return await db[STATE_COLLECTION].find_one_and_update(
+            {"_id": STATE_ID, "$or": [{"lease_expires_at": {"$lt": now}}, {"lease_owner": _owner},
+                                      {"lease_owner": {"$exists": False}}]},
+            {"$set": {"lease_owner": _owner, "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The state document exists and its lease is held elsewhere
+        return None
+
+
+async def _release(db):
+    await db[STATE_COLLECTION].update_one(
+        {"_id": STATE_ID, "lease_owner": _owner}, {"$set": {"lease_expires_at": datetime.utcnow()}})
+
+
+async def publish(db) -> int:
+    """Write snapshots for every lake changed since the last publish; returns the lakes published or withdrawn"""
+    published_at = datetime.utcnow()
+    operations, lakes = [], []
+    async for accumulator in db[STATS_COLLECTION].find({"dirty": True}):
+        lakes.append(accumulator["_id"])
+        lake_snapshot = snapshot(accumulator, published_at)
+        if lake_snapshot is None:
+            await db[SNAPSHOT_COLLECTION].delete_one({"_id": accumulator["_id"]})
+        else:
+            operations.append(ReplaceOne({"_id": accumulator["_id"]}, lake_snapshot, upsert=True))
+    if operations:
+        await db[SNAPSHOT_COLLECTION].bulk_write(operations, ordered=False)
+    if lakes:
+        await db[STATS_COLLECTION].update_many({"_id": {"$in": lakes}}, {"$unset": {"dirty": ""}})
+        COMMUNITY_PUBLISHED.inc(len(lakes))
+    return len(lakes)
+
+
+async def run_once(db, batch_size: int = COMMUNITY_BATCH_SIZE) -> Dict[str, Any]:
+    """Count new catches into the accumulators and publish; a no-op if another process holds the lease"""
+    state = await _acquire(db)
+    if state is None:
+        COMMUNITY_RUNS.inc(result="skipped")
+        return {"status": "skipped"}
+
+    try:
+        now = datetime.utcnow()
+        high_water = state.get("high_water")
+        rebuilt_at = state.get("rebuilt_at")
+        if rebuilt_at is None or now - rebuilt_at > timedelta(hours=COMMUNITY_REBUILD_HOURS) \
+                or state.get("accumulator_version") != ACCUMULATOR_VERSION:
+            # Start over so edited and deleted catches drop out; snapshots stay up until the rebuild catches up
+            await db[STATS_COLLECTION].delete_many({})
+            high_water = None
+            await db[STATE_COLLECTION].update_one(
+                {"_id": STATE_ID, "lease_owner": _owner},
+                {"$set": {"high_water": None, "rebuilt_at": now, "rebuilding": True,
+                          "accumulator_version": ACCUMULATOR_VERSION}})
+            state["rebuilding"] = True
+            logger.info("Rebuilding community lake accumulators")
+
+        processed = 0
+        while True:
+            id_filter = {"_id": {"$gt": high_water}} if high_water is not None else {}
+            boundary = await db.catches.find(id_filter, {"_id": 1}).sort("_id", 1) \
+                .skip(batch_size - 1).limit(1).to_list(length=1)
+            if not boundary:
+                boundary = await db.catches.find(id_filter, {"_id": 1}).sort("_id", -1).limit(1).to_list(length=1)
+            if not boundary:
+                break
+            upper = boundary[0]["_id"]
+
+            totals = await db.catches.aggregate(batch_pipeline(high_water, upper)).to_list(length=1)
+            operations = accumulator_ops(totals[0] if totals else {})
+            if operations:
+                await db[STATS_COLLECTION].bulk_write(operations, ordered=False)
+            batch_catches = sum(row["catches"] for row in (totals[0]["lakes"] if totals else []))
+            processed += batch_catches
+            COMMUNITY_CATCHES.inc(batch_catches)
+
+            high_water = upper
+            await db[STATE_COLLECTION].update_one(
+                {"_id": STATE_ID, "lease_owner": _owner},
+                {"$set": {"high_water": high_water,
+                          "lease_expires_at": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}})
+
+        published = await publish(db)
+        if state.get("rebuilding"):
+            # Lakes that no longer have any catches keep no accumulator; withdraw their snapshots
+            live_lakes = await db[STATS_COLLECTION].distinct("_id")
+            await db[SNAPSHOT_COLLECTION].delete_many({"_id": {"$nin": live_lakes}})
+            await db[STATE_COLLECTION].update_one({"_id": STATE_ID, "lease_owner": _owner},
+                                                  {"$unset": {"rebuilding": ""}})
+        await db[STATE_COLLECTION].update_one({"_id": STATE_ID, "lease_owner": _owner},
+                                              {"$set": {"last_run_at": datetime.utcnow()}})
+        COMMUNITY_RUNS.inc(result="ok")
+        return {"status": "ok", "processed": processed, "published": published}
+    except Exception:
+        COMMUNITY_RUNS.inc(result="error")
+        raise
+    finally:
+        await _release(db)
+
+
+async def _run_forever(db):
+    while True:
+        try:
+            result = await run_once(db)
+            if result.get("processed") or result.get("published"):
+                logger.info("Community job counted %d catches, published %d lakes",
+                            result["processed"], result["published"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Community snapshot job failed")
+        await asyncio.sleep(COMMUNITY_INTERVAL_SECONDS)
+
+
+def start(db):
+    """Schedule the job in this process (every app worker runs one; the lease keeps them from overlapping)"""
+    global _task
+    if COMMUNITY_ENABLED and _task is None:
+        _task = asyncio.create_task(_run_forever(db))
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+async def list_lakes(db) -> List[Dict[str, Any]]:
+    return await db[SNAPSHOT_COLLECTION].find(
+        {}, {"_id": 0, "lake": 1, "anglers": 1, "catches": 1, "average_weight": 1, "updated_at": 1}
+    ).sort("catches", -1).to_list(length=None)
+
+
+async def get_lake(db, lake: str) -> Optional[Dict[str, Any]]:
+    return await db[SNAPSHOT_COLLECTION].find_one({"_id": lake}, {"_id": 0})
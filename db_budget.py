@@ -0,0 +1,145 @@
+"""
+Per-request MongoDB operation budgets and N+1 detection.
+
+Middleware in main.py puts a RequestDbStats object into a contextvar for each
+request. Motor copies the context into its executor threads, so this module's
+CommandListener can attribute every command (including cursor getMores) to the
+request that issued it. After the response is produced the middleware adds a
+`Server-Timing` header, warns when a route exceeds its declared budget, and
+reports query shapes repeated often enough to suggest an N+1 pattern.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+import metrics
+from slow_query_log import redact, redact_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Identical query shapes repeated at least this many times in one request are reported
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("DB_N_PLUS_ONE_THRESHOLD", "5"))
+
+DB_BUDGET_EXCEEDED = metrics.REGISTRY.counter(
+    "db_budget_exceeded_total", "Requests that issued more MongoDB operations than their route budget",
+    ("method", "route"))
+DB_SUSPECTED_N_PLUS_ONE = metrics.REGISTRY.counter(
+    "db_suspected_n_plus_one_total", "Requests that repeated an identical query shape", ("method", "route"))
+DB_OPS_PER_REQUEST = metrics.REGISTRY.histogram(
+    "db_operations_per_request", "MongoDB operations issued per HTTP request", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144))
+
+
+class RequestDbStats:
+    """MongoDB work done on behalf of one request; updated from Motor executor threads"""
+
+    def __init__(self):
+        self.operations = 0
+        self.duration_ms = 0.0
+        self.shapes: Dict[str, List[float]] = {}  # shape -> [count, total ms]
+        self._pending: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, key, shape: str):
+        with self._lock:
+            self._pending[key] = shape
+
+    def finished(self, key, duration_ms: float):
+        with self._lock:
+            shape = self._pending.pop(key, None)
+            if shape is None:
+                return
+            self.operations += 1
+            self.duration_ms += duration_ms
+            entry = self.shapes.setdefault(shape, [0, 0.0])
+            entry[0] += 1
+            entry[1] += duration_ms
+
+    def repeated_shapes(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int, float]]:
+        with self._lock:
+            return sorted(
+                ((shape, int(count), round(total, 2)) for shape, (count, total) in self.shapes.items()
+                 if count >= threshold),
+                key=lambda item: -item[1],
+            )
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration_ms:.1f};desc="{self.operations} ops"'
+
+
+request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+# Declared MongoDB operation budgets per (method, route template)
+BUDGETS: Dict[Tuple[str, str], int] = {}
+
+
+def declare_budgets(budgets: Dict[Tuple[str, str], int]):
+    BUDGETS.update(budgets)
+
+
+def query_shape(command_name: str, command) -> str:
+    """A stable description of a command with literal values redacted"""
+    collection = command.get(command_name)
+    if command_name == "find":
+        detail = redact(command.get("filter", {}))
+    elif command_name == "aggregate":
+        detail = redact_pipeline(command.get("pipeline"))
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes", [])
+        detail = [redact(statement.get("q", {})) for statement in statements[:1]]
+    elif command_name == "findAndModify":
+        detail = redact(command.get("query", {}))
+    elif command_name == "getMore":
+        collection, detail = command.get("collection"), None
+    else:
+        detail = None
+    return f"{command_name} {collection} {json.dumps(detail, sort_keys=True, default=str)}"
+
+
+class BudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats.started((event.request_id, event.connection_id), query_shape(event.command_name, event.command))
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    @staticmethod
+    def _finished(event):
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats.finished((event.request_id, event.connection_id), event.duration_micros / 1000)
+
+
+LISTENER = BudgetListener()
+
+
+def report(method: str, route: str, stats: RequestDbStats):
+    """Record per-request metrics and warn about budget overruns and repeated query shapes"""
+    DB_OPS_PER_REQUEST.observe(stats.operations, method=method, route=route)
+
+    budget = BUDGETS.get((method, route))
+    if budget is not None and stats.operations > budget:
+        DB_BUDGET_EXCEEDED.inc(method=method, route=route)
+        logger.warning(
+            "MongoDB budget exceeded on %s %s: %d operations (budget %d), %.1f ms",
+            method, route, stats.operations, budget, stats.duration_ms,
+        )
+
+    repeated = stats.repeated_shapes()
+    if repeated:
+        DB_SUSPECTED_N_PLUS_ONE.inc(method=method, route=route)
+        for shape, count, total_ms in repeated:
+            logger.warning(
+                "Suspected N+1 on %s %s: %d x %s (%.1f ms total)", method, route, count, shape, total_ms
+            )
@@ -0,0 +1,118 @@
+"""
+Per-user event hub behind the `/events/stream` server-sent events endpoint.
+
+Write paths publish small events (a catch changed, an achievement was earned)
+to the user's subscribers in this process; each open stream is one
+subscriber with a bounded queue. Clients react to an event by fetching what
+changed (e.g. `/catches/sync`) instead of polling.
+
+The hub is in-process: with several uvicorn workers, a stream only sees
+events published by the worker serving it. Events are hints, not a log, so a
+client should refresh once on (re)connect and whenever it gets a `resync`
+event, which replaces anything dropped because its queue filled up.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import metrics
+
+QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "100"))
+KEEPALIVE_SECONDS = float(os.environ.get("EVENTS_KEEPALIVE_SECONDS", "15"))
+# Client reconnect delay sent with every stream
+RETRY_MS = 5000
+
+EVENT_STREAMS = metrics.REGISTRY.gauge("event_streams_open", "Server-sent event streams open in this process")
+EVENTS_PUBLISHED = metrics.REGISTRY.counter(
+    "events_published_total", "Events delivered to open streams, by type", ("type",))
+EVENTS_DROPPED = metrics.REGISTRY.counter(
+    "events_dropped_total", "Events dropped because a stream's queue was full")
+
+
+class Subscription:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.missed = False
+
+    def deliver(self, event: Optional[Dict[str, Any]]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client: drop this event and tell it to resync once it catches up
+            self.missed = True
+            EVENTS_DROPPED.inc()
+
+
+_subscribers: Dict[str, Set[Subscription]] = {}
+_next_id = 0
+
+
+def subscribe(user_id: str) -> Subscription:
+    subscription = Subscription(user_id)
+    _subscribers.setdefault(user_id, set()).add(subscription)
+    EVENT_STREAMS.inc()
+    return subscription
+
+
+def unsubscribe(subscription: Subscription):
+    subscribers = _subscribers.get(subscription.user_id)
+    if subscribers is None or subscription not in subscribers:
+        return
+    subscribers.discard(subscription)
+    if not subscribers:
+        del _subscribers[subscription.user_id]
+    EVENT_STREAMS.dec()
+
+
+def publish(user_id: str, event_type: str, data: Optional[Dict[str, Any]] = None):
+    """Send an event to every open stream of a user; never blocks the caller"""
+    subscribers = _subscribers.get(user_id)
+    if not subscribers:
+        return
+    global _next_id
+    _next_id += 1
+    event = {"id": _next_id, "type": event_type, "data": data or {}}
+    for subscription in subscribers:
+        subscription.deliver(event)
+    EVENTS_PUBLISHED.inc(len(subscribers), type=event_type)
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    data = json.dumps(event["data"], default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream(subscription: Subscription) -> AsyncIterator[str]:
+    """SSE text for one subscription, with a comment line every KEEPALIVE_SECONDS to keep proxies from timing out"""
+    try:
+        yield f"retry: {RETRY_MS}\nevent: ready\ndata: {{}}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            yield format_event(event)
+            if subscription.missed and subscription.queue.empty():
+                # Caught up with what was queued; whatever was dropped after it needs a refresh
+                subscription.missed = False
+                yield "event: resync\ndata: {}\n\n"
+    finally:
+        unsubscribe(subscription)
+
+
+def close_all():
+    """End every open stream, so shutdown doesn't wait for clients to disconnect"""
+    for subscribers in list(_subscribers.values()):
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
@@ -1,8 +1,11 @@
 // src/contexts/FishingContext.js
-import React, { createContext, useContext, useState, useCallback } from 'react';
+import React, { createContext, useContext, useState, useCallback, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { useAuth } from './AuthContext';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+// Delay before reopening the event stream after it fails
+const STREAM_RETRY_MS = 5000;
 
 const FishingContext = createContext();
 
@@ -19,6 +22,10 @@ export const FishingProvider = ({ children }) => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [newAchievements, setNewAchievements] = useState([]);
+  const { token } = useAuth();
+  // Position of the last /catches/sync, and whether catches have been loaded at all
+  const syncCursor = useRef(null);
+  const catchesLoaded = useRef(false);
 
   // Fetch all catches
   const fetchCatches = useCallback(async () => {
@@ -27,6 +34,8 @@ export const FishingProvider = ({ children }) => {
     try {
       const response = await axios.get(`${API_BASE_URL}/catches/`);
       setCatches(response.data);
+      catchesLoaded.current = true;
+      syncCursor.current = null;
     } catch (err) {
       // Handle authentication errors gracefully
       if (err.response?.status === 401 || err.response?.status === 403) {
@@ -41,6 +50,89 @@ export const FishingProvider = ({ children }) => {
     }
   }, []);
 
+  // Apply the changes since the last sync, paging through /catches/sync
+  const syncCatches = useCallback(async () => {
+    try {
+      let page;
+      do {
+        const params = syncCursor.current ? { since: syncCursor.current } : {};
+        page = (await axios.get(`${API_BASE_URL}/catches/sync`, { params })).data;
+        const { catches: changed, deleted, reset } = page;
+        setCatches(prev => {
+          const byId = new Map(reset ? [] : prev.map(c => [c._id, c]));
+          deleted.forEach(id => byId.delete(id));
+          changed.forEach(c => byId.set(c._id, c));
+          return Array.from(byId.values());
+        });
+        syncCursor.current = page.cursor;
+      } while (page.has_more);
+    } catch (err) {
+      // The next event or reconnect retries from the same cursor
+      if (err.response?.status === 400) {
+        syncCursor.current = null;
+      }
+      console.log('Error syncing catches:', err);
+    }
+  }, []);
+
+  // Server-sent events instead of polling: achievements as they're earned, catch changes from any device
+  useEffect(() => {
+    if (!token) {
+      return undefined;
+    }
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+
+    const refresh = () => {
+      if (catchesLoaded.current) {
+        syncCatches();
+      }
+    };
+
+    const connect = async () => {
+      try {
+        // EventSource can't send the Authorization header; a short-lived ticket keeps the token out of the URL
+        const { data } = await axios.post(`${API_BASE_URL}/events/ticket`);
+        if (closed) {
+          return;
+        }
+        source = new EventSource(`${API_BASE_URL}/events/stream?ticket=${encodeURIComponent(data.ticket)}`);
+      } catch (err) {
+        if (!closed && err.response?.status !== 401) {
+          retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+        }
+        return;
+      }
+      // Every (re)connect may have missed events
+      source.addEventListener('ready', refresh);
+      source.addEventListener('resync', refresh);
+      source.addEventListener('catches_changed', refresh);
+      source.addEventListener('achievement_earned', (event) => {
+        const achievement = JSON.parse(event.data);
+        setNewAchievements(prev => (
+          prev.some(a => a.achievement_id === achievement.achievement_id) ? prev : [...prev, achievement]
+        ));
+      });
+      source.onerror = () => {
+        // EventSource retries on its own, but with the same ticket, which will have expired
+        source.close();
+        if (!closed) {
+          retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) {
+        source.close();
+      }
+    };
+  }, [token, syncCatches]);
+
   // Create a new catch
   const createCatch = async (catchData) => {
     setLoading(true);
@@ -48,23 +140,7 @@ export const FishingProvider = ({ children }) => {
     try {
       const response = await axios.post(`${API_BASE_URL}/catches/`, catchData);
       setCatches(prev => [...prev, response.data]);
-      
-      // Check for new achievements after creating a catch
-      try {
-        const achievementResponse = await axios.post(`${API_BASE_URL}/achievements/check`);
-        if (achievementResponse.data.new_achievements > 0) {
-          // Get the achievement details
-          const achievementsResponse = await axios.get(`${API_BASE_URL}/achievements/`);
-          const earnedAchievements = achievementsResponse.data.filter(a => a.earned);
-          const newEarned = earnedAchievements.filter(achievement => 
-            !newAchievements.some(na => na.achievement_id === achievement.achievement_id)
-          );
-          setNewAchievements(prev => [...prev, ...newEarned]);
-        }
-      } catch (achievementErr) {
-        console.log('Error checking achievements:', achievementErr);
-      }
-      
+      // New achievements arrive on the event stream
       return { success: true, data: response.data };
     } catch (err) {
       const errorMsg = 'Failed to create catch: ' + (err.response?.data?.detail || err.message);
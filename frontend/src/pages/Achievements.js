@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Trophy, Star, Target, CheckCircle, Clock, Award } from 'lucide-react';
 import axios from 'axios';
+import { useFishing } from '../contexts/FishingContext';
 import './Achievements.css';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
@@ -10,10 +11,12 @@ const Achievements = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedCategory, setSelectedCategory] = useState('all');
+  const { newAchievements } = useFishing();
 
+  // Reload when the event stream reports a new award
   useEffect(() => {
     loadAchievements();
-  }, []);
+  }, [newAchievements.length]);
 
   const loadAchievements = async () => {
     try {
@@ -284,6 +284,9 @@ const BulkUpload = () => {
             {uploadResult.details && (
               <div className="result-details">
                 <p>Success: {uploadResult.details.successCount}</p>
+                {uploadResult.details.duplicateCount > 0 && (
+                  <p>Skipped (already uploaded): {uploadResult.details.duplicateCount}</p>
+                )}
                 <p>Errors: {uploadResult.details.errorCount}</p>
                 {uploadResult.details.errors && (
                   <ul>
@@ -0,0 +1,280 @@
+"""
+Global leaderboards.
+
+Boards:
+- `points`: achievement points;
+- `catch_count`: catches logged;
+- `heaviest:<species>`: heaviest fish of each species.
+
+Every (board, user) score is one document in `leaderboard_entries`. An index on
+(board, score desc, user_id) backs paginated reads and rank lookups, so
+neither ever aggregates catches. A catch write updates the writer's entries
+from the catches it added and removed: a `$inc` of catch_count and a `$max` of
+each heaviest board, each an O(log n) index update. Only removing a user's
+heaviest fish of a species recomputes that one board from their catches of
+the species. Points are recomputed when the user earns an achievement.
+
+Each app process also keeps the top TOP_K entries of every board it has served
+in memory, as a sorted list updated by bisection as scores change. The first
+pages are served from there. A process only sees its own writes, so the
+in-memory list is reloaded from the collection after CACHE_SECONDS.
+"""
+
+import bisect
+import math
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, UpdateOne
+
+COLLECTION_NAME = "leaderboard_entries"
+TOP_K = int(os.environ.get("LEADERBOARD_TOP_K", "100"))
+CACHE_SECONDS = float(os.environ.get("LEADERBOARD_CACHE_SECONDS", "30"))
+FIXED_BOARDS = ("points", "catch_count")
+HEAVIEST_PREFIX = "heaviest:"
+
+
+class TopK:
+    """The top of one board, ordered by score descending then user_id.
+
+    `keys` is always an exact prefix of the board. `exhaustive` means it is the
+    whole board; otherwise entries below the last one aren't known here.
+    """
+
+    def __init__(self, entries: List[Tuple[float, str]], exhaustive: bool):
+        self.keys = sorted((-score, user_id) for score, user_id in entries)
+        self.scores = {user_id: -negated for negated, user_id in self.keys}
+        self.exhaustive = exhaustive
+        self.loaded_at = time.monotonic()
+
+    def update(self, user_id: str, score: Optional[float]):
+        """Move a user to their new score (None removes them); O(log K) to find each position"""
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old, user_id))]
+        if score is None:
+            return
+        key = (-score, user_id)
+        # Below the last known entry, an unknown entry might rank higher
+        if self.exhaustive or (self.keys and key < self.keys[-1]):
+            bisect.insort(self.keys, key)
+            self.scores[user_id] = score
+            if len(self.keys) > TOP_K:
+                _, dropped = self.keys.pop()
+                del self.scores[dropped]
+                self.exhaustive = False
+
+    def page(self, offset: int, limit: int) -> Optional[List[Tuple[float, str]]]:
+        """A page of (score, user_id), or None if it can't be answered from memory"""
+        if time.monotonic() - self.loaded_at > CACHE_SECONDS:
+            return None
+        if offset + limit > len(self.keys) and not self.exhaustive:
+            return None
+        return [(-negated, user_id) for negated, user_id in self.keys[offset:offset + limit]]
+
+
+_top: Dict[str, TopK] = {}
+
+
+def heaviest_board(species: str) -> str:
+    return f"{HEAVIEST_PREFIX}{species}"
+
+
+def _entry_op(board: str, user_id: str, score: float, now: datetime) -> UpdateOne:
+    return UpdateOne(
+        {"_id": {"board": board, "user_id": user_id}},
+        {"$set": {"board": board, "user_id": user_id, "score": score, "updated_at": now}},
+        upsert=True,
+    )
+
+
+def _record(board: str, user_id: str, score: Optional[float]):
+    top = _top.get(board)
+    if top is not None:
+        top.update(user_id, score)
+
+
+def catch_weight(value) -> Optional[float]:
+    """A catch weight as the $convert to double in refresh_catches reads it"""
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        return None
+    return weight if math.isfinite(weight) else None
+
+
+def _heaviest(documents: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """The heaviest positive weight of each species among some catches, by board"""
+    heaviest: Dict[str, float] = {}
+    for document in documents:
+        species, weight = document.get("species"), catch_weight(document.get("fish_weight"))
+        if isinstance(species, str) and species and weight is not None and weight > 0:
+            board = heaviest_board(species)
+            heaviest[board] = max(weight, heaviest.get(board, weight))
+    return heaviest
+
+
+async def _recompute_heaviest(db, user_id: str, board: str) -> Optional[float]:
+    """Rebuild one heaviest board entry from the user's catches of that species"""
+    rows = await db.catches.aggregate([
+        {"$match": {"user_id": user_id, "species": board[len(HEAVIEST_PREFIX):]}},
+        {"$group": {"_id": None, "heaviest": {"$max": {"$convert": {"input": "$fish_weight", "to": "double",
+                                                                     "onError": None, "onNull": None}}}}},
+    ]).to_list(length=1)
+    heaviest = rows[0]["heaviest"] if rows else None
+    if heaviest is None or heaviest <= 0:
+        await db[COLLECTION_NAME].delete_one({"_id": {"board": board, "user_id": user_id}})
+        return None
+    await db[COLLECTION_NAME].bulk_write([_entry_op(board, user_id, heaviest, datetime.utcnow())])
+    return heaviest
+
+
+async def apply_changes(db, user_id: str, added: Iterable[Dict[str, Any]] = (),
+                        removed: Iterable[Dict[str, Any]] = ()):
+    """Update a user's catch boards for one write: catches as they are now in `added`, as they were in `removed`"""
+    added, removed = list(added), list(removed)
+    gained, lost = _heaviest(added), _heaviest(removed)
+    # A board can only go down if a removed catch was at least as heavy as anything added to it
+    lost = {board: weight for board, weight in lost.items() if gained.get(board, 0) < weight}
+    count = len(added) - len(removed)
+
+    now = datetime.utcnow()
+    operations = []
+    if count:
+        operations.append(UpdateOne(
+            {"_id": {"board": "catch_count", "user_id": user_id}},
+            {"$inc": {"score": count}, "$set": {"board": "catch_count", "user_id": user_id, "updated_at": now}},
+            upsert=True,
+        ))
+    operations.extend(UpdateOne(
+        {"_id": {"board": board, "user_id": user_id}},
+        {"$max": {"score": weight}, "$set": {"board": board, "user_id": user_id, "updated_at": now}},
+        upsert=True,
+    ) for board, weight in gained.items())
+    if operations:
+        await db[COLLECTION_NAME].bulk_write(operations, ordered=False)
+
+    touched = (["catch_count"] if count else []) + list(gained) + [board for board in lost if board not in gained]
+    if not touched:
+        return
+    scores = {entry["board"]: entry["score"] async for entry in db[COLLECTION_NAME].find(
+        {"_id": {"$in": [{"board": board, "user_id": user_id} for board in touched]}}, {"board": 1, "score": 1})}
+    for board, weight in lost.items():
+        # Still at the removed weight: that catch was (one of) the heaviest, so the next one down is needed
+        if board in scores and scores[board] <= weight:
+            scores[board] = await _recompute_heaviest(db, user_id, board)
+    for board in touched:
+        _record(board, user_id, scores.get(board))
+
+
+async def refresh_catches(db, user_id: str):
+    """Recompute a user's catch_count and heaviest-per-species scores from all their catches (backfills)"""
+    rows = await db.catches.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": "$species",
+            "count": {"$sum": 1},
+            "heaviest": {"$max": {"$convert": {"input": "$fish_weight", "to": "double",
+                                               "onError": None, "onNull": None}}},
+        }},
+    ]).to_list(length=None)
+
+    now = datetime.utcnow()
+    catch_count = sum(row["count"] for row in rows)
+    heaviest = {heaviest_board(row["_id"]): row["heaviest"] for row in rows
+                if isinstance(row["_id"], str) and row["_id"] and row["heaviest"] is not None
+                and row["heaviest"] > 0}
+    operations = [_entry_op("catch_count", user_id, catch_count, now)]
+    operations.extend(_entry_op(board, user_id, score, now) for board, score in heaviest.items())
+    # Species the user no longer has any weighed catches of
+    operations.append(DeleteMany({"user_id": user_id, "board": {"$regex": f"^{HEAVIEST_PREFIX}",
+                                                                 "$nin": list(heaviest)}}))
+    await db[COLLECTION_NAME].bulk_write(operations, ordered=False)
+
+    _record("catch_count", user_id, catch_count)
+    for board in list(_top):
+        if board.startswith(HEAVIEST_PREFIX):
+            _record(board, user_id, heaviest.get(board))
+
+
+async def refresh_points(db, user_id: str):
+    """Recompute a user's achievement points"""
+    earned = [user_achievement["achievement_id"] async for user_achievement in
+              db.user_achievements.find({"user_id": user_id}, {"achievement_id": 1})]
+    points = 0
+    if earned:
+        ids = [ObjectId(achievement_id) for achievement_id in earned if ObjectId.is_valid(achievement_id)]
+        async for achievement in db.achievements.find({"_id": {"$in": ids}}, {"points": 1}):
+            points += achievement.get("points", 0)
+    await db[COLLECTION_NAME].bulk_write([_entry_op("points", user_id, points, datetime.utcnow())])
+    _record("points", user_id, points)
+
+
+async def remove_users(db, user_ids: List[str]):
+    """Take deleted users off every board"""
+    await db[COLLECTION_NAME].delete_many({"user_id": {"$in": user_ids}})
+    for top in _top.values():
+        for user_id in user_ids:
+            top.update(user_id, None)
+
+
+async def clear_catch_boards(db):
+    """Drop every catch_count and heaviest score once all catches are gone; points come from achievements and stay"""
+    await db[COLLECTION_NAME].delete_many({"board": {"$ne": "points"}})
+    for board in list(_top):
+        if board != "points":
+            del _top[board]
+
+
+async def page(db, board: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+    """Ranked entries offset+1 .. offset+limit of a board"""
+    top = _top.get(board)
+    rows = top.page(offset, limit) if top is not None else None
+    if rows is None:
+        if offset + limit <= TOP_K:
+            # Reload the whole top of the board so the next pages come from memory
+            entries = await db[COLLECTION_NAME].find({"board": board}, {"score": 1, "user_id": 1}) \
+                .sort([("score", -1), ("user_id", 1)]).limit(TOP_K).to_list(length=TOP_K)
+            top = _top[board] = TopK([(entry["score"], entry["user_id"]) for entry in entries],
+                                     exhaustive=len(entries) < TOP_K)
+            rows = top.page(offset, limit)
+        else:
+            entries = await db[COLLECTION_NAME].find({"board": board}, {"score": 1, "user_id": 1}) \
+                .sort([("score", -1), ("user_id", 1)]).skip(offset).limit(limit).to_list(length=limit)
+            rows = [(entry["score"], entry["user_id"]) for entry in entries]
+    return [{"rank": offset + i + 1, "user_id": user_id, "score": score} for i, (score, user_id) in enumerate(rows)]
+
+
+async def score(db, board: str, user_id: str) -> Optional[float]:
+    """A user's score on a board, or None if they have none"""
+    entry = await db[COLLECTION_NAME].find_one({"_id": {"board": board, "user_id": user_id}}, {"score": 1})
+    return entry["score"] if entry is not None else None
+
+
+async def heaviest(db, user_id: str) -> Optional[float]:
+    """A user's heaviest fish of any species, from their heaviest board entries"""
+    entries = await db[COLLECTION_NAME].find({"user_id": user_id, "board": {"$regex": f"^{HEAVIEST_PREFIX}"}},
+                                             {"score": 1}).sort([("score", -1)]).limit(1).to_list(length=1)
+    return entries[0]["score"] if entries else None
+
+
+async def rank(db, board: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """A user's rank on a board (1 = top), or None if they have no score on it"""
+    entry = await db[COLLECTION_NAME].find_one({"_id": {"board": board, "user_id": user_id}}, {"score": 1})
+    if entry is None:
+        return None
+    score = entry["score"]
+    # Entries ahead of this one in (score desc, user_id) order, counted on the index
+    ahead = await db[COLLECTION_NAME].count_documents({
+        "board": board,
+        "$or": [{"score": {"$gt": score}}, {"score": score, "user_id": {"$lt": user_id}}],
+    })
+    return {"rank": ahead + 1, "score": score}
+
+
+async def boards(db) -> List[str]:
+    return list(FIXED_BOARDS) + sorted(
+        board for board in await db[COLLECTION_NAME].distinct("board") if board.startswith(HEAVIEST_PREFIX))
@@ -1,20 +1,44 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, status
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ExecutionTimeout, OperationFailure
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import time, datetime, timedelta
-import pandas as pd
+from contextlib import asynccontextmanager, contextmanager
 from bson import ObjectId
 from bson import json_util
 import json
 import csv
 import io
+import hashlib
 import os
+import math
+import asyncio
 import secrets
 import logging
+import time as time_module
+import uuid
+import analysis
+import analysis_pool
+import catch_cache
+import catch_sync
+import community
+import db_budget
+import events
+import leaderboards
+import metrics
+import migrations
+import profiling
+import rate_limit
+import singleflight
+import sketches
+import slow_query_log
+import structured_logging
+import synthetic_data
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
@@ -22,18 +46,30 @@ from dotenv import load_dotenv
 # Load environment variables
 env_file = '.env.local' if os.path.exists('.env.local') else '.env'
 load_dotenv(env_file)
-print(f"Loaded environment from: {env_file}")
+structured_logging.configure_logging()
+logger = logging.getLogger(__name__)
+logger.info("Loaded environment from: %s", env_file)
 
 # Security configuration
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Lifetime of the single-purpose tokens /events/stream accepts in its query string
+EVENTS_TICKET_SECONDS = int(os.environ.get("EVENTS_TICKET_SECONDS", "60"))
+
+# Start the analysis worker processes in the background after start-up (PANDAS_WARMUP is the old name)
+ANALYSIS_WARMUP = os.environ.get("ANALYSIS_WARMUP", os.environ.get("PANDAS_WARMUP", "true")).lower() in ("1", "true", "yes")
+
+# Comma-separated usernames allowed to call admin endpoints
+ADMIN_USERNAMES = {name.strip() for name in os.environ.get("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Token security
 security = HTTPBearer()
+# For routes that also accept the token as a query parameter
+optional_security = HTTPBearer(auto_error=False)
 
 # --- Authentication Models ---
 class UserCreate(BaseModel):
@@ -123,12 +159,20 @@ class CatchResponse(BaseModel):
     weight_pegged: Optional[bool] = Field(None, example=True)  # Weight pegged - tick/no tick
     hook_size: Optional[str] = Field(None, example="2/0")  # Hook and size
     comments: Optional[str] = Field(None, example="Good Fight")
+    updated_at: Optional[datetime] = None
     
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
     )
 
+class CatchSyncResponse(BaseModel):
+    catches: List[CatchResponse]
+    deleted: List[str]  # ids of catches deleted since the cursor
+    reset: bool  # drop the local copy before applying this page
+    cursor: str  # pass as `since` for the next page, or the next sync once has_more is false
+    has_more: bool
+
 # Model for requesting analysis
 class AnalysisRequest(BaseModel):
     analysis_type: str = Field(..., example="bait_success")
@@ -142,12 +186,94 @@ class AdvancedAnalysisRequest(BaseModel):
     filters: Optional[Dict[str, Any]] = None
     limit: Optional[int] = Field(10)
 
+# Model for time-series trends
+class TrendsRequest(BaseModel):
+    period: str = Field("month", pattern="^(day|week|month|season)$")
+    window: int = Field(3, ge=1, le=366)  # Rolling window length, in periods
+    species: Optional[str] = Field(None, example="Largemouth Bass")
+    lake: Optional[str] = Field(None, example="Lake Serene")
+    start_date: Optional[str] = Field(None, example="2023-01-01")  # Inclusive, YYYY-MM-DD
+    end_date: Optional[str] = Field(None, example="2024-12-31")  # Inclusive, YYYY-MM-DD
+    compare_years: bool = Field(True)
+
+# Model for numeric histograms
+class HistogramRequest(BaseModel):
+    field: str = Field(..., pattern=f"^({'|'.join(analysis.NUMERIC_COLUMNS)})$", example="water_temp")
+    bins: int = Field(5, ge=1, le=100)
+    strategy: str = Field("equal_width", pattern="^(equal_width|equal_count)$")
+    edges: Optional[List[float]] = Field(None, max_length=101)  # Explicit bin edges; overrides bins and strategy
+    percentiles: List[float] = Field([0.5, 0.9], max_length=10)
+    species: Optional[str] = Field(None, example="Largemouth Bass")
+    lake: Optional[str] = Field(None, example="Lake Serene")
+
 # Model for bulk upload response
 class BulkUploadResponse(BaseModel):
     success: bool
     message: str
     details: Dict[str, Any]
 
+# Models for batch catch updates and deletes
+MAX_BATCH_ITEMS = 1000
+# Catch fields fetched before an update or delete, to take the old values out of derived data
+CATCH_CHANGE_PROJECTION = {**sketches.PROJECTION, **catch_cache.PROJECTION}
+
+class CatchPatch(BaseModel):
+    """Fields to set on every selected catch; omitted fields are left unchanged, null clears an optional one"""
+    date: Optional[str] = Field(None, example="2024-01-15")
+    time: Optional[str] = Field(None, example="07:30:00")
+    location: Optional[str] = None
+    lake: Optional[str] = Field(None, example="Lake Serene")
+    structure: Optional[str] = Field(None, example="Weeds")
+    water_temp: Optional[float] = None
+    water_quality: Optional[str] = None
+    line_type: Optional[str] = None
+    boat_depth: Optional[float] = None
+    bait_depth: Optional[float] = None
+    bait: Optional[str] = Field(None, example="Senko")
+    bait_type: Optional[str] = None
+    bait_colour: Optional[str] = None
+    scented: Optional[bool] = None
+    fish_weight: Optional[float] = None
+    species: Optional[str] = Field(None, example="Largemouth Bass")
+    line_weight: Optional[float] = None
+    weight_pegged: Optional[bool] = None
+    hook_size: Optional[str] = None
+    comments: Optional[str] = None
+
+# Catch fields a patch may clear with null; the others are required on every catch
+CLEARABLE_CATCH_FIELDS = {name for name, field in CatchCreate.model_fields.items() if not field.is_required()}
+
+class CatchBatchFilter(BaseModel):
+    lake: Optional[str] = None
+    species: Optional[str] = None
+    bait: Optional[str] = None
+    bait_type: Optional[str] = None
+    structure: Optional[str] = None
+    date_from: Optional[str] = Field(None, example="2024-01-01")  # Inclusive, YYYY-MM-DD
+    date_to: Optional[str] = Field(None, example="2024-12-31")  # Inclusive, YYYY-MM-DD
+
+class CatchBatchDeleteRequest(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=MAX_BATCH_ITEMS)
+    filter: Optional[CatchBatchFilter] = None
+
+class CatchBatchUpdateRequest(CatchBatchDeleteRequest):
+    patch: CatchPatch
+
+# Model for generating a synthetic dataset
+class SampleDataRequest(BaseModel):
+    users: int = Field(5, ge=1, le=1000)
+    catches_per_user: int = Field(50, ge=1, le=10000)
+    seed: int = Field(42)
+    password: str = Field("sample-password", min_length=6)
+    clear: bool = Field(True)  # Remove previously generated synthetic data first
+
+# Model for the request profiling switch
+class ProfilingConfigRequest(BaseModel):
+    enabled: bool = Field(..., example=True)
+    mode: str = Field("cpu", pattern="^(cpu|memory)$")
+    sample_rate: float = Field(0.01, ge=0.0, le=1.0)
+    routes: Optional[List[str]] = Field(None, example=["/catches/bulk", "/analyze/", "/achievements/"])
+
 # --- Achievement Models ---
 class Achievement(BaseModel):
     id: str = Field(alias="_id")
@@ -187,6 +313,132 @@ class AchievementProgress(BaseModel):
     progress: Dict[str, Any]
     earned_at: Optional[datetime] = None
 
+# --- Database Setup ---
+# Get MongoDB URI from environment variable, default to localhost for development
+MONGO_URL = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "bite_tracker_db")
+
+# Each worker process gets its own pool; split the connection budget across workers
+WEB_CONCURRENCY = max(int(os.environ.get("WEB_CONCURRENCY", "1")), 1)
+MONGO_TOTAL_POOL_SIZE = int(os.environ.get("MONGO_TOTAL_POOL_SIZE", "100"))
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "0")) or max(MONGO_TOTAL_POOL_SIZE // WEB_CONCURRENCY, 10)
+
+# Created per worker in the lifespan handler, never at import time, so forked workers
+# never share a client or its sockets
+client = None
+db = None
+catches_collection = None
+users_collection = None
+achievements_collection = None
+user_achievements_collection = None
+
+def connect_to_mongo():
+    global client, db, catches_collection, users_collection, achievements_collection, user_achievements_collection
+    # Listeners feed /metrics, the slow-query log and per-request operation budgets
+    client = AsyncIOMotorClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        event_listeners=[
+            metrics.CommandMetricsListener(),
+            metrics.PoolMetricsListener(),
+            slow_query_log.LISTENER,
+            db_budget.LISTENER,
+        ],
+    )
+    db = client[DB_NAME]
+    catches_collection = db.catches
+    users_collection = db.users
+    achievements_collection = db.achievements
+    user_achievements_collection = db.user_achievements
+
+def close_mongo():
+    if client is not None:
+        client.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_to_mongo()
+    # Motor connects lazily, so the app can serve traffic before anything below has finished
+    startup_task = asyncio.create_task(deferred_startup())
+    yield
+    startup_task.cancel()
+    events.close_all()
+    await community.stop()
+    await slow_query_log.stop()
+    analysis_pool.shutdown()
+    close_mongo()
+
+async def deferred_startup():
+    """Start-up work that doesn't have to finish before the first request is served"""
+    started = time_module.perf_counter()
+    try:
+        await db.command("ping")
+        logger.info("MongoDB connection successful, database %s (pool size %d, pid %d)",
+                    DB_NAME, MONGO_MAX_POOL_SIZE, os.getpid())
+        logger.info("Allowed CORS origins: %s", allowed_origins)
+        
+        await ensure_indexes()
+        # Initialize achievements
+        await initialize_achievements()
+        await slow_query_log.start(db)
+        community.start(db)
+    except Exception as e:
+        logger.error("MongoDB connection failed: %s", e)
+    if ANALYSIS_WARMUP:
+        await analysis_pool.warm_up()
+    logger.info("Deferred start-up finished in %.0f ms", (time_module.perf_counter() - started) * 1000)
+
+# Set once the unique username and email indexes exist; until then registration checks for duplicates itself
+unique_user_indexes = False
+
+async def ensure_indexes():
+    """Create the indexes the app relies on; safe to run concurrently from every worker"""
+    global unique_user_indexes
+    index_specs = [
+        (achievements_collection, [("name", 1)], {"unique": True}),
+        # Registration and profile updates rely on these instead of checking for an existing user first
+        (users_collection, [("username", 1)], {"unique": True}),
+        (users_collection, [("email", 1)], {"unique": True}),
+        # Re-uploaded bulk rows are rejected by this index instead of being looked up one by one
+        (catches_collection, [("user_id", 1), ("row_hash", 1)],
+         {"unique": True, "partialFilterExpression": {"row_hash": {"$exists": True}}}),
+        (db[sketches.COLLECTION_NAME], [("user_id", 1)], {}),
+        # Leaderboard pages and rank counts walk this index
+        (db[leaderboards.COLLECTION_NAME], [("board", 1), ("score", -1), ("user_id", 1)], {}),
+        (db[leaderboards.COLLECTION_NAME], [("user_id", 1)], {}),
+        # Delta sync pages through a user's catches in write order; tombstones expire on their own
+        (catches_collection, [("user_id", 1), ("updated_at", 1), ("_id", 1)], {}),
+        (db[catch_sync.COLLECTION_NAME], [("user_id", 1), ("deleted_at", 1)], {}),
+        (db[catch_sync.COLLECTION_NAME], [("deleted_at", 1)],
+         {"expireAfterSeconds": int(catch_sync.TOMBSTONE_DAYS * 86400)}),
+    ]
+    failed_users_indexes = False
+    for collection, keys, options in index_specs:
+        try:
+            await collection.create_index(keys, **options)
+        except OperationFailure as e:
+            logger.error("Could not create index %s on %s: %s", keys, collection.name, e)
+            failed_users_indexes |= collection is users_collection
+    unique_user_indexes = not failed_users_indexes
+    if failed_users_indexes:
+        logger.error("Unique user indexes are missing; registration and profile updates fall back to "
+                     "checking for duplicates first, which can race. Merge the duplicate users and restart.")
+
+async def find_user_conflict(username: Optional[str], email: Optional[str], exclude_id=None) -> Optional[str]:
+    """Which of username or email another user already has, when the unique indexes can't be relied on"""
+    if unique_user_indexes:
+        return None
+    conditions = [{"username": username}] if username is not None else []
+    if email is not None:
+        conditions.append({"email": email})
+    query: Dict[str, Any] = {"$or": conditions}
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+    existing = await users_collection.find_one(query, {"username": 1, "email": 1})
+    if existing is None:
+        return None
+    return "Username" if username is not None and existing.get("username") == username else "Email"
+
 # --- FastAPI App Setup ---
 app = FastAPI(
     title="BiteTracker API",
@@ -194,21 +446,10 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
-# Get MongoDB URI from environment variable, default to localhost for development
-MONGO_URL = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
-DB_NAME = os.environ.get("DB_NAME", "bite_tracker_db")
-
-# Initialize MongoDB client
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
-catches_collection = db.catches
-users_collection = db.users
-achievements_collection = db.achievements
-user_achievements_collection = db.user_achievements
-
 # --- Authentication Helper Functions ---
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -233,15 +474,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await user_from_token(credentials.credentials)
+
+async def user_from_token(token: str, scope: Optional[str] = None):
+    """The user a token was issued to; tokens scoped to one use (event stream tickets) only pass for that scope"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("scope") != scope:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
@@ -252,6 +497,61 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise credentials_exception
     return user
 
+def is_admin_token(authorization: Optional[str]) -> bool:
+    """Check a raw Authorization header for an admin token without a database lookup"""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    return payload.get("scope") is None and payload.get("sub") in ADMIN_USERNAMES
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if current_user["username"] not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
+
+@contextmanager
+def admission(route_class: str, user_id: str):
+    """Hold one admission through the caller's token bucket and the expensive-work cap"""
+    if not rate_limit.ENABLED:
+        yield
+        return
+    try:
+        rate_limit.LIMITER.admit(route_class, user_id)
+    except rate_limit.Rejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    try:
+        yield
+    finally:
+        rate_limit.LIMITER.release(route_class)
+
+def rate_limited(route_class: str):
+    """Dependency that admits a request through the caller's token bucket and the expensive-work cap"""
+    async def admit(current_user: dict = Depends(get_current_user)):
+        with admission(route_class, str(current_user["_id"])):
+            yield
+    return admit
+
+async def coalesced_analysis(route: str, user_id: str, body: Any, call):
+    """Share one computation among identical concurrent analysis requests.
+
+    Only the computation is admitted by the rate limiter, so requests that join it
+    take neither a token nor a concurrency slot; a rejection is shared like a result.
+    """
+    async def admitted():
+        with admission("analysis", user_id):
+            return await call()
+    return await singleflight.run(route, user_id, body, admitted)
+
 # Get the frontend URL from environment variable, with localhost as fallback
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:3000")
 VERCEL_URL = os.environ.get("VERCEL_URL", "")  # Vercel will provide this
@@ -280,19 +580,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup_event():
+# Optional bearer token protecting /metrics
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Declared MongoDB operations per request (auth lookup included); exceeding one logs a warning
+db_budget.declare_budgets({
+    ("POST", "/auth/register"): 2,
+    ("POST", "/auth/login"): 1,
+    ("GET", "/auth/me"): 1,
+    ("PUT", "/auth/profile"): 3,
+    ("POST", "/catches/"): 10,
+    ("GET", "/catches/"): 4,
+    ("GET", "/catches/sync"): 4,
+    ("GET", "/catches/{catch_id}"): 2,
+    ("PUT", "/catches/{catch_id}"): 8,
+    ("DELETE", "/catches/{catch_id}"): 8,
+    ("POST", "/catches/bulk"): 14,
+    ("POST", "/catches/batch/update"): 9,
+    ("POST", "/catches/batch/delete"): 9,
+    ("POST", "/analyze/"): 5,
+    ("POST", "/analyze/advanced/"): 2,
+    ("POST", "/analyze/trends"): 2,
+    ("POST", "/analyze/histogram"): 3,
+    ("GET", "/catches/options/{field_name}"): 2,
+    ("GET", "/catches/stats/overview"): 3,
+    ("GET", "/catches/stats/quantiles"): 2,
+    ("GET", "/community/lakes"): 2,
+    ("GET", "/community/lakes/{lake}"): 2,
+    ("GET", "/achievements/"): 6,
+    ("POST", "/achievements/check"): 12,
+    ("POST", "/events/ticket"): 1,
+    ("GET", "/events/stream"): 1,
+    ("GET", "/leaderboards"): 2,
+    ("GET", "/leaderboards/{board}"): 3,
+    ("GET", "/leaderboards/{board}/me"): 3,
+})
+
+# The middlewares below are declared innermost first: metrics resolves the route for the others
+@app.middleware("http")
+async def track_db_operations(request: Request, call_next):
+    stats = db_budget.RequestDbStats()
+    stats_token = db_budget.request_db_stats.set(stats)
     try:
-        await db.command("ping")
-        print("MongoDB connection successful!")
-        print(f"Connected to database: {DB_NAME}")
-        print(f"Allowed CORS origins: {allowed_origins}")
-        
-        # Initialize achievements
-        await initialize_achievements()
-    except Exception as e:
-        print(f"MongoDB connection failed: {e}")
-        print(f"Connection string used: {MONGO_URL}")
+        response = await call_next(request)
+    finally:
+        db_budget.request_db_stats.reset(stats_token)
+    response.headers["Server-Timing"] = stats.server_timing()
+    db_budget.report(request.method, metrics.current_route.get() or request.url.path, stats)
+    return response
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    header_mode = request.headers.get("x-profile")
+    route = metrics.current_route.get() or request.url.path
+    mode = profiling.select_mode(
+        route, header_mode, header_mode is not None and is_admin_token(request.headers.get("authorization"))
+    )
+    if mode is None:
+        return await call_next(request)
+    response, profile = await profiling.profile_request(route, request.method, mode, lambda: call_next(request))
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    route = metrics.resolve_route(app, request.scope)
+    route_token = metrics.current_route.set(route)
+    method = request.method
+    metrics.HTTP_REQUESTS_IN_PROGRESS.inc(method=method, route=route)
+    started = time_module.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.HTTP_REQUEST_DURATION.observe(time_module.perf_counter() - started, method=method, route=route)
+        metrics.HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+        if status_code >= 500:
+            metrics.HTTP_REQUEST_ERRORS.inc(method=method, route=route)
+        metrics.HTTP_REQUESTS_IN_PROGRESS.dec(method=method, route=route)
+        metrics.current_route.reset(route_token)
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    incoming = request.headers.get("x-request-id", "")
+    current_request_id = incoming if 0 < len(incoming) <= 64 and incoming.isprintable() else uuid.uuid4().hex
+    request_id_token = structured_logging.request_id.set(current_request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        structured_logging.request_id.reset(request_id_token)
+    response.headers["X-Request-ID"] = current_request_id
+    return response
 
 @app.get("/")
 async def root():
@@ -302,52 +682,48 @@ async def root():
 @app.post("/auth/register", response_model=UserResponse)
 async def register_user(user: UserCreate):
     try:
-        # Check if username already exists
-        existing_user = await users_collection.find_one({"username": user.username})
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already registered"
-            )
-        
-        # Check if email already exists
-        existing_email = await users_collection.find_one({"email": user.email})
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
-        # Create new user
+        # Create new user; the unique username and email indexes reject duplicates
         hashed_password = get_password_hash(user.password)
+        now = datetime.utcnow()
         user_data = {
             "username": user.username,
             "email": user.email,
             "full_name": user.full_name or None,
             "hashed_password": hashed_password,
-            "created_at": datetime.utcnow(),
+            # MongoDB stores milliseconds; match what later reads of the user return
+            "created_at": now.replace(microsecond=now.microsecond // 1000 * 1000),
             "is_active": True
         }
         
-        result = await users_collection.insert_one(user_data)
-        created_user = await users_collection.find_one({"_id": result.inserted_id})
+        conflict = await find_user_conflict(user.username, user.email)
+        if conflict:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{conflict} already registered"
+            )
         
-        if not created_user:
-            raise HTTPException(status_code=500, detail="Failed to create user")
+        try:
+            result = await users_collection.insert_one(user_data)
+        except DuplicateKeyError as e:
+            field = "Email" if "email" in (e.details or {}).get("keyPattern", {}) else "Username"
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{field} already registered"
+            )
         
         # Build response from known fields only (avoids Pydantic issues with extra DB fields)
         return UserResponse(
-            _id=str(created_user["_id"]),
-            username=created_user["username"],
-            email=created_user["email"],
-            full_name=created_user.get("full_name"),
-            created_at=created_user["created_at"],
-            is_active=created_user.get("is_active", True),
+            _id=str(result.inserted_id),
+            username=user_data["username"],
+            email=user_data["email"],
+            full_name=user_data["full_name"],
+            created_at=user_data["created_at"],
+            is_active=True,
         )
     except HTTPException:
         raise
     except Exception as e:
-        logging.exception("Registration error")
+        logger.exception("Registration error")
         raise HTTPException(status_code=500, detail=f"Registration error: {str(e)}")
 
 @app.post("/auth/login", response_model=Token)
@@ -409,12 +785,7 @@ async def update_profile(
         if full_name is not None:
             update_data["full_name"] = full_name
         if email is not None:
-            # Check if email is already taken by another user
-            existing_email = await users_collection.find_one({
-                "email": email,
-                "_id": {"$ne": current_user["_id"]}
-            })
-            if existing_email:
+            if await find_user_conflict(None, email, exclude_id=current_user["_id"]):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already in use"
@@ -424,20 +795,24 @@ async def update_profile(
         if not update_data:
             raise HTTPException(status_code=400, detail="No data provided for update")
         
-        result = await users_collection.update_one(
-            {"_id": current_user["_id"]},
-            {"$set": update_data}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="User not found or no changes made")
+        try:
+            updated_user = await users_collection.find_one_and_update(
+                {"_id": current_user["_id"]},
+                {"$set": update_data},
+                projection={"hashed_password": 0},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The unique email index: another user already has this address
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already in use"
+            )
         
-        updated_user = await users_collection.find_one({"_id": current_user["_id"]})
-        if updated_user:
-            updated_user["_id"] = str(updated_user["_id"])
-            return UserResponse(**updated_user)
-        else:
-            raise HTTPException(status_code=500, detail="Failed to retrieve updated user")
+        if updated_user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        updated_user["_id"] = str(updated_user["_id"])
+        return UserResponse(**updated_user)
             
     except HTTPException:
         raise
@@ -527,22 +902,14 @@ async def create_catch(catch: CatchCreate, current_user: dict = Depends(get_curr
     try:
         catch_dict = catch.model_dump()
         catch_dict["user_id"] = str(current_user["_id"])
+        catch_dict[sketches.MARKER] = True
+        catch_dict["updated_at"] = catch_sync.now()
         result = await catches_collection.insert_one(catch_dict)
-        created_catch = await catches_collection.find_one({"_id": result.inserted_id})
+        await record_catch_changes(catch_dict["user_id"], added=[catch_dict])
+        await notify_catches_changed(str(current_user["_id"]), added=[catch_dict])
         
-        if created_catch:
-            # Convert ObjectId to string for the response
-            created_catch["_id"] = str(created_catch["_id"])
-            
-            # Check for new achievements after creating a catch
-            try:
-                await check_achievements(str(current_user["_id"]))
-            except Exception as e:
-                print(f"Error checking achievements: {e}")
-            
-            return CatchResponse(**created_catch)
-        else:
-            raise HTTPException(status_code=500, detail="Failed to retrieve created document")
+        # The inserted document is the stored one; no need to read it back
+        return CatchResponse(**{**catch_dict, "_id": str(result.inserted_id)})
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -561,6 +928,28 @@ async def get_all_catches(current_user: dict = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/catches/sync", response_model=CatchSyncResponse)
+async def sync_catches(
+    since: Optional[str] = None,
+    limit: int = catch_sync.DEFAULT_LIMIT,
+    current_user: dict = Depends(get_current_user)
+):
+    """Catches written and deleted since a cursor from an earlier sync; omit `since` for everything"""
+    limit = min(max(limit, 1), catch_sync.MAX_LIMIT)
+    try:
+        page = await catch_sync.changes(db, str(current_user["_id"]), since, limit)
+        catches = []
+        for document in page["catches"]:
+            document["_id"] = str(document["_id"])
+            document.setdefault('date', None)
+            document.setdefault('lake', None)
+            catches.append(CatchResponse(**document))
+        return CatchSyncResponse(**{**page, "catches": catches})
+    except catch_sync.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sync error: {str(e)}")
+
 @app.get("/catches/{catch_id}", response_model=CatchResponse)
 async def get_catch(catch_id: str, current_user: dict = Depends(get_current_user)):
     try:
@@ -585,22 +974,25 @@ async def update_catch(catch_id: str, catch_update: CatchCreate, current_user: d
         if not update_data:
             raise HTTPException(status_code=400, detail="No data provided for update")
         
-        result = await catches_collection.update_one(
+        # The whole previous document: the sketches need its old values and the response is it plus the update
+        update_data["updated_at"] = catch_sync.now()
+        # The old row_hash no longer describes the catch; rehash_catches sets the new one
+        previous = await catches_collection.find_one_and_update(
             {"_id": ObjectId(catch_id), "user_id": str(current_user["_id"])},
-            {"$set": update_data}
+            {"$set": {**update_data, sketches.MARKER: True}, "$unset": {"row_hash": ""}},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail=f"Catch {catch_id} not found or no changes made")
-        
-        updated_catch = await catches_collection.find_one({"_id": ObjectId(catch_id)})
-        if updated_catch:
-            updated_catch["_id"] = str(updated_catch["_id"])
-            updated_catch.setdefault('date', None)
-            updated_catch.setdefault('lake', None)
-            return CatchResponse(**updated_catch)
-        else:
-            raise HTTPException(status_code=500, detail="Failed to retrieve updated document")
+        if previous is None:
+            raise HTTPException(status_code=404, detail=f"Catch {catch_id} not found")
+        updated_catch = {**previous, **update_data, sketches.MARKER: True}
+        if "row_hash" in previous:
+            del updated_catch["row_hash"]
+            await rehash_catches(str(current_user["_id"]), [updated_catch])
+        await record_catch_changes(str(current_user["_id"]), added=[updated_catch], removed=[previous])
+        await notify_catches_changed(str(current_user["_id"]))
+        
+        return CatchResponse(**{"date": None, "lake": None, **updated_catch, "_id": catch_id})
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -608,19 +1000,133 @@ async def update_catch(catch_id: str, catch_update: CatchCreate, current_user: d
 @app.delete("/catches/{catch_id}")
 async def delete_catch(catch_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        result = await catches_collection.delete_one({
+        deleted = await catches_collection.find_one_and_delete({
             "_id": ObjectId(catch_id),
             "user_id": str(current_user["_id"])
-        })
+        }, projection=CATCH_CHANGE_PROJECTION)
         
-        if result.deleted_count == 0:
+        if deleted is None:
             raise HTTPException(status_code=404, detail=f"Catch {catch_id} not found")
+        await record_catch_changes(str(current_user["_id"]), removed=[deleted])
+        await notify_catches_changed(str(current_user["_id"]))
         
         return {"message": f"Catch {catch_id} deleted successfully"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+# --- Batch Update/Delete Endpoints ---
+async def resolve_batch_targets(request: CatchBatchDeleteRequest, user_id: str,
+                                projection: Dict[str, Any] = CATCH_CHANGE_PROJECTION):
+    """Return (the user's catches to change, per-item results for ids that can't be)"""
+    if (request.ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either ids or filter")
+    
+    if request.ids is not None:
+        object_ids, results = [], []
+        for catch_id in dict.fromkeys(request.ids):
+            if ObjectId.is_valid(catch_id):
+                object_ids.append(ObjectId(catch_id))
+            else:
+                results.append({"id": catch_id, "status": "invalid_id"})
+        query_filter = {"_id": {"$in": object_ids}, "user_id": user_id}
+    else:
+        criteria = request.filter.model_dump(exclude_none=True)
+        if not criteria:
+            raise HTTPException(status_code=400, detail="Filter must set at least one field")
+        query_filter = {"user_id": user_id}
+        date_range = {}
+        if "date_from" in criteria:
+            date_range["$gte"] = criteria.pop("date_from")
+        if "date_to" in criteria:
+            date_range["$lte"] = criteria.pop("date_to")
+        if date_range:
+            query_filter["date"] = date_range
+        query_filter.update(criteria)
+        results = []
+    
+    # One round trip to find which of the requested catches exist and belong to the user,
+    # with the fields needed to take them out of the sketches and the analysis cache
+    found = await catches_collection.find(query_filter, projection) \
+        .limit(MAX_BATCH_ITEMS + 1).to_list(length=MAX_BATCH_ITEMS + 1)
+    if len(found) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Filter matches more than {MAX_BATCH_ITEMS} catches")
+    
+    if request.ids is not None:
+        found_set = {document["_id"] for document in found}
+        results.extend({"id": str(object_id), "status": "not_found"}
+                       for object_id in object_ids if object_id not in found_set)
+    return found, results
+
+@app.post("/catches/batch/update", dependencies=[Depends(rate_limited("bulk"))])
+async def batch_update_catches(request: CatchBatchUpdateRequest, current_user: dict = Depends(get_current_user)):
+    """Apply one patch to many catches, selected by id or by filter"""
+    try:
+        patch = request.patch.model_dump(exclude_unset=True)
+        if not patch:
+            raise HTTPException(status_code=400, detail="No data provided for update")
+        # Fields sent as null are removed from the catches
+        cleared = [name for name, value in patch.items() if value is None]
+        required = [name for name in cleared if name not in CLEARABLE_CATCH_FIELDS]
+        if required:
+            raise HTTPException(status_code=400, detail=f"Required fields can't be cleared: {', '.join(required)}")
+        update_data = {name: value for name, value in patch.items() if value is not None}
+        
+        user_id = str(current_user["_id"])
+        documents, results = await resolve_batch_targets(request, user_id, ROW_HASH_PROJECTION)
+        targets = [document["_id"] for document in documents]
+        update_data["updated_at"] = catch_sync.now()
+        
+        modified_count = 0
+        if targets:
+            # Old row hashes no longer describe the patched catches; rehash_catches sets the new ones
+            update: Dict[str, Any] = {"$set": {**update_data, sketches.MARKER: True},
+                                      "$unset": {"row_hash": "", **{name: "" for name in cleared}}}
+            result = await catches_collection.update_many({"_id": {"$in": targets}, "user_id": user_id}, update)
+            modified_count = result.modified_count
+            updated = [{name: value for name, value in {**document, **update_data}.items()
+                        if name not in cleared and name != "row_hash"} for document in documents]
+            await rehash_catches(user_id, [catch for catch, document in zip(updated, documents)
+                                           if "row_hash" in document])
+            await record_catch_changes(user_id, added=updated, removed=documents)
+            await notify_catches_changed(user_id)
+        
+        results.extend({"id": str(object_id), "status": "updated"} for object_id in targets)
+        return {
+            "matched_count": len(targets),
+            "modified_count": modified_count,
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch update error: {str(e)}")
+
+@app.post("/catches/batch/delete", dependencies=[Depends(rate_limited("bulk"))])
+async def batch_delete_catches(request: CatchBatchDeleteRequest, current_user: dict = Depends(get_current_user)):
+    """Delete many catches, selected by id or by filter"""
+    try:
+        user_id = str(current_user["_id"])
+        documents, results = await resolve_batch_targets(request, user_id)
+        targets = [document["_id"] for document in documents]
+        
+        deleted_count = 0
+        if targets:
+            result = await catches_collection.delete_many({"_id": {"$in": targets}, "user_id": user_id})
+            deleted_count = result.deleted_count
+            await record_catch_changes(user_id, removed=documents)
+            await notify_catches_changed(user_id)
+        
+        results.extend({"id": str(object_id), "status": "deleted"} for object_id in targets)
+        return {
+            "deleted_count": deleted_count,
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch delete error: {str(e)}")
+
 # --- Bulk Upload Endpoints ---
 @app.get("/catches/template/csv")
 async def download_csv_template():
@@ -704,11 +1210,11 @@ async def download_json_template():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating template: {str(e)}")
 
-@app.post("/catches/bulk", response_model=BulkUploadResponse)
+@app.post("/catches/bulk", response_model=BulkUploadResponse, dependencies=[Depends(rate_limited("bulk"))])
 async def bulk_upload_catches(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     """Upload multiple catches via CSV or JSON file"""
     try:
-        print(f"Received file: {file.filename}, size: {file.size}")
+        logger.info("Bulk upload received", extra={"upload_filename": file.filename, "size": file.size})
         
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
@@ -727,7 +1233,7 @@ async def bulk_upload_catches(file: UploadFile = File(...), current_user: dict =
             for encoding in encodings:
                 try:
                     decoded = contents.decode(encoding)
-                    print(f"Successfully decoded with {encoding}")
+                    logger.debug("Decoded bulk upload with %s", encoding)
                     break
                 except UnicodeDecodeError:
                     continue
@@ -735,54 +1241,74 @@ async def bulk_upload_catches(file: UploadFile = File(...), current_user: dict =
             if decoded is None:
                 raise HTTPException(status_code=400, detail="Unable to decode CSV file. Please ensure it's saved with UTF-8 encoding.")
             
-            print(f"CSV content length: {len(decoded)}")
-            print(f"CSV content: {decoded[:200]}...")  # Print first 200 chars
             csv_reader = csv.DictReader(decoded.splitlines())
             catches = list(csv_reader)
-            print(f"Parsed {len(catches)} catches from CSV")
-            if catches:
-                print(f"First catch data: {catches[0]}")
-                print(f"CSV fieldnames: {csv_reader.fieldnames}")
+            logger.info("Parsed %d catches from CSV", len(catches), extra={"fieldnames": csv_reader.fieldnames})
         elif file.filename.endswith('.json'):
             contents = await file.read()
             catches = json.loads(contents)
-            print(f"Parsed {len(catches)} catches from JSON")
+            logger.info("Parsed %d catches from JSON", len(catches))
         else:
             raise HTTPException(status_code=400, detail="Unsupported file type. Please use CSV or JSON.")
         
         if not catches:
             raise HTTPException(status_code=400, detail="No data found in file")
         
-        print(f"Current user: {current_user}")
-        print(f"User ID: {current_user['_id']}")
-        
         # Process and validate each catch
         success_count = 0
+        duplicate_count = 0
         errors = []
+        documents = []
+        row_numbers = []
         
+        log_rows = logger.isEnabledFor(logging.DEBUG)
         for i, catch_data in enumerate(catches):
             try:
-                print(f"Processing row {i+1}: {catch_data}")
+                if log_rows:
+                    logger.debug("Processing bulk row %d", i + 1, extra={"row": catch_data, "sample": True})
                 # Validate and transform data
                 validated_data = validate_catch_data(catch_data)
                 
-                # Add user_id to the data
+                # Add user_id and the content hash used to skip rows uploaded before
                 validated_data["user_id"] = str(current_user["_id"])
-                
-                # Save to MongoDB
-                result = await catches_collection.insert_one(validated_data)
-                success_count += 1
+                validated_data["row_hash"] = catch_row_hash(validated_data)
+                validated_data[sketches.MARKER] = True
+                validated_data["updated_at"] = catch_sync.now()
+                documents.append(validated_data)
+                row_numbers.append(i + 1)
                 
             except Exception as e:
                 error_msg = f"Row {i+1}: {str(e)}"
-                print(f"Error processing row {i+1}: {e}")
+                if log_rows:
+                    logger.debug("Rejected bulk row %d: %s", i + 1, e, extra={"sample": True})
                 errors.append(error_msg)
         
+        # Save to MongoDB; unordered so one duplicate doesn't stop the rest of the file
+        if documents:
+            failed = set()
+            try:
+                result = await catches_collection.insert_many(documents, ordered=False)
+                success_count = len(result.inserted_ids)
+            except BulkWriteError as e:
+                success_count = e.details.get("nInserted", 0)
+                for error in e.details.get("writeErrors", []):
+                    failed.add(error["index"])
+                    if error["code"] == 11000:
+                        duplicate_count += 1
+                    else:
+                        errors.append(f"Row {row_numbers[error['index']]}: {error.get('errmsg')}")
+            inserted = [document for i, document in enumerate(documents) if i not in failed]
+            await record_catch_changes(str(current_user["_id"]), added=inserted)
+            if inserted:
+                await notify_catches_changed(str(current_user["_id"]), added=inserted)
+        
         return BulkUploadResponse(
             success=True,
-            message=f"Successfully processed {success_count} catches",
+            message=f"Successfully processed {success_count} catches"
+                    + (f", skipped {duplicate_count} already uploaded" if duplicate_count else ""),
             details={
                 "successCount": success_count,
+                "duplicateCount": duplicate_count,
                 "errorCount": len(errors),
                 "errors": errors
             }
@@ -791,14 +1317,53 @@ async def bulk_upload_catches(file: UploadFile = File(...), current_user: dict =
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Bulk upload error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Bulk upload error")
         raise HTTPException(status_code=500, detail=f"Bulk upload error: {str(e)}")
 
+# Fields that identify a bulk row; anything the server adds (ids, user, timestamps) is left out
+ROW_HASH_FIELDS = ('date', 'time', 'location', 'lake', 'structure', 'water_temp', 'water_quality',
+                   'line_type', 'boat_depth', 'bait_depth', 'bait', 'bait_type', 'bait_colour', 'scented',
+                   'fish_weight', 'species', 'line_weight', 'weight_pegged', 'hook_size', 'comments')
+
+def catch_row_hash(data: Dict[str, Any]) -> str:
+    """Content hash of a validated catch, insensitive to case, spacing and number formatting"""
+    normalised = {}
+    for field in ROW_HASH_FIELDS:
+        value = data.get(field)
+        if value is None or value == '':
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.split()).casefold()
+        elif isinstance(value, float):
+            value = round(value, 6)
+        normalised[field] = value
+    canonical = json.dumps(normalised, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+# What a batch update reads to recompute the row hashes of uploaded catches
+ROW_HASH_PROJECTION = {**CATCH_CHANGE_PROJECTION, **{field: 1 for field in ROW_HASH_FIELDS}, "row_hash": 1}
+
+async def rehash_catches(user_id: str, catches: List[Dict[str, Any]]):
+    """Set the row hash of edited catches that came from a bulk upload to match their new content.
+
+    Re-uploading the original row then inserts it again, and re-uploading the edited one is skipped. A catch
+    edited into a copy of another uploaded catch collides on the unique index and is left without a hash.
+    """
+    if not catches:
+        return
+    try:
+        await catches_collection.bulk_write([
+            UpdateOne({"_id": catch["_id"], "user_id": user_id}, {"$set": {"row_hash": catch_row_hash(catch)}})
+            for catch in catches
+        ], ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            logger.exception("Error updating catch row hashes")
+    except Exception:
+        logger.exception("Error updating catch row hashes")
+
 def validate_catch_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """Validate and transform catch data from bulk upload"""
-    print(f"Validating data: {data}")
     validated = {}
     
     # Required fields validation
@@ -809,7 +1374,6 @@ def validate_catch_data(data: Dict[str, Any]) -> Dict[str, Any]:
     
     for field in required_fields:
         if field not in data or data[field] is None or str(data[field]).strip() == '':
-            print(f"Missing required field: {field}")
             raise ValueError(f"Missing required field: {field}")
     
     # Type conversion and validation
@@ -819,7 +1383,6 @@ def validate_catch_data(data: Dict[str, Any]) -> Dict[str, Any]:
         for field in numeric_fields:
             if field in data:
                 validated[field] = float(data[field])
-                print(f"Converted {field}: {data[field]} -> {validated[field]}")
         
         # Convert boolean fields
         boolean_fields = ['scented', 'weight_pegged']
@@ -832,14 +1395,12 @@ def validate_catch_data(data: Dict[str, Any]) -> Dict[str, Any]:
                     validated[field] = False
                 else:
                     raise ValueError(f"Invalid value for {field}: {data[field]}")
-                print(f"Converted {field}: {data[field]} -> {validated[field]}")
         
         # Convert optional numeric fields
         optional_numeric_fields = ['line_weight']
         for field in optional_numeric_fields:
             if field in data and data[field] is not None and str(data[field]).strip() != '':
                 validated[field] = float(data[field])
-                print(f"Converted {field}: {data[field]} -> {validated[field]}")
         
         # Copy other fields
         string_fields = ['date', 'time', 'location', 'lake', 'structure', 
@@ -849,147 +1410,46 @@ def validate_catch_data(data: Dict[str, Any]) -> Dict[str, Any]:
         for field in string_fields:
             if field in data and data[field] is not None:
                 validated[field] = str(data[field]).strip()
-                print(f"Copied {field}: {data[field]} -> {validated[field]}")
                 
     except (ValueError, TypeError) as e:
-        print(f"Data type conversion error: {str(e)}")
         raise ValueError(f"Data type conversion error: {str(e)}")
     
-    print(f"Validation successful: {validated}")
     return validated
 
 # --- Existing analysis and utility endpoints (unchanged) ---
 @app.post("/analyze/")
-async def analyze_data(request: AnalysisRequest, current_user: dict = Depends(get_current_user)):
+async def analyze_data(request: AnalysisRequest, http_request: Request, current_user: dict = Depends(get_current_user)):
+    if request.analysis_type not in analysis.ANALYSIS_TYPES:
+        raise HTTPException(status_code=400, detail="Unknown analysis type")
+    
+    # Identical concurrent requests (e.g. dashboard widgets mounting together) share one computation
+    user_id = str(current_user["_id"])
     try:
-        # Build query filter
-        query_filter = {"user_id": str(current_user["_id"])}
-        if request.species:
-            query_filter["species"] = request.species
-        
-        catches = []
-        async for document in catches_collection.find(query_filter):
-            document.pop('_id', None)
-            catches.append(document)
+        return await analysis_pool.with_deadline(
+            http_request,
+            coalesced_analysis("/analyze/", user_id, request.model_dump(),
+                               lambda: compute_analysis(request, current_user)),
+            route="/analyze/"
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis took too long, try narrowing it to one species")
+    except ConnectionAbortedError:
+        # Nobody is left to read the response
+        raise HTTPException(status_code=499, detail="Client closed request")
+
+async def compute_analysis(request: AnalysisRequest, user: dict):
+    try:
+        # Only the columns the analysis reads are shipped to the pool
+        columns = await catch_cache.get(db, user)
+        frame = columns.frame(analysis.FRAME_COLUMNS[request.analysis_type], species=request.species or None)
         
-        if not catches:
+        if len(frame["fish_weight"]) == 0:
             return {"message": "No data available for analysis."}
         
-        df = pd.DataFrame(catches)
-        
-        numeric_columns = ['water_temp', 'boat_depth', 'bait_depth', 'fish_weight', 'line_weight']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-                # Replace infinite values with NaN
-                df[col] = df[col].replace([float('inf'), float('-inf')], float('nan'))
-        
-        if request.analysis_type == "bait_success":
-            analysis_result = df.groupby('bait_type').agg(
-                total_weight=('fish_weight', 'sum'),
-                average_weight=('fish_weight', 'mean'),
-                count=('fish_weight', 'count')
-            ).sort_values('total_weight', ascending=False)
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        elif request.analysis_type == "time_analysis":
-            # Handle both HH:MM and HH:MM:SS formats
-            def parse_time(time_str):
-                try:
-                    # Try HH:MM:SS format first
-                    return pd.to_datetime(time_str, format='%H:%M:%S')
-                except ValueError:
-                    try:
-                        # Try HH:MM format
-                        return pd.to_datetime(time_str, format='%H:%M')
-                    except ValueError:
-                        # Try mixed format
-                        return pd.to_datetime(time_str, format='mixed')
-            
-            df['hour'] = df['time'].apply(parse_time).dt.hour
-            analysis_result = df.groupby('hour').agg(
-                average_weight=('fish_weight', 'mean'),
-                count=('fish_weight', 'count')
-            )
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        elif request.analysis_type == "structure_analysis":
-            analysis_result = df.groupby('structure').agg(
-                total_weight=('fish_weight', 'sum'),
-                average_weight=('fish_weight', 'mean'),
-                count=('fish_weight', 'count')
-            ).sort_values('total_weight', ascending=False)
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        elif request.analysis_type == "lake_analysis":
-            analysis_result = df.groupby('lake').agg(
-                total_weight=('fish_weight', 'sum'),
-                average_weight=('fish_weight', 'mean'),
-                count=('fish_weight', 'count')
-            ).sort_values('total_weight', ascending=False)
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        elif request.analysis_type == "date_analysis":
-            df['date'] = pd.to_datetime(df['date'])
-            analysis_result = df.groupby('date').agg(
-                total_weight=('fish_weight', 'sum'),
-                count=('fish_weight', 'count')
-            ).sort_values('date')
-            analysis_result.index = analysis_result.index.strftime('%Y-%m-%d')
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        elif request.analysis_type == "bait_depth_analysis":
-            if request.parameter:
-                df_filtered = df[df['bait'] == request.parameter]
-            else:
-                df_filtered = df
-            
-            analysis_result = df_filtered.groupby('bait_depth').agg(
-                total_weight=('fish_weight', 'sum'),
-                average_weight=('fish_weight', 'mean'),
-                count=('fish_weight', 'count')
-            ).sort_values('bait_depth')
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        elif request.analysis_type == "water_temp_analysis":
-            # Filter out invalid water temperatures
-            valid_temp_df = df[df['water_temp'].notna() & (df['water_temp'] != float('inf')) & (df['water_temp'] != float('-inf'))]
-            
-            if len(valid_temp_df) == 0:
-                return {"message": "No valid water temperature data available for analysis."}
-            
-            # Create bins with proper bounds
-            min_temp = valid_temp_df['water_temp'].min()
-            max_temp = valid_temp_df['water_temp'].max()
-            
-            if min_temp == max_temp:
-                # If all temperatures are the same, create a single bin
-                bins = [min_temp - 1, max_temp + 1]
-            else:
-                # Create 5 bins with proper bounds
-                bin_width = (max_temp - min_temp) / 5
-                bins = [min_temp + i * bin_width for i in range(6)]
-            
-            analysis_result = valid_temp_df.groupby(pd.cut(valid_temp_df['water_temp'], bins=bins, include_lowest=True)).agg(
-                total_weight=('fish_weight', 'sum'),
-                average_weight=('fish_weight', 'mean'),
-                count=('fish_weight', 'count')
-            )
-            
-            # Convert index to string and handle any remaining infinite values
-            analysis_result.index = analysis_result.index.astype(str)
-            
-            result_dict = analysis_result.to_dict(orient='index')
-            return clean_for_json(result_dict)
-        
-        else:
-            raise HTTPException(status_code=400, detail="Unknown analysis type")
+        return await analysis_pool.run(
+            analysis.run_analysis, request.analysis_type, frame, request.parameter,
+            label=request.analysis_type
+        )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
@@ -997,8 +1457,13 @@ async def analyze_data(request: AnalysisRequest, current_user: dict = Depends(ge
 # --- Advanced Analysis Endpoint ---
 @app.post("/analyze/advanced/")
 async def advanced_analysis(request: AdvancedAnalysisRequest, current_user: dict = Depends(get_current_user)):
+    user_id = str(current_user["_id"])
+    return await coalesced_analysis("/analyze/advanced/", user_id, request.model_dump(),
+                                    lambda: compute_advanced_analysis(request, user_id))
+
+async def compute_advanced_analysis(request: AdvancedAnalysisRequest, user_id: str):
     try:
-        match_stage = {"user_id": str(current_user["_id"])}
+        match_stage = {"user_id": user_id}
         if request.filters:
             for field, value in request.filters.items():
                 match_stage[field] = {"$in": value} if isinstance(value, list) else value
@@ -1071,6 +1536,310 @@ async def advanced_analysis(request: AdvancedAnalysisRequest, current_user: dict
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Advanced analysis error: {str(e)}")
 
+# --- Trends Endpoint ---
+def build_trends_pipeline(request: TrendsRequest, user_id: str) -> List[Dict[str, Any]]:
+    """Bucket a user's catches by period and add rolling, cumulative and year-over-year figures"""
+    match_stage = {"user_id": user_id, "date": {"$type": "string"}}
+    if request.species:
+        match_stage["species"] = request.species
+    if request.lake:
+        match_stage["lake"] = request.lake
+    # Dates are stored as YYYY-MM-DD strings, so a string range is a date range
+    if request.start_date:
+        match_stage["date"]["$gte"] = request.start_date
+    if request.end_date:
+        match_stage["date"]["$lte"] = request.end_date
+    
+    if request.period == "season":
+        # Southern hemisphere seasons start in Dec, Mar, Jun and Sep; month 0 rolls back to December
+        bucket = {"$dateFromParts": {
+            "year": {"$year": "$catch_date"},
+            "month": {"$subtract": [{"$month": "$catch_date"}, {"$mod": [{"$month": "$catch_date"}, 3]}]},
+            "day": 1
+        }}
+        window_unit, window_size = "month", 3 * request.window
+    else:
+        bucket = {"$dateTrunc": {"date": "$catch_date", "unit": request.period, "startOfWeek": "monday"}}
+        window_unit, window_size = request.period, request.window
+    rolling = {"range": [-(window_size - 1), 0], "unit": window_unit}
+    to_date = {"documents": ["unbounded", "current"]}
+    
+    pipeline = [
+        {"$match": match_stage},
+        {"$project": {
+            "catch_date": {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d", "onError": None}},
+            "weight": {"$convert": {"input": "$fish_weight", "to": "double", "onError": None, "onNull": None}}
+        }},
+        {"$match": {"catch_date": {"$ne": None}}},
+        {"$group": {
+            "_id": bucket,
+            "count": {"$sum": 1},
+            "weighed_count": {"$sum": {"$cond": [{"$gt": ["$weight", 0]}, 1, 0]}},
+            "total_weight": {"$sum": {"$cond": [{"$gt": ["$weight", 0]}, "$weight", 0]}},
+            "best_weight": {"$max": "$weight"}
+        }},
+        {"$setWindowFields": {
+            "sortBy": {"_id": 1},
+            "output": {
+                "rolling_count": {"$sum": "$count", "window": rolling},
+                "rolling_weight": {"$sum": "$total_weight", "window": rolling},
+                "rolling_weighed_count": {"$sum": "$weighed_count", "window": rolling},
+                "cumulative_count": {"$sum": "$count", "window": to_date},
+                "cumulative_weight": {"$sum": "$total_weight", "window": to_date},
+                "personal_best": {"$max": "$best_weight", "window": to_date},
+                "previous_best": {"$max": "$best_weight", "window": {"documents": ["unbounded", -1]}}
+            }
+        }}
+    ]
+    
+    if request.compare_years:
+        # The same period of the previous year is the previous bucket in its period-of-year partition,
+        # provided that bucket is exactly one year earlier
+        if request.period == "week":
+            period_of_year, year = {"$isoWeek": "$_id"}, {"$isoWeekYear": "$_id"}
+        elif request.period == "day":
+            period_of_year, year = {"$dateToString": {"format": "%m-%d", "date": "$_id"}}, {"$year": "$_id"}
+        else:
+            period_of_year, year = {"$month": "$_id"}, {"$year": "$_id"}
+        pipeline.extend([
+            {"$set": {"period_of_year": period_of_year, "year": year}},
+            {"$setWindowFields": {
+                "partitionBy": "$period_of_year",
+                "sortBy": {"_id": 1},
+                "output": {
+                    "previous_year": {"$shift": {"output": "$year", "by": -1}},
+                    "previous_year_count": {"$shift": {"output": "$count", "by": -1}},
+                    "previous_year_weight": {"$shift": {"output": "$total_weight", "by": -1}}
+                }
+            }},
+            {"$set": {
+                "previous_year_count": {"$cond": [
+                    {"$eq": ["$previous_year", {"$subtract": ["$year", 1]}]}, "$previous_year_count", None]},
+                "previous_year_weight": {"$cond": [
+                    {"$eq": ["$previous_year", {"$subtract": ["$year", 1]}]}, "$previous_year_weight", None]}
+            }},
+            {"$sort": {"_id": 1}}
+        ])
+    
+    pipeline.append({"$project": {
+        "_id": 0,
+        "period_start": {"$dateToString": {"format": "%Y-%m-%d", "date": "$_id"}},
+        "count": 1,
+        "total_weight": {"$round": ["$total_weight", 2]},
+        "average_weight": {"$cond": [
+            {"$gt": ["$weighed_count", 0]}, {"$round": [{"$divide": ["$total_weight", "$weighed_count"]}, 2]}, None]},
+        "best_weight": {"$round": ["$best_weight", 2]},
+        "rolling_count": 1,
+        "rolling_weight": {"$round": ["$rolling_weight", 2]},
+        "rolling_average_weight": {"$cond": [
+            {"$gt": ["$rolling_weighed_count", 0]},
+            {"$round": [{"$divide": ["$rolling_weight", "$rolling_weighed_count"]}, 2]}, None]},
+        "cumulative_count": 1,
+        "cumulative_weight": {"$round": ["$cumulative_weight", 2]},
+        "personal_best": {"$round": ["$personal_best", 2]},
+        "new_personal_best": {"$and": [
+            {"$gt": ["$best_weight", None]},
+            {"$or": [{"$eq": ["$previous_best", None]}, {"$gt": ["$best_weight", "$previous_best"]}]}
+        ]},
+        **({
+            "previous_year_count": 1,
+            "previous_year_weight": {"$round": ["$previous_year_weight", 2]},
+            "year_over_year_weight_change": {"$cond": [
+                {"$gt": ["$previous_year_weight", 0]},
+                {"$round": [{"$multiply": [{"$divide": [
+                    {"$subtract": ["$total_weight", "$previous_year_weight"]}, "$previous_year_weight"]}, 100]}, 1]},
+                None
+            ]}
+        } if request.compare_years else {})
+    }})
+    return pipeline
+
+@app.post("/analyze/trends")
+async def analyze_trends(request: TrendsRequest, current_user: dict = Depends(get_current_user)):
+    """Catch counts and weights per day, week, month or season, with rolling and year-over-year figures"""
+    user_id = str(current_user["_id"])
+    return await coalesced_analysis("/analyze/trends", user_id, request.model_dump(),
+                                    lambda: compute_trends(request, user_id))
+
+async def compute_trends(request: TrendsRequest, user_id: str):
+    try:
+        buckets = await catches_collection.aggregate(
+            build_trends_pipeline(request, user_id),
+            maxTimeMS=int(analysis_pool.ANALYSIS_TIMEOUT_SECONDS * 1000)
+        ).to_list(length=None)
+        return {
+            "period": request.period,
+            "window": request.window,
+            "buckets": buckets
+        }
+    except ExecutionTimeout:
+        raise HTTPException(status_code=504, detail="Trend analysis took too long, try a shorter date range")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Trend analysis error: {str(e)}")
+
+# --- Histogram Endpoint ---
+def histogram_value_stages(request: HistogramRequest, user_id: str) -> List[Dict[str, Any]]:
+    """The requested field of the selected catches as `value` (and fish_weight as `weight`), numbers only"""
+    match_stage = {"user_id": user_id, request.field: {"$ne": None}}
+    if request.species:
+        match_stage["species"] = request.species
+    if request.lake:
+        match_stage["lake"] = request.lake
+    return [
+        {"$match": match_stage},
+        {"$project": {
+            "_id": 0,
+            "value": {"$convert": {"input": f"${request.field}", "to": "double", "onError": None, "onNull": None}},
+            "weight": {"$convert": {"input": "$fish_weight", "to": "double", "onError": None, "onNull": None}}
+        }},
+        {"$match": {"value": {"$ne": None, "$nin": [float("inf"), float("-inf"), float("nan")]}}},
+    ]
+
+def build_histogram_pipeline(request: HistogramRequest, user_id: str, server_percentiles: bool = True) -> List[Dict[str, Any]]:
+    """Bin one numeric field and summarise it; values that aren't numbers are left out"""
+    bin_output = {
+        "count": {"$sum": 1},
+        "total_weight": {"$sum": {"$ifNull": ["$weight", 0]}},
+        "average_weight": {"$avg": "$weight"}
+    }
+    if request.edges:
+        histogram = [{"$bucket": {
+            "groupBy": "$value",
+            "boundaries": request.edges,
+            "default": "outside",
+            "output": bin_output
+        }}]
+    elif request.strategy == "equal_count":
+        histogram = [{"$bucketAuto": {"groupBy": "$value", "buckets": request.bins, "output": bin_output}}]
+    else:
+        # Equal-width bins over the observed range, like pd.cut(bins=n); the top edge falls in the last bin
+        width = {"$divide": [{"$subtract": ["$max", "$min"]}, request.bins]}
+        histogram = [
+            {"$setWindowFields": {"output": {"min": {"$min": "$value"}, "max": {"$max": "$value"}}}},
+            {"$group": {
+                "_id": {"$cond": [
+                    {"$eq": ["$min", "$max"]},
+                    0,
+                    {"$min": [{"$floor": {"$divide": [{"$subtract": ["$value", "$min"]}, width]}}, request.bins - 1]}
+                ]},
+                "min": {"$first": "$min"},
+                "max": {"$first": "$max"},
+                **bin_output
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+    
+    summary = {
+        "_id": None,
+        "count": {"$sum": 1},
+        "min": {"$min": "$value"},
+        "max": {"$max": "$value"},
+        "mean": {"$avg": "$value"}
+    }
+    if server_percentiles:
+        summary["percentiles"] = {"$percentile": {"input": "$value", "p": request.percentiles, "method": "approximate"}}
+    # Otherwise ($percentile needs MongoDB 7.0) build_percentile_pipeline picks them once the count is known
+    
+    return histogram_value_stages(request, user_id) + [
+        {"$facet": {"histogram": histogram, "stats": [{"$group": summary}]}}
+    ]
+
+def build_percentile_pipeline(request: HistogramRequest, user_id: str, ranks: List[int]) -> List[Dict[str, Any]]:
+    """The values at 0-based positions of the sorted field, one facet each, without gathering them in one document"""
+    return histogram_value_stages(request, user_id) + [
+        {"$sort": {"value": 1}},
+        {"$facet": {str(i): [{"$skip": rank}, {"$limit": 1}, {"$project": {"value": 1}}]
+                    for i, rank in enumerate(ranks)}}
+    ]
+
+def histogram_bins(request: HistogramRequest, buckets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Key bins by interval label, as water_temp_analysis does, filling in empty equal-width bins"""
+    def interval(lower, upper, closed_right):
+        return f"[{round(lower, 3)}, {round(upper, 3)}{']' if closed_right else ')'}"
+    
+    def totals(bucket):
+        return analysis.clean_for_json({
+            "total_weight": bucket.get("total_weight", 0.0) if bucket else 0.0,
+            "average_weight": bucket.get("average_weight") if bucket else None,
+            "count": bucket.get("count", 0) if bucket else 0
+        })
+    
+    result = {}
+    if request.edges:
+        by_lower = {bucket["_id"]: bucket for bucket in buckets}
+        for lower, upper in zip(request.edges, request.edges[1:]):
+            result[interval(lower, upper, False)] = totals(by_lower.get(lower))
+        if "outside" in by_lower:
+            result["outside"] = totals(by_lower["outside"])
+    elif request.strategy == "equal_count":
+        for i, bucket in enumerate(buckets):
+            result[interval(bucket["_id"]["min"], bucket["_id"]["max"], i == len(buckets) - 1)] = totals(bucket)
+    elif buckets:
+        low, high = buckets[0]["min"], buckets[0]["max"]
+        if low == high:
+            return {interval(low - 1, high + 1, True): totals(buckets[0])}
+        width = (high - low) / request.bins
+        by_index = {bucket["_id"]: bucket for bucket in buckets}
+        for i in range(request.bins):
+            upper = high if i == request.bins - 1 else low + (i + 1) * width
+            result[interval(low + i * width, upper, i == request.bins - 1)] = totals(by_index.get(i))
+    return result
+
+@app.post("/analyze/histogram")
+async def analyze_histogram(request: HistogramRequest, current_user: dict = Depends(get_current_user)):
+    """Distribution of any numeric catch field, with approximate percentiles"""
+    if request.edges is not None and (len(request.edges) < 2 or any(
+            a >= b for a, b in zip(request.edges, request.edges[1:]))):
+        raise HTTPException(status_code=400, detail="edges must hold at least two strictly increasing values")
+    if any(not 0 <= p <= 1 for p in request.percentiles):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 1")
+    user_id = str(current_user["_id"])
+    return await coalesced_analysis("/analyze/histogram", user_id, request.model_dump(),
+                                    lambda: compute_histogram(request, user_id))
+
+async def compute_histogram(request: HistogramRequest, user_id: str):
+    max_time_ms = int(analysis_pool.ANALYSIS_TIMEOUT_SECONDS * 1000)
+    try:
+        server_percentiles = True
+        try:
+            facets = await catches_collection.aggregate(
+                build_histogram_pipeline(request, user_id), maxTimeMS=max_time_ms).to_list(length=None)
+        except ExecutionTimeout:
+            raise
+        except OperationFailure as e:
+            # Servers before 7.0 reject $percentile; retry with exact nearest-rank percentiles
+            logger.info("Falling back to sorted percentiles for histogram: %s", e)
+            server_percentiles = False
+            facets = await catches_collection.aggregate(
+                build_histogram_pipeline(request, user_id, server_percentiles=False),
+                maxTimeMS=max_time_ms).to_list(length=None)
+        
+        stats = facets[0]["stats"][0] if facets and facets[0]["stats"] else None
+        if stats is None:
+            return {"message": f"No valid {request.field} data available for analysis."}
+        if not server_percentiles:
+            ranks = [math.floor(p * (stats["count"] - 1)) for p in request.percentiles]
+            picked = await catches_collection.aggregate(
+                build_percentile_pipeline(request, user_id, ranks),
+                maxTimeMS=max_time_ms, allowDiskUse=True).to_list(length=1)
+            stats["percentiles"] = [picked[0][str(i)][0]["value"] if picked and picked[0][str(i)] else None
+                                    for i in range(len(ranks))]
+        return {
+            "field": request.field,
+            "histogram": histogram_bins(request, facets[0]["histogram"]),
+            "stats": analysis.clean_for_json({
+                "count": stats["count"],
+                "min": stats["min"],
+                "max": stats["max"],
+                "mean": round(stats["mean"], 3),
+                **{f"p{round(p * 100, 1):g}": value for p, value in zip(request.percentiles, stats["percentiles"])}
+            })
+        }
+    except ExecutionTimeout:
+        raise HTTPException(status_code=504, detail="Histogram took too long, try narrowing the filter")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Histogram error: {str(e)}")
+
 # --- Field Options Endpoint ---
 @app.get("/catches/options/{field_name}")
 async def get_field_options(field_name: str, search: Optional[str] = None, current_user: dict = Depends(get_current_user)):
@@ -1106,21 +1875,20 @@ async def get_species_list():
 async def migrate_species_field(current_user: dict = Depends(get_current_user)):
     """Migrate existing catches to include species field"""
     try:
-        # Find all catches without species field and update them
-        result = await catches_collection.update_many(
-            {
-                "user_id": str(current_user["_id"]),
-                "species": {"$exists": False}
-            },
-            {
-                "$set": {"species": "Unknown"}
-            }
+        # Same step as the 0002_default_catch_species migration, limited to this user's catches
+        result = await migrations.apply(
+            db,
+            migrations.get_migration("0002_default_catch_species"),
+            scope={"user_id": str(current_user["_id"])},
+            pause_ms=0
         )
+        if result["modified"]:
+            await catch_cache.invalidate(db, {"_id": current_user["_id"]})
         
         return {
             "success": True,
-            "message": f"Updated {result.modified_count} catches with default species",
-            "modified_count": result.modified_count
+            "message": f"Updated {result['modified']} catches with default species",
+            "modified_count": result["modified"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Migration error: {str(e)}")
@@ -1143,11 +1911,15 @@ async def update_species_list(species_data: dict, current_user: dict = Depends(g
 # --- Statistics Endpoint ---
 @app.get("/catches/stats/overview")
 async def get_stats_overview(current_user: dict = Depends(get_current_user)):
+    user_id = str(current_user["_id"])
+    return await singleflight.run("/catches/stats/overview", user_id, None, lambda: compute_stats_overview(user_id))
+
+async def compute_stats_overview(user_id: str):
     try:
         pipeline = [
             # Coerce fish_weight to a numeric field for reliable aggregation
             {"$addFields": {"fish_weight_num": {"$toDouble": "$fish_weight"}}},
-            {"$match": {"user_id": str(current_user["_id"])}},
+            {"$match": {"user_id": user_id}},
             {"$group": {
                 "_id": None,
                 "total_catches": {"$sum": 1},
@@ -1167,27 +1939,78 @@ async def get_stats_overview(current_user: dict = Depends(get_current_user)):
             }}
         ]
 
-        results = await catches_collection.aggregate(pipeline).to_list(length=1)
-        return results[0] if results else {}
+        results, sketch = await asyncio.gather(
+            catches_collection.aggregate(pipeline).to_list(length=1),
+            db[sketches.COLLECTION_NAME].find_one({"_id": sketches.user_key(user_id)}, {"fish_weight": 1})
+        )
+        if not results:
+            return {}
+        # Like average_weight, the median and p90 leave out missing and non-positive weights
+        weights = sketches.positive(sketches.merge([sketch] if sketch else [], "fish_weight"))
+        median_weight, p90_weight = sketches.quantiles(weights, [0.5, 0.9])
+        return {**results[0], "median_weight": median_weight, "p90_weight": p90_weight}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
 
-def clean_for_json(data):
-    """Clean data for JSON serialization by replacing infinite values and NaN"""
-    if isinstance(data, dict):
-        cleaned = {}
-        for key, value in data.items():
-            if isinstance(value, dict):
-                cleaned[key] = clean_for_json(value)
-            elif isinstance(value, (int, float)):
-                if pd.isna(value) or value == float('inf') or value == float('-inf'):
-                    cleaned[key] = None
-                else:
-                    cleaned[key] = value
-            else:
-                cleaned[key] = value
-        return cleaned
-    return data
+@app.get("/catches/stats/quantiles")
+async def get_catch_quantiles(
+    field: str = "fish_weight",
+    q: str = "0.5,0.9",
+    lake: Optional[str] = None,
+    species: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Percentiles of a catch measurement, read from the user's quantile sketches (within 1%)"""
+    if field not in sketches.FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(sketches.FIELDS)}")
+    try:
+        qs = [float(value) for value in q.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be comma-separated numbers between 0 and 1")
+    if not qs or len(qs) > 20 or any(not 0 <= value <= 1 for value in qs):
+        raise HTTPException(status_code=400, detail="q must be 1 to 20 numbers between 0 and 1")
+    
+    try:
+        user_id = str(current_user["_id"])
+        if lake is None and species is None:
+            query = {"_id": sketches.user_key(user_id)}
+        else:
+            # Merge the matching (lake, species) sketches, e.g. one species across every lake
+            query = {"user_id": user_id, "level": "lake_species"}
+            if lake is not None:
+                query["lake"] = lake
+            if species is not None:
+                query["species"] = species
+        sketch = sketches.merge(await db[sketches.COLLECTION_NAME].find(query, {field: 1}).to_list(length=None), field)
+        return {
+            "field": field,
+            "count": sketch["n"],
+            "relative_accuracy": sketches.RELATIVE_ACCURACY,
+            "quantiles": {f"p{round(value * 100, 1):g}": result
+                          for value, result in zip(qs, sketches.quantiles(sketch, qs))}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting quantiles: {str(e)}")
+
+# --- Community Endpoints ---
+@app.get("/community/lakes")
+async def get_community_lakes(current_user: dict = Depends(get_current_user)):
+    """Lakes with enough anglers for a community snapshot, busiest first"""
+    try:
+        return {"lakes": await community.list_lakes(db)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting community lakes: {str(e)}")
+
+@app.get("/community/lakes/{lake}")
+async def get_community_lake(lake: str, current_user: dict = Depends(get_current_user)):
+    """What works on a lake across all anglers: top baits, structures, hours and bait-depth bands"""
+    try:
+        snapshot = await community.get_lake(db, lake)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting community lake: {str(e)}")
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"No community snapshot for {lake} yet")
+    return snapshot
 
 @app.get("/health")
 async def health_check():
@@ -1197,76 +2020,95 @@ async def health_check():
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    """Prometheus text exposition of request, MongoDB command and connection pool metrics"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/slow-queries")
+async def get_slow_queries(
+    route: Optional[str] = None,
+    command: Optional[str] = None,
+    min_duration_ms: Optional[float] = None,
+    limit: int = 50,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Recent find/aggregate commands slower than SLOW_QUERY_THRESHOLD_MS (admin endpoint)"""
+    try:
+        entries = await slow_query_log.query(
+            db, route=route, command=command, min_duration_ms=min_duration_ms, limit=min(max(limit, 1), 500)
+        )
+        return {
+            "threshold_ms": slow_query_log.LISTENER.threshold_ms,
+            "count": len(entries),
+            "entries": entries
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting slow queries: {str(e)}")
+
+@app.get("/admin/profiling")
+async def get_profiling_config(current_user: dict = Depends(get_admin_user)):
+    """Current request sampling configuration (admin endpoint)"""
+    return profiling.config.to_dict()
+
+@app.put("/admin/profiling")
+async def update_profiling_config(body: ProfilingConfigRequest, current_user: dict = Depends(get_admin_user)):
+    """Switch percentage-sampled profiling on or off (admin endpoint)"""
+    profiling.config.enabled = body.enabled
+    profiling.config.mode = body.mode
+    profiling.config.sample_rate = body.sample_rate
+    if body.routes is not None:
+        profiling.config.routes = set(body.routes)
+    return profiling.config.to_dict()
+
+@app.get("/admin/profiles")
+async def list_profiles(current_user: dict = Depends(get_admin_user)):
+    """Stored request profiles, newest first (admin endpoint)"""
+    return {"profiles": profiling.list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "text", current_user: dict = Depends(get_admin_user)):
+    """Download a profile as text, or as a .pstats file for CPU profiles (admin endpoint)"""
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    if format == "text":
+        return PlainTextResponse(profile.text)
+    if format == "pstats" and profile.stats is not None:
+        return Response(
+            content=profile.pstats_bytes(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.pstats"}
+        )
+    raise HTTPException(status_code=400, detail=f"Format {format} not available for this profile")
+
+@app.delete("/admin/profiles")
+async def clear_profiles(current_user: dict = Depends(get_admin_user)):
+    """Discard every stored profile (admin endpoint)"""
+    return {"deleted": profiling.clear_profiles()}
+
 @app.post("/sample-data/")
-async def create_sample_data():
+async def create_sample_data(
+    request: Optional[SampleDataRequest] = None,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Generate a seeded synthetic dataset (admin endpoint). Use tools/generate_sample_data.py for large scales."""
     try:
-        sample_catches = [
-            {
-                "date": "2024-01-15",
-                "time": "07:30:00",
-                "location": "24°50'42\"S 29°26'16\"E",
-                "lake": "Lake Serene",
-                "structure": "Weeds",
-                "water_temp": 22.0,
-                "water_quality": "Clear",
-                "line_type": "Braid",
-                "boat_depth": 10.0,
-                "bait_depth": 2.0,
-                "bait": "Senko",
-                "bait_type": "Soft",
-                "bait_colour": "Green Pumpkin",
-                "scented": False,
-                "fish_weight": 1.5,
-                "line_weight": 12.0,
-                "weight_pegged": True,
-                "hook_size": "2/0",
-                "comments": "Good Fight"
-            },
-            {
-                "date": "2024-01-16",
-                "time": "14:20:00",
-                "location": "24°51'12\"S 29°25'45\"E",
-                "lake": "Lake Serene",
-                "structure": "Rock Pile",
-                "water_temp": 24.5,
-                "water_quality": "Stained",
-                "line_type": "Fluorocarbon",
-                "boat_depth": 15.0,
-                "bait_depth": 8.0,
-                "bait": "Jig",
-                "bait_type": "Jig",
-                "bait_colour": "Black/Blue",
-                "scented": True,
-                "fish_weight": 2.8,
-                "comments": "Big one!"
-            },
-            {
-                "date": "2024-01-17",
-                "time": "09:45:00",
-                "location": "24°49'30\"S 29°27'10\"E",
-                "lake": "Lake Clearwater",
-                "structure": "Drop Off",
-                "water_temp": 21.0,
-                "water_quality": "Clear",
-                "line_type": "Braid",
-                "boat_depth": 20.0,
-                "bait_depth": 5.0,
-                "bait": "Crankbait",
-                "bait_type": "Hard",
-                "bait_colour": "Chartreuse",
-                "scented": False,
-                "fish_weight": 1.2,
-                "comments": "Multiple follows"
-            }
-        ]
-        
-        # Clear existing data first
-        await catches_collection.delete_many({})
-        
-        result = await catches_collection.insert_many(sample_catches)
+        request = request or SampleDataRequest()
+        result = await synthetic_data.seed_dataset(
+            db,
+            users=request.users,
+            catches_per_user=request.catches_per_user,
+            hashed_password=get_password_hash(request.password),
+            seed=request.seed,
+            clear=request.clear,
+        )
+        await catch_cache.invalidate(db, {"synthetic": True})
         return {
-            "message": f"Inserted {len(result.inserted_ids)} sample records", 
-            "inserted_ids": [str(id) for id in result.inserted_ids]
+            "message": f"Inserted {result['catches_inserted']} sample records for {result['users']} users",
+            **result
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sample data error: {str(e)}")
@@ -1275,126 +2117,186 @@ async def create_sample_data():
 async def clear_all_data():
     try:
         result = await catches_collection.delete_many({})
+        await db[sketches.COLLECTION_NAME].delete_many({})
+        await catch_sync.record_reset(db, [catch_sync.ALL_USERS])
+        await leaderboards.clear_catch_boards(db)
+        await catch_cache.invalidate(db, {})
         return {"message": f"Deleted {result.deleted_count} records"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Clear data error: {str(e)}")
 
 # --- Achievement Helper Functions ---
+DEFAULT_ACHIEVEMENTS = [
+    {
+        "name": "First Catch",
+        "description": "Log your first fish",
+        "icon": "🎣",
+        "category": "milestone",
+        "requirement": {"type": "catch_count", "value": 1},
+        "points": 10,
+        "is_active": True
+    },
+    {
+        "name": "Species Master",
+        "description": "Catch 5 different species",
+        "icon": "🐟",
+        "category": "species",
+        "requirement": {"type": "unique_species", "value": 5},
+        "points": 50,
+        "is_active": True
+    },
+    {
+        "name": "Weight Champion",
+        "description": "Catch a fish over 5kg",
+        "icon": "🏆",
+        "category": "weight",
+        "requirement": {"type": "max_weight", "value": 5.0},
+        "points": 100,
+        "is_active": True
+    },
+    {
+        "name": "Consistency King",
+        "description": "Log catches for 7 consecutive days",
+        "icon": "📅",
+        "category": "streak",
+        "requirement": {"type": "consecutive_days", "value": 7},
+        "points": 75,
+        "is_active": True
+    },
+    {
+        "name": "Night Owl",
+        "description": "Catch fish after 10 PM",
+        "icon": "🌙",
+        "category": "time",
+        "requirement": {"type": "time_range", "start": 22, "end": 24},
+        "points": 25,
+        "is_active": True
+    },
+    {
+        "name": "Early Bird",
+        "description": "Catch fish before 6 AM",
+        "icon": "🌅",
+        "category": "time",
+        "requirement": {"type": "time_range", "start": 0, "end": 6},
+        "points": 25,
+        "is_active": True
+    },
+    {
+        "name": "Lucky Streak",
+        "description": "Catch 3 fish in one day",
+        "icon": "🍀",
+        "category": "daily",
+        "requirement": {"type": "daily_catches", "value": 3},
+        "points": 40,
+        "is_active": True
+    },
+    {
+        "name": "Explorer",
+        "description": "Fish at 10 different locations",
+        "icon": "🗺️",
+        "category": "location",
+        "requirement": {"type": "unique_locations", "value": 10},
+        "points": 60,
+        "is_active": True
+    }
+]
+
 async def initialize_achievements():
-    """Initialize default achievements if they don't exist"""
+    """Upsert any missing default achievements by name; idempotent across concurrent workers"""
     try:
-        count = await achievements_collection.count_documents({})
-        if count == 0:
-            default_achievements = [
-                {
-                    "name": "First Catch",
-                    "description": "Log your first fish",
-                    "icon": "🎣",
-                    "category": "milestone",
-                    "requirement": {"type": "catch_count", "value": 1},
-                    "points": 10,
-                    "is_active": True
-                },
-                {
-                    "name": "Species Master",
-                    "description": "Catch 5 different species",
-                    "icon": "🐟",
-                    "category": "species",
-                    "requirement": {"type": "unique_species", "value": 5},
-                    "points": 50,
-                    "is_active": True
-                },
-                {
-                    "name": "Weight Champion",
-                    "description": "Catch a fish over 5kg",
-                    "icon": "🏆",
-                    "category": "weight",
-                    "requirement": {"type": "max_weight", "value": 5.0},
-                    "points": 100,
-                    "is_active": True
-                },
-                {
-                    "name": "Consistency King",
-                    "description": "Log catches for 7 consecutive days",
-                    "icon": "📅",
-                    "category": "streak",
-                    "requirement": {"type": "consecutive_days", "value": 7},
-                    "points": 75,
-                    "is_active": True
-                },
-                {
-                    "name": "Night Owl",
-                    "description": "Catch fish after 10 PM",
-                    "icon": "🌙",
-                    "category": "time",
-                    "requirement": {"type": "time_range", "start": 22, "end": 24},
-                    "points": 25,
-                    "is_active": True
-                },
-                {
-                    "name": "Early Bird",
-                    "description": "Catch fish before 6 AM",
-                    "icon": "🌅",
-                    "category": "time",
-                    "requirement": {"type": "time_range", "start": 0, "end": 6},
-                    "points": 25,
-                    "is_active": True
-                },
-                {
-                    "name": "Lucky Streak",
-                    "description": "Catch 3 fish in one day",
-                    "icon": "🍀",
-                    "category": "daily",
-                    "requirement": {"type": "daily_catches", "value": 3},
-                    "points": 40,
-                    "is_active": True
-                },
-                {
-                    "name": "Explorer",
-                    "description": "Fish at 10 different locations",
-                    "icon": "🗺️",
-                    "category": "location",
-                    "requirement": {"type": "unique_locations", "value": 10},
-                    "points": 60,
-                    "is_active": True
-                }
-            ]
-            
-            await achievements_collection.insert_many(default_achievements)
-            print("✅ Initialized default achievements")
-    except Exception as e:
-        print(f"❌ Error initializing achievements: {e}")
-
-async def check_achievements(user_id: str):
-    """Check and award achievements for a user"""
+        result = await achievements_collection.bulk_write(
+            [
+                UpdateOne({"name": achievement["name"]}, {"$setOnInsert": achievement}, upsert=True)
+                for achievement in DEFAULT_ACHIEVEMENTS
+            ],
+            ordered=False
+        )
+        if result.upserted_count:
+            logger.info("Initialized %d default achievements", result.upserted_count)
+    except BulkWriteError as e:
+        # Two workers upserting the same name at once: the unique index rejects the loser's insert
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            logger.exception("Error initializing achievements")
+    except Exception:
+        logger.exception("Error initializing achievements")
+
+async def record_catch_changes(user_id: str, added=(), removed=()):
+    """Keep the quantile sketches, the analysis cache and the leaderboards in step with a catch write.
+
+    `added` holds catches as they are now, `removed` as they were (an update is both).
+    Failures are logged, not returned to the client: the catch itself was written.
+    """
+    try:
+        # Also bumps the user's catch version, which tells other processes' analysis caches about the write
+        await sketches.apply(db, added=added, removed=[document for document in removed
+                                                        if document.get(sketches.MARKER)], writers=[user_id])
+    except Exception:
+        logger.exception("Error updating catch sketches")
+    try:
+        catch_cache.record_write(user_id, added=added, removed_ids=[document["_id"] for document in removed])
+    except Exception:
+        logger.exception("Error updating the analysis cache")
+    kept = {document["_id"] for document in added}
+    try:
+        await catch_sync.record_deletes(db, user_id, [document["_id"] for document in removed
+                                                      if document["_id"] not in kept])
+    except Exception:
+        logger.exception("Error recording catch tombstones")
+    try:
+        await leaderboards.apply_changes(db, user_id, added=added, removed=removed)
+    except Exception:
+        logger.exception("Error updating leaderboards")
+
+async def notify_catches_changed(user_id: str, added=()):
+    """Tell the user's clients their catches changed; call once per write, however many catches it touched.
+
+    `added` holds the catches the write created: only new catches can earn an achievement, so edits and
+    deletes pass none and skip the check.
+    """
+    events.publish(user_id, "catches_changed", {"at": datetime.utcnow()})
+    if added:
+        try:
+            await check_achievements(user_id, added=added)
+        except Exception:
+            logger.exception("Error checking achievements")
+
+async def check_achievements(user_id: str, added: Optional[List[Dict[str, Any]]] = None, resync: bool = False):
+    """Check and award achievements for a user.
+
+    Requirements are evaluated against the catches a write `added` and per-user aggregates (leaderboard
+    entries, indexed counts), or against the aggregates alone when `added` is None. Only `resync` loads
+    every catch, for requirement changes the aggregates can't see.
+    """
     try:
         # Get all active achievements
         achievements = []
         async for achievement in achievements_collection.find({"is_active": True}):
             achievements.append(achievement)
         
-        # Get user's catches
-        catches = []
-        async for catch in catches_collection.find({"user_id": user_id}):
-            catches.append(catch)
+        new_achievements = []
         
-        if not catches:
-            return []
+        # Achievements the user already has, in one query
+        earned_ids = set()
+        async for user_achievement in user_achievements_collection.find({
+            "user_id": user_id,
+            "achievement_id": {"$in": [str(achievement["_id"]) for achievement in achievements]}
+        }, {"achievement_id": 1}):
+            earned_ids.add(user_achievement["achievement_id"])
         
-        new_achievements = []
+        pending = [achievement for achievement in achievements if str(achievement["_id"]) not in earned_ids]
+        if not pending:
+            return []
+        catches = None
+        if resync:
+            catches = [catch async for catch in catches_collection.find({"user_id": user_id})]
+        facts: Dict[Any, Any] = {}
         
-        for achievement in achievements:
-            # Check if user already has this achievement
-            existing = await user_achievements_collection.find_one({
-                "user_id": user_id,
-                "achievement_id": str(achievement["_id"])
-            })
-            
-            if existing:
-                continue
-            
+        for achievement in pending:
             # Check achievement requirements
-            earned = await check_achievement_requirement(achievement, catches)
+            if catches is not None:
+                earned = await check_achievement_requirement(achievement, catches)
+            else:
+                earned = await achievement_reached(achievement, user_id, added, facts)
             
             if earned:
                 # Award achievement
@@ -1408,12 +2310,89 @@ async def check_achievements(user_id: str):
                 result = await user_achievements_collection.insert_one(user_achievement)
                 user_achievement["_id"] = str(result.inserted_id)
                 new_achievements.append(user_achievement)
-        
+                events.publish(user_id, "achievement_earned", {
+                    "achievement_id": user_achievement["achievement_id"],
+                    "name": achievement.get("name"),
+                    "description": achievement.get("description"),
+                    "icon": achievement.get("icon"),
+                    "points": achievement.get("points", 0),
+                    "earned_at": user_achievement["earned_at"],
+                })
+        
+        if new_achievements:
+            await leaderboards.refresh_points(db, user_id)
         return new_achievements
-    except Exception as e:
-        print(f"Error checking achievements: {e}")
+    except Exception:
+        logger.exception("Error checking achievements")
         return []
 
+# Catch field whose distinct values each "unique" requirement counts
+DISTINCT_REQUIREMENT_FIELDS = {"unique_species": "species", "unique_locations": "location", "consecutive_days": "date"}
+
+async def achievement_reached(achievement, user_id: str, added: Optional[List[Dict[str, Any]]], facts: Dict[Any, Any]):
+    """Check a requirement without loading the user's catches.
+
+    With `added`, only what those new catches can have changed is looked at. `facts` caches the
+    aggregates read for one check, so achievements of the same type share a query.
+    """
+    async def fact(key, load):
+        if key not in facts:
+            facts[key] = await load()
+        return facts[key]
+    
+    try:
+        req = achievement["requirement"]
+        req_type = req["type"]
+        
+        if req_type == "catch_count":
+            count = await fact("catch_count", lambda: leaderboards.score(db, "catch_count", user_id))
+            return (count or 0) >= req["value"]
+        
+        elif req_type in DISTINCT_REQUIREMENT_FIELDS:
+            field = DISTINCT_REQUIREMENT_FIELDS[req_type]
+            if added is not None and not any(catch.get(field) for catch in added):
+                return False
+            values = await fact(("distinct", field),
+                                lambda: catches_collection.distinct(field, {"user_id": user_id}))
+            return sum(1 for value in values if value) >= req["value"]
+        
+        elif req_type == "max_weight":
+            if added is not None:
+                return any((leaderboards.catch_weight(catch.get("fish_weight")) or 0) >= req["value"]
+                           for catch in added)
+            heaviest = await fact("heaviest", lambda: leaderboards.heaviest(db, user_id))
+            return heaviest is not None and heaviest >= req["value"]
+        
+        elif req_type == "time_range":
+            if added is not None:
+                return any(req["start"] <= catch_cache.hour_of(catch.get("time")) < req["end"] for catch in added)
+            hours = "|".join(str(hour) for hour in range(req["start"], req["end"]))
+            if not hours:
+                return False
+            return await catches_collection.find_one(
+                {"user_id": user_id, "time": {"$regex": f"^0?({hours}):"}}, {"_id": 1}) is not None
+        
+        elif req_type == "daily_catches":
+            match: Dict[str, Any] = {"user_id": user_id, "date": {"$ne": None}}
+            if added is not None:
+                # Only the days the new catches fell on can have reached the count
+                days = sorted({catch["date"] for catch in added if catch.get("date")})
+                if not days:
+                    return False
+                match["date"] = {"$in": days}
+            busiest = await fact("busiest_day", lambda: catches_collection.aggregate([
+                {"$match": match},
+                {"$group": {"_id": "$date", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 1},
+            ]).to_list(length=1))
+            return bool(busiest) and busiest[0]["count"] >= req["value"]
+        
+        return False
+    except Exception:
+        logger.exception("Error checking achievement requirement")
+        return False
+
 async def check_achievement_requirement(achievement, catches):
     """Check if a specific achievement requirement is met"""
     try:
@@ -1470,8 +2449,8 @@ async def check_achievement_requirement(achievement, catches):
             return len(locations) >= req["value"]
         
         return False
-    except Exception as e:
-        print(f"Error checking achievement requirement: {e}")
+    except Exception:
+        logger.exception("Error checking achievement requirement")
         return False
 
 # --- Achievement Endpoints ---
@@ -1557,16 +2536,16 @@ async def calculate_achievement_progress(achievement, catches):
         
         # For other types, return basic progress
         return {"current": 0, "target": 1, "percentage": 0}
-    except Exception as e:
-        print(f"Error calculating progress: {e}")
+    except Exception:
+        logger.exception("Error calculating progress")
         return {"current": 0, "target": 1, "percentage": 0}
 
 @app.post("/achievements/check")
-async def check_user_achievements(current_user: dict = Depends(get_current_user)):
-    """Manually check and award new achievements"""
+async def check_user_achievements(resync: bool = False, current_user: dict = Depends(get_current_user)):
+    """Manually check and award new achievements; ?resync=true rescans every catch instead of the aggregates"""
     try:
         user_id = str(current_user["_id"])
-        new_achievements = await check_achievements(user_id)
+        new_achievements = await check_achievements(user_id, resync=resync)
         
         return {
             "success": True,
@@ -1576,6 +2555,105 @@ async def check_user_achievements(current_user: dict = Depends(get_current_user)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking achievements: {str(e)}")
 
+# --- Event Stream ---
+@app.post("/events/ticket")
+async def event_stream_ticket(current_user: dict = Depends(get_current_user)):
+    """A short-lived token that only opens /events/stream, for clients that can't send headers (EventSource)"""
+    ticket = create_access_token(
+        data={"sub": current_user["username"], "scope": "events"},
+        expires_delta=timedelta(seconds=EVENTS_TICKET_SECONDS),
+    )
+    return {"ticket": ticket, "expires_in": EVENTS_TICKET_SECONDS}
+
+@app.get("/events/stream")
+async def event_stream(
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-sent events for the current user: catches_changed, achievement_earned, resync.
+
+    Browsers' EventSource can't set an Authorization header, so it passes a ticket from /events/ticket as
+    ?ticket= instead: the access token itself never goes in the URL.
+    """
+    if credentials:
+        current_user = await user_from_token(credentials.credentials)
+    elif ticket:
+        current_user = await user_from_token(ticket, scope="events")
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    subscription = events.subscribe(str(current_user["_id"]))
+    return StreamingResponse(
+        events.stream(subscription),
+        media_type="text/event-stream",
+        # Stop proxies (nginx in particular) from buffering or caching the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Leaderboard Endpoints ---
+def leaderboard_board(board: str, species: Optional[str]) -> str:
+    if board == "heaviest":
+        if not species:
+            raise HTTPException(status_code=400, detail="The heaviest board needs a species")
+        return leaderboards.heaviest_board(species)
+    if board not in leaderboards.FIXED_BOARDS:
+        raise HTTPException(status_code=404, detail=f"Unknown leaderboard: {board}")
+    return board
+
+@app.get("/leaderboards")
+async def get_leaderboards(current_user: dict = Depends(get_current_user)):
+    """Available leaderboards, including one heaviest-fish board per species"""
+    try:
+        return {"boards": await leaderboards.boards(db)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting leaderboards: {str(e)}")
+
+@app.get("/leaderboards/{board}")
+async def get_leaderboard(
+    board: str,
+    species: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 20,
+    current_user: dict = Depends(get_current_user)
+):
+    """One page of a leaderboard: points, catch_count, or heaviest (with ?species=)"""
+    board_id = leaderboard_board(board, species)
+    offset, limit = max(offset, 0), min(max(limit, 1), 100)
+    try:
+        entries = await leaderboards.page(db, board_id, offset, limit)
+        user_ids = [ObjectId(entry["user_id"]) for entry in entries if ObjectId.is_valid(entry["user_id"])]
+        usernames = {str(user["_id"]): user["username"] async for user in
+                     users_collection.find({"_id": {"$in": user_ids}}, {"username": 1})}
+        me = str(current_user["_id"])
+        return {
+            "board": board_id,
+            "offset": offset,
+            "limit": limit,
+            "entries": [{
+                "rank": entry["rank"],
+                "username": usernames.get(entry["user_id"]),
+                "score": entry["score"],
+                "is_me": entry["user_id"] == me
+            } for entry in entries]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting leaderboard: {str(e)}")
+
+@app.get("/leaderboards/{board}/me")
+async def get_my_leaderboard_rank(board: str, species: Optional[str] = None,
+                                  current_user: dict = Depends(get_current_user)):
+    """The current user's rank and score on a leaderboard"""
+    board_id = leaderboard_board(board, species)
+    try:
+        position = await leaderboards.rank(db, board_id, str(current_user["_id"]))
+        return {"board": board_id, "rank": position["rank"] if position else None,
+                "score": position["score"] if position else None}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting leaderboard rank: {str(e)}")
+
 @app.post("/achievements/initialize")
 async def initialize_achievements_endpoint():
     """Initialize default achievements (admin endpoint)"""
@@ -2,13 +2,19 @@
 """
 Migration script to add user_id to existing catch records.
 Run this after deploying the authentication system to production.
+
+This is the 0001_backfill_catch_user_id step of the migration framework;
+`python tools/migrate.py run` applies it along with every other pending migration.
 """
 
 import asyncio
+import logging
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
+import migrations
+
 # Load environment variables
 load_dotenv()
 
@@ -22,47 +28,15 @@ async def migrate_existing_data():
     # Connect to MongoDB
     client = AsyncIOMotorClient(MONGO_URL)
     db = client[DB_NAME]
-    catches_collection = db.catches
-    users_collection = db.users
     
     try:
         print("🔍 Starting data migration...")
-        
-        # Check if we have any users
-        user_count = await users_collection.count_documents({})
-        if user_count == 0:
-            print("❌ No users found. Please create at least one user first.")
-            return
-        
-        # Get the first user (or you can specify a particular user)
-        first_user = await users_collection.find_one({})
-        if not first_user:
-            print("❌ No users found in database")
-            return
-        
-        user_id = str(first_user["_id"])
-        print(f"✅ Using user ID: {user_id}")
-        
-        # Find all catches without user_id
-        catches_without_user = catches_collection.find({"user_id": {"$exists": False}})
-        
-        update_count = 0
-        async for catch in catches_without_user:
-            # Add user_id to the catch
-            await catches_collection.update_one(
-                {"_id": catch["_id"]},
-                {"$set": {"user_id": user_id}}
-            )
-            update_count += 1
-            
-            if update_count % 10 == 0:
-                print(f"📝 Updated {update_count} records...")
-        
-        print(f"✅ Migration complete! Updated {update_count} catch records.")
+        result = await migrations.apply(db, migrations.get_migration("0001_backfill_catch_user_id"))
+        print(f"✅ Migration {result['status']}! Updated {result['modified']} catch records.")
         
         # Verify migration
-        total_catches = await catches_collection.count_documents({})
-        catches_with_user = await catches_collection.count_documents({"user_id": {"$exists": True}})
+        total_catches = await db.catches.count_documents({})
+        catches_with_user = await db.catches.count_documents({"user_id": {"$exists": True}})
         
         print(f"📊 Total catches: {total_catches}")
         print(f"📊 Catches with user_id: {catches_with_user}")
@@ -78,6 +52,7 @@ async def migrate_existing_data():
         client.close()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("🚀 BiteTracker Data Migration Script")
     print("=" * 40)
     
@@ -89,4 +64,3 @@ if __name__ == "__main__":
     print("1. Test the application with the migrated data")
     print("2. Verify that all catches are associated with the correct user")
     print("3. Create additional users as needed")
-    print("4. Consider deleting this script after successful migration")
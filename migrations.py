@@ -0,0 +1,339 @@
+"""
+Versioned, batched, resumable data migrations.
+
+Each Migration is an idempotent backfill: `selector()` matches only the
+documents that still need it, so re-running a migration (or running it
+alongside live writes) never applies it twice. The runner walks the collection
+in ascending `_id` ranges of `batch_size` documents and applies each batch
+with one unordered bulk_write, pausing between batches so live traffic keeps
+its share of the database.
+
+Progress is checkpointed in the `schema_migrations` collection after every
+batch (last `_id` processed, documents modified). A stopped run resumes from
+its checkpoint; a finished one is recorded as applied and skipped afterwards.
+A lease on the checkpoint document keeps two runners from working on the
+same migration at once. Run pending migrations with `tools/migrate.py`.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import catch_sync
+import leaderboards
+import sketches
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "schema_migrations"
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PAUSE_MS = 100
+LEASE_SECONDS = 60
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    """An idempotent backfill over one collection.
+
+    Subclasses set `version`, `description` and `collection`, and implement
+    `selector()` plus either `update()` (one update per document) or
+    `apply_batch()` for anything that isn't a per-document update.
+    """
+
+    version = ""
+    description = ""
+    collection = "catches"
+    # Fields the runner needs to fetch for update(); None fetches whole documents
+    projection: Optional[Dict[str, int]] = {"_id": 1}
+
+    async def prepare(self, db):
+        """Resolve anything the updates depend on, once per run"""
+
+    def selector(self) -> Dict[str, Any]:
+        """Documents that still need this migration"""
+        raise NotImplementedError
+
+    def update(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def changed_users(self, documents: List[Dict[str, Any]]) -> Set[str]:
+        """Users whose catches this batch changed, so their cached analysis columns are rebuilt"""
+        return set()
+
+    async def apply_batch(self, db, documents: List[Dict[str, Any]]) -> int:
+        """Apply the migration to one batch; returns the number of documents modified"""
+        selector = self.selector()
+        # Re-check the selector per document so a concurrent write that already fixed it wins
+        requests = [UpdateOne({"_id": document["_id"], **selector}, self.update(document))
+                    for document in documents]
+        result = await db[self.collection].bulk_write(requests, ordered=False)
+        return result.modified_count
+
+
+class BackfillCatchUserId(Migration):
+    version = "0001_backfill_catch_user_id"
+    description = "Assign catches logged before authentication to the first registered user"
+
+    async def prepare(self, db):
+        first_user = await db.users.find_one({}, {"_id": 1}, sort=[("_id", 1)])
+        if first_user is None:
+            raise MigrationError("No users found; create at least one user before assigning catches")
+        self.user_id = str(first_user["_id"])
+
+    def selector(self):
+        return {"user_id": {"$exists": False}}
+
+    def update(self, document):
+        return {"$set": {"user_id": self.user_id, "updated_at": catch_sync.now()}}
+
+    def changed_users(self, documents):
+        return {self.user_id}
+
+
+class DefaultCatchSpecies(Migration):
+    version = "0002_default_catch_species"
+    description = "Set species to \"Unknown\" on catches logged before species was recorded"
+
+    def selector(self):
+        return {"species": {"$exists": False}}
+
+    projection = {"_id": 1, "user_id": 1}
+
+    def update(self, document):
+        return {"$set": {"species": "Unknown", "updated_at": catch_sync.now()}}
+
+    def changed_users(self, documents):
+        return {document["user_id"] for document in documents if document.get("user_id")}
+
+
+class BuildCatchSketches(Migration):
+    version = "0003_build_catch_sketches"
+    description = "Count catches logged before quantile sketches existed into catch_sketches"
+    projection = sketches.PROJECTION
+
+    def selector(self):
+        return {sketches.MARKER: {"$exists": False}, "user_id": {"$exists": True}}
+
+    async def apply_batch(self, db, documents):
+        # Claim each catch before counting it; one a live write already counted fails the claim
+        selector = self.selector()
+        results = await asyncio.gather(*(
+            db[self.collection].update_one({"_id": document["_id"], **selector},
+                                           {"$set": {sketches.MARKER: True}})
+            for document in documents
+        ))
+        claimed = [document for document, result in zip(documents, results) if result.modified_count]
+        await sketches.apply(db, added=claimed)
+        return len(claimed)
+
+
+class BuildLeaderboards(Migration):
+    version = "0004_build_leaderboards"
+    description = "Compute leaderboard scores for users registered before leaderboards existed"
+    collection = "users"
+
+    def selector(self):
+        return {}
+
+    async def apply_batch(self, db, documents):
+        # Scores are recomputed from scratch, so running this twice changes nothing
+        for document in documents:
+            await leaderboards.refresh_catches(db, str(document["_id"]))
+            await leaderboards.refresh_points(db, str(document["_id"]))
+        return len(documents)
+
+
+class BackfillCatchUpdatedAt(Migration):
+    version = "0005_backfill_catch_updated_at"
+    description = "Stamp updated_at on catches logged before delta sync, using their creation time"
+
+    def selector(self):
+        return {"updated_at": {"$exists": False}}
+
+    projection = {"_id": 1, "user_id": 1}
+
+    def update(self, document):
+        # Creation time, so catches a client already has aren't all re-sent as changed today
+        return {"$set": {"updated_at": document["_id"].generation_time.replace(tzinfo=None)}}
+
+    def changed_users(self, documents):
+        return {document["user_id"] for document in documents if document.get("user_id")}
+
+
+# Applied in this order; never renumber or remove an entry once it has shipped
+MIGRATIONS: List[Migration] = [
+    BackfillCatchUserId(),
+    DefaultCatchSpecies(),
+    BuildCatchSketches(),
+    BuildLeaderboards(),
+    BackfillCatchUpdatedAt(),
+]
+
+
+def get_migration(version: str) -> Migration:
+    for migration in MIGRATIONS:
+        if migration.version == version:
+            return migration
+    raise MigrationError(f"Unknown migration: {version}")
+
+
+async def status(db) -> List[Dict[str, Any]]:
+    """Every known migration with its recorded state"""
+    records = {record["_id"]: record async for record in db[COLLECTION_NAME].find({})}
+    statuses = []
+    for migration in MIGRATIONS:
+        record = records.get(migration.version, {})
+        statuses.append({
+            "version": migration.version,
+            "description": migration.description,
+            "status": record.get("status", "pending"),
+            "processed": record.get("processed", 0),
+            "modified": record.get("modified", 0),
+            "started_at": record.get("started_at"),
+            "applied_at": record.get("applied_at"),
+        })
+    return statuses
+
+
+async def _acquire(db, migration: Migration, owner: str) -> Dict[str, Any]:
+    """Take the lease on a migration's checkpoint, creating the checkpoint on first run"""
+    now = datetime.utcnow()
+    collection = db[COLLECTION_NAME]
+    try:
+        await collection.insert_one({
+            "_id": migration.version,
+            "description": migration.description,
+            "status": "running",
+            "last_id": None,
+            "processed": 0,
+            "modified": 0,
+            "started_at": now,
+            "updated_at": now,
+            "lease_owner": owner,
+            "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+        })
+        return await collection.find_one({"_id": migration.version})
+    except DuplicateKeyError:
+        pass
+
+    record = await collection.find_one_and_update(
+        {
+            "_id": migration.version,
+            "status": {"$ne": "applied"},
+            "$or": [{"lease_expires_at": {"$lt": now}}, {"lease_owner": owner}],
+        },
+        {"$set": {"status": "running", "lease_owner": owner,
+                  "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if record is None:
+        existing = await collection.find_one({"_id": migration.version})
+        if existing and existing.get("status") == "applied":
+            return existing
+        raise MigrationError(f"{migration.version} is being run by {existing.get('lease_owner')}")
+    return record
+
+
+async def _bump_catch_versions(db, user_ids: Set[str]):
+    """Tell every app process's analysis cache (catch_cache.py) that these users' catches changed"""
+    if user_ids:
+        await sketches.bump_versions(db, user_ids)
+
+
+async def apply(db, migration: Migration, batch_size: int = DEFAULT_BATCH_SIZE,
+                pause_ms: float = DEFAULT_PAUSE_MS, scope: Optional[Dict[str, Any]] = None,
+                max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """Run one migration in _id-range batches.
+
+    With `scope` the run only touches matching documents (e.g. one user's
+    catches) and is not checkpointed or recorded as applied. `max_batches`
+    stops after that many batches, leaving the checkpoint to resume from.
+    """
+    await migration.prepare(db)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    record = None
+    last_id = None
+    if scope is None:
+        record = await _acquire(db, migration, owner)
+        if record.get("status") == "applied":
+            return {"version": migration.version, "status": "applied", "processed": 0, "modified": 0}
+        last_id = record.get("last_id")
+        if last_id is not None:
+            logger.info("Resuming %s after _id %s", migration.version, last_id)
+
+    collection = db[migration.collection]
+    query = {**migration.selector(), **(scope or {})}
+    processed = modified = batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            batch_filter = dict(query)
+            if last_id is not None:
+                batch_filter["_id"] = {"$gt": last_id}
+            documents = await collection.find(batch_filter, migration.projection) \
+                .sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not documents:
+                break
+
+            batch_modified = await migration.apply_batch(db, documents)
+            if batch_modified:
+                await _bump_catch_versions(db, migration.changed_users(documents))
+            last_id = documents[-1]["_id"]
+            processed += len(documents)
+            modified += batch_modified
+            batches += 1
+
+            if record is not None:
+                await db[COLLECTION_NAME].update_one(
+                    {"_id": migration.version, "lease_owner": owner},
+                    {
+                        "$set": {"last_id": last_id, "updated_at": datetime.utcnow(),
+                                 "lease_expires_at": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)},
+                        "$inc": {"processed": len(documents), "modified": batch_modified},
+                    },
+                )
+            logger.info("%s: %d documents processed, %d modified", migration.version, processed, modified)
+            if len(documents) < batch_size:
+                break
+            if pause_ms:
+                await asyncio.sleep(pause_ms / 1000)
+        else:
+            return {"version": migration.version, "status": "running", "processed": processed,
+                    "modified": modified}
+    finally:
+        if record is not None:
+            # Release the lease so a stopped run can be resumed straight away
+            await db[COLLECTION_NAME].update_one(
+                {"_id": migration.version, "lease_owner": owner},
+                {"$set": {"lease_expires_at": datetime.utcnow()}},
+            )
+
+    if record is not None:
+        await db[COLLECTION_NAME].update_one(
+            {"_id": migration.version, "lease_owner": owner},
+            {"$set": {"status": "applied", "applied_at": datetime.utcnow()}},
+        )
+    return {"version": migration.version, "status": "applied", "processed": processed, "modified": modified}
+
+
+async def run_pending(db, target: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                      pause_ms: float = DEFAULT_PAUSE_MS, max_batches: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Apply every migration not yet applied, in order, up to and including `target`"""
+    if target is not None:
+        get_migration(target)
+    results = []
+    for migration in MIGRATIONS:
+        result = await apply(db, migration, batch_size=batch_size, pause_ms=pause_ms, max_batches=max_batches)
+        results.append(result)
+        if result["status"] != "applied" or migration.version == target:
+            break
+    return results
@@ -0,0 +1,162 @@
+"""
+On-demand request profiling.
+
+Requests are profiled when an admin sends an `X-Profile: cpu|memory` header, or
+when sampling is switched on for a route through `/admin/profiling`. CPU mode
+records a cProfile call graph, memory mode a tracemalloc allocation diff.
+Profiles are kept in memory (newest PROFILE_STORE_SIZE) and downloaded from
+`/admin/profiles/{id}` as pstats or text.
+
+Only one request is profiled at a time: both cProfile and tracemalloc observe
+the whole event loop thread, so anything else the worker runs during the
+window (other requests, background tasks) shows up in the profile too.
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+MODES = ("cpu", "memory")
+PROFILE_STORE_SIZE = 50
+TEXT_LINES = 60
+
+
+class ProfilingConfig:
+    """Sampling switch; header-triggered profiling works regardless of `enabled`"""
+
+    def __init__(self):
+        self.enabled = False
+        self.mode = "cpu"
+        self.sample_rate = 0.0
+        self.routes: Set[str] = {"/catches/bulk", "/analyze/", "/achievements/"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "routes": sorted(self.routes),
+        }
+
+
+class Profile:
+    def __init__(self, route: str, method: str, mode: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.route = route
+        self.method = method
+        self.mode = mode
+        self.created_at = datetime.utcnow()
+        self.duration_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.stats: Optional[Dict] = None  # cProfile stats, the format pstats files hold
+        self.text = ""
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "route": self.route,
+            "method": self.method,
+            "mode": self.mode,
+            "created_at": self.created_at,
+            "duration_ms": self.duration_ms,
+            "status_code": self.status_code,
+            "formats": ["pstats", "text"] if self.mode == "cpu" else ["text"],
+        }
+
+    def pstats_bytes(self) -> bytes:
+        return marshal.dumps(self.stats)
+
+
+config = ProfilingConfig()
+_profiles: "OrderedDict[str, Profile]" = OrderedDict()
+_active = False
+
+
+def select_mode(route: str, header_mode: Optional[str], is_admin: bool) -> Optional[str]:
+    """Decide whether to profile this request, and how"""
+    if _active:
+        return None
+    if header_mode and is_admin and header_mode.lower() in MODES:
+        return header_mode.lower()
+    if config.enabled and route in config.routes and random.random() < config.sample_rate:
+        return config.mode
+    return None
+
+
+async def profile_request(route: str, method: str, mode: str, call):
+    """Await `call()` under the chosen profiler and store the result; returns (response, profile)"""
+    global _active
+    _active = True
+    profile = Profile(route, method, mode)
+    started = time.perf_counter()
+    try:
+        if mode == "cpu":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = await call()
+            finally:
+                profiler.disable()
+            profiler.create_stats()
+            profile.stats = profiler.stats
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(TEXT_LINES)
+            profile.text = stream.getvalue()
+        else:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(25)
+            try:
+                before = tracemalloc.take_snapshot()
+                response = await call()
+                after = tracemalloc.take_snapshot()
+            finally:
+                if started_tracing:
+                    tracemalloc.stop()
+            profile.text = _format_allocation_diff(after.compare_to(before, "lineno"))
+        profile.status_code = response.status_code
+        return response, profile
+    finally:
+        profile.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        _store(profile)
+        _active = False
+
+
+def _format_allocation_diff(differences) -> str:
+    lines = ["Allocation diff by line (after - before), largest first", ""]
+    total = sum(stat.size_diff for stat in differences)
+    lines.append(f"Net change: {total / 1024:.1f} KiB")
+    lines.append("")
+    for stat in differences[:TEXT_LINES]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                     f"{frame.filename}:{frame.lineno}")
+    return "\n".join(lines) + "\n"
+
+
+def _store(profile: Profile):
+    _profiles[profile.id] = profile
+    while len(_profiles) > PROFILE_STORE_SIZE:
+        _profiles.popitem(last=False)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    return [profile.summary() for profile in reversed(_profiles.values())]
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    return _profiles.get(profile_id)
+
+
+def clear_profiles() -> int:
+    count = len(_profiles)
+    _profiles.clear()
+    return count
@@ -0,0 +1,135 @@
+"""
+Per-user rate limiting and admission control for expensive endpoints.
+
+Each expensive route belongs to a route class ("analysis", "bulk"). A request
+must take a token from the caller's bucket for its class (sustained
+`per_minute`, bursts up to `burst`) or it is rejected with 429. Admitted
+requests then count against one worker-wide cap on concurrent expensive work
+(RATE_LIMIT_MAX_CONCURRENT); when the cap is reached the request is turned
+away with 503 rather than queued, so cheap routes keep the event loop.
+Both rejections carry a Retry-After header.
+
+State is in-process: with several uvicorn workers each enforces its own
+limits, so the effective per-user rate is up to WEB_CONCURRENCY times higher.
+
+    RATE_LIMIT_ENABLED=true
+    RATE_LIMIT_ANALYSIS_PER_MINUTE=30   RATE_LIMIT_ANALYSIS_BURST=10
+    RATE_LIMIT_BULK_PER_MINUTE=6        RATE_LIMIT_BULK_BURST=3
+    RATE_LIMIT_MAX_CONCURRENT=4
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import metrics
+
+ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+MAX_CONCURRENT = int(os.environ.get("RATE_LIMIT_MAX_CONCURRENT", "4"))
+# Idle buckets refill to full, so forgetting the least recently used ones loses nothing
+MAX_BUCKETS = 10000
+
+RATE_LIMIT_ADMITTED = metrics.REGISTRY.counter(
+    "rate_limit_admitted_total", "Expensive requests admitted", ("route_class",))
+RATE_LIMIT_REJECTED = metrics.REGISTRY.counter(
+    "rate_limit_rejected_total", "Expensive requests rejected, by reason (rate or concurrency)",
+    ("route_class", "reason"))
+RATE_LIMIT_IN_FLIGHT = metrics.REGISTRY.gauge(
+    "rate_limit_in_flight", "Expensive requests currently running", ("route_class",))
+
+
+class RouteClass:
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = burst
+
+    @classmethod
+    def from_env(cls, name: str, per_minute: float, burst: int) -> "RouteClass":
+        prefix = f"RATE_LIMIT_{name.upper()}"
+        return cls(name, float(os.environ.get(f"{prefix}_PER_MINUTE", per_minute)),
+                   int(os.environ.get(f"{prefix}_BURST", burst)))
+
+
+ROUTE_CLASSES: Dict[str, RouteClass] = {
+    "analysis": RouteClass.from_env("analysis", per_minute=30, burst=10),
+    "bulk": RouteClass.from_env("bulk", per_minute=6, burst=3),
+}
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, else seconds until a token is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return 60.0
+        return (1 - self.tokens) / self.rate
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Limiter:
+    """Token buckets per (route class, user) plus the worker-wide concurrency cap.
+
+    Only touched from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, route_classes: Dict[str, RouteClass], max_concurrent: int):
+        self.route_classes = route_classes
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+
+    def _bucket(self, route_class: RouteClass, user_id: str) -> TokenBucket:
+        key = (route_class.name, user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(route_class.per_minute, route_class.burst)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, route_class_name: str, user_id: str):
+        """Admit one request or raise Rejected; every admitted request must be release()d"""
+        route_class = self.route_classes[route_class_name]
+        if self.in_flight >= self.max_concurrent:
+            RATE_LIMIT_REJECTED.inc(route_class=route_class.name, reason="concurrency")
+            raise Rejected(503, "Server is busy with other analysis or upload requests, please retry shortly", 1)
+
+        retry_after = self._bucket(route_class, user_id).take()
+        if retry_after:
+            RATE_LIMIT_REJECTED.inc(route_class=route_class.name, reason="rate")
+            raise Rejected(429, f"Too many {route_class.name} requests, please slow down", retry_after)
+
+        self.in_flight += 1
+        RATE_LIMIT_ADMITTED.inc(route_class=route_class.name)
+        RATE_LIMIT_IN_FLIGHT.inc(route_class=route_class.name)
+
+    def release(self, route_class_name: str):
+        self.in_flight -= 1
+        RATE_LIMIT_IN_FLIGHT.dec(route_class=route_class_name)
+
+
+LIMITER = Limiter(ROUTE_CLASSES, MAX_CONCURRENT)
+
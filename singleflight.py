@@ -0,0 +1,72 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+When several identical requests from the same user arrive while one is still
+being computed (dashboard widgets mounting together, a double click), only
+the first runs; the others await the same task and receive the same result
+or exception. Requests are identical when user, route and normalised body
+match. Nothing is cached: once the computation finishes, the next request
+runs it again.
+
+The computation runs as its own task behind asyncio.shield, so a caller that
+disconnects or times out doesn't cancel the work the other callers are
+waiting for. When the last waiter leaves, the computation is cancelled.
+Results are shared, so callers must not mutate them.
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import metrics
+
+SINGLEFLIGHT_EXECUTIONS = metrics.REGISTRY.counter(
+    "singleflight_executions_total", "Computations started by single-flight routes", ("route",))
+SINGLEFLIGHT_COALESCED = metrics.REGISTRY.counter(
+    "singleflight_coalesced_total", "Requests served by joining an identical in-flight computation "
+    "(executions saved)", ("route",))
+SINGLEFLIGHT_CANCELLED = metrics.REGISTRY.counter(
+    "singleflight_cancelled_total", "Computations cancelled because every waiting request went away", ("route",))
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+_in_flight: Dict[Tuple[str, str, str], _Call] = {}
+
+
+def key(route: str, user_id: str, body: Any) -> Tuple[str, str, str]:
+    return route, user_id, json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+
+
+async def run(route: str, user_id: str, body: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+    """Return call()'s result, sharing one execution among identical concurrent requests"""
+    call_key = key(route, user_id, body)
+    shared = _in_flight.get(call_key)
+    if shared is None:
+        shared = _in_flight[call_key] = _Call(asyncio.create_task(call()))
+        shared.task.add_done_callback(lambda finished: _forget(call_key, shared))
+        SINGLEFLIGHT_EXECUTIONS.inc(route=route)
+    else:
+        SINGLEFLIGHT_COALESCED.inc(route=route)
+
+    shared.waiters += 1
+    try:
+        return await asyncio.shield(shared.task)
+    finally:
+        shared.waiters -= 1
+        if shared.waiters == 0 and not shared.task.done():
+            # Every caller has gone; don't leave the work running for nobody
+            _forget(call_key, shared)
+            shared.task.cancel()
+            SINGLEFLIGHT_CANCELLED.inc(route=route)
+
+
+def _forget(call_key: Tuple[str, str, str], shared: _Call):
+    if _in_flight.get(call_key) is shared:
+        del _in_flight[call_key]
+    if shared.task.done() and not shared.task.cancelled():
+        shared.task.exception()  # Mark retrieved even if every waiter has gone
@@ -0,0 +1,196 @@
+"""
+Mergeable quantile sketches of catch measurements.
+
+Each sketch is a DDSketch-style histogram: a value x > 0 falls in bucket
+ceil(log_gamma(x)), where gamma = (1 + a) / (1 - a) for a relative accuracy a
+of RELATIVE_ACCURACY, so any quantile read back is within 1% of the true
+value. A bucket is just a counter, which gives the properties the write
+paths need:
+
+- adding or removing a catch is a `$inc` of +1 or -1 on a few counters, so
+  edits and deletes keep the sketch exact (t-digest and KLL can't delete);
+- merging sketches (across lakes, species) is adding counters;
+- size is bounded by the number of distinct buckets, a few hundred at most
+  for realistic weights, temperatures and depths.
+
+Sketches live in the `catch_sketches` collection, one document per user
+(level "user") and one per user, lake and species (level "lake_species"):
+
+    {"_id": {"user_id": ..., "level": "lake_species", "lake": ..., "species": ...},
+     "user_id": ..., "level": ..., "lake": ..., "species": ...,
+     "fish_weight": {"n": 12, "z": 0, "p": {"70": 3, "71": 9}, "m": {}}, ...}
+
+`n` counts values, `z` zeros, `p` and `m` the positive and negative buckets.
+Catches counted in the sketches carry `in_sketch: True`, so the backfill
+migration and the live write paths never count the same catch twice.
+
+The user-level sketch also carries the user's `catch_version`, which every
+catch write increments in the same bulk write as its counters; catch_cache.py
+compares it to tell whether its cached columns are current.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+COLLECTION_NAME = "catch_sketches"
+FIELDS = ("fish_weight", "water_temp", "boat_depth", "bait_depth")
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Magnitudes below this are counted as zero
+MIN_MAGNITUDE = 1e-6
+# Marker on catch documents whose values are in the sketches
+MARKER = "in_sketch"
+# Catch fields needed to add or remove a catch
+PROJECTION = {"user_id": 1, "lake": 1, "species": 1, MARKER: 1, **{field: 1 for field in FIELDS}}
+# Counter on the user-level sketch incremented by every catch write
+VERSION = "catch_version"
+# Set when a user-level sketch is created, so versions counted after a clear never match ones from before it
+EPOCH = "catch_epoch"
+
+
+def bucket_index(magnitude: float) -> int:
+    return math.ceil(math.log(magnitude) / LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """Representative value of a bucket; within RELATIVE_ACCURACY of everything in it"""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def _number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def counters(document: Dict[str, Any]) -> Dict[str, int]:
+    """The counter paths one catch adds to a sketch, e.g. {"fish_weight.n": 1, "fish_weight.p.70": 1}"""
+    paths = {}
+    for field in FIELDS:
+        value = _number(document.get(field))
+        if value is None:
+            continue
+        paths[f"{field}.n"] = 1
+        if abs(value) < MIN_MAGNITUDE:
+            paths[f"{field}.z"] = 1
+        else:
+            paths[f"{field}.{'p' if value > 0 else 'm'}.{bucket_index(abs(value))}"] = 1
+    return paths
+
+
+def user_key(user_id: str) -> Dict[str, Any]:
+    return {"user_id": user_id, "level": "user"}
+
+
+def sketch_keys(document: Dict[str, Any]) -> List[Tuple]:
+    """The sketches a catch belongs to: the user's overall one and its (lake, species) one"""
+    user_id = document["user_id"]
+    return [(user_id, "user", None, None), (user_id, "lake_species", document.get("lake"), document.get("species"))]
+
+
+def write_ops(added: Iterable[Dict[str, Any]] = (), removed: Iterable[Dict[str, Any]] = (),
+              writers: Iterable[str] = ()) -> List[UpdateOne]:
+    """One upsert per touched sketch, with the net counter changes of every added and removed catch.
+
+    Each user in `writers` also gets their catch version bumped, whether or not any counter changed.
+    """
+    changes: Dict[Tuple, Dict[str, int]] = {}
+    for user_id in writers:
+        changes.setdefault((user_id, "user", None, None), {})[VERSION] = 1
+    for documents, sign in ((added, 1), (removed, -1)):
+        for document in documents:
+            paths = counters(document)
+            if not paths:
+                continue
+            for sketch_key in sketch_keys(document):
+                sketch = changes.setdefault(sketch_key, {})
+                for path, count in paths.items():
+                    sketch[path] = sketch.get(path, 0) + sign * count
+
+    operations = []
+    for (user_id, level, lake, species), increments in changes.items():
+        increments = {path: count for path, count in increments.items() if count}
+        if not increments:
+            continue
+        if level == "user":
+            key = user_key(user_id)
+            inserted = {**key, EPOCH: ObjectId()}
+        else:
+            key = inserted = {"user_id": user_id, "level": level, "lake": lake, "species": species}
+        operations.append(UpdateOne({"_id": key}, {"$inc": increments, "$setOnInsert": inserted}, upsert=True))
+    return operations
+
+
+async def apply(db, added: Iterable[Dict[str, Any]] = (), removed: Iterable[Dict[str, Any]] = (),
+                writers: Iterable[str] = ()) -> int:
+    """Add and remove catches from their sketches in one bulk write; returns the sketches touched"""
+    operations = write_ops(added, removed, writers)
+    if operations:
+        await db[COLLECTION_NAME].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def version(db, user_id: str) -> Optional[Tuple[Optional[str], int]]:
+    """A user's (epoch, catch version), or None before their first sketch exists"""
+    sketch = await db[COLLECTION_NAME].find_one({"_id": user_key(user_id)}, {VERSION: 1, EPOCH: 1})
+    if sketch is None:
+        return None
+    epoch = sketch.get(EPOCH)
+    return (str(epoch) if epoch is not None else None, sketch.get(VERSION, 0))
+
+
+async def bump_versions(db, user_ids: Optional[Iterable[str]] = None):
+    """Mark users' catches as changed outside the catch write paths (every user when None)"""
+    query = {"level": "user"} if user_ids is None else \
+        {"_id": {"$in": [user_key(user_id) for user_id in user_ids]}}
+    await db[COLLECTION_NAME].update_many(query, {"$inc": {VERSION: 1}})
+
+
+def merge(sketches: Iterable[Dict[str, Any]], field: str) -> Dict[str, Any]:
+    """Add up one field's counters across sketch documents"""
+    merged = {"n": 0, "z": 0, "p": {}, "m": {}}
+    for sketch in sketches:
+        part = sketch.get(field) or {}
+        merged["n"] += part.get("n", 0)
+        merged["z"] += part.get("z", 0)
+        for side in ("p", "m"):
+            for index, count in (part.get(side) or {}).items():
+                merged[side][index] = merged[side].get(index, 0) + count
+    return merged
+
+
+def positive(sketch: Dict[str, Any]) -> Dict[str, Any]:
+    """Only the positive values of a merged sketch, e.g. to match statistics that skip zero and negative weights"""
+    return {"n": sum(sketch["p"].values()), "z": 0, "p": dict(sketch["p"]), "m": {}}
+
+
+def quantiles(sketch: Dict[str, Any], qs: Iterable[float]) -> List[Optional[float]]:
+    """Values at each quantile q in [0, 1], within RELATIVE_ACCURACY; None for an empty sketch"""
+    # Buckets in ascending value order: most negative first, then zero, then positives
+    ordered = [(-bucket_value(int(index)), count) for index, count in
+               sorted(sketch["m"].items(), key=lambda item: -int(item[0])) if count > 0]
+    if sketch["z"] > 0:
+        ordered.append((0.0, sketch["z"]))
+    ordered.extend((bucket_value(int(index)), count) for index, count in
+                   sorted(sketch["p"].items(), key=lambda item: int(item[0])) if count > 0)
+    total = sum(count for _, count in ordered)
+
+    results = []
+    for q in qs:
+        if total == 0:
+            results.append(None)
+            continue
+        rank = q * (total - 1)
+        seen = 0
+        for value, count in ordered:
+            seen += count
+            if seen > rank:
+                results.append(round(value, 3))
+                break
+    return results
@@ -0,0 +1,251 @@
+"""
+Slow-query log with automatic explain capture.
+
+A pymongo CommandListener times every find and aggregate. Commands slower than
+SLOW_QUERY_THRESHOLD_MS are recorded with their redacted filter or pipeline and
+the route that issued them. A sample of them (SLOW_QUERY_EXPLAIN_SAMPLE_RATE)
+is re-run as explain("executionStats") in the background. Entries go to a
+capped collection that the admin `/admin/slow-queries` endpoint reads.
+
+Listener callbacks run on Motor's executor threads, so entries are handed to
+the event loop and written by a single background task.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_LOG_SIZE_BYTES = int(os.environ.get("SLOW_QUERY_LOG_SIZE_BYTES", str(16 * 1024 * 1024)))
+COLLECTION_NAME = "slow_queries"
+MONITORED_COMMANDS = {"find", "aggregate"}
+# Stages whose values are structural (projections, sort keys, accumulators) rather than user data
+STRUCTURAL_STAGES = {"$project", "$addFields", "$set", "$group", "$sort", "$limit", "$skip", "$unwind",
+                     "$count", "$bucket", "$bucketAuto", "$setWindowFields", "$facet", "$lookup", "$unset"}
+
+SLOW_QUERIES = metrics.REGISTRY.counter(
+    "mongo_slow_queries_total", "MongoDB find/aggregate commands slower than the slow-query threshold",
+    ("command", "route"))
+SLOW_QUERIES_DROPPED = metrics.REGISTRY.counter(
+    "mongo_slow_queries_dropped_total", "Slow-query log entries dropped because the write queue was full")
+
+
+def redact(value: Any, literals_only: bool = False) -> Any:
+    """Replace literal values with "?" while keeping field names, operators and $field references.
+
+    With literals_only, numbers and booleans are kept (they are structure in
+    $project, $sort and accumulators) and only strings are redacted.
+    """
+    if isinstance(value, dict):
+        return {key: redact(item, literals_only) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, literals_only) for item in value]
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    if literals_only and (value is None or isinstance(value, (bool, int, float))):
+        return value
+    return "?"
+
+
+def redact_pipeline(pipeline) -> list:
+    redacted = []
+    for stage in pipeline or []:
+        redacted.append({
+            name: redact(body, literals_only=name in STRUCTURAL_STAGES)
+            for name, body in stage.items()
+        })
+    return redacted
+
+
+def _explainable(command_name: str, command) -> Dict[str, Any]:
+    """The parts of a find/aggregate command needed to re-run it under explain"""
+    if command_name == "find":
+        keys = ("find", "filter", "sort", "projection", "skip", "limit", "hint", "collation")
+    else:
+        keys = ("aggregate", "pipeline", "hint", "collation")
+    explainable = {key: command[key] for key in keys if key in command}
+    if command_name == "aggregate":
+        explainable["cursor"] = {}
+    return explainable
+
+
+def _explain_summary(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the parts of an executionStats explain worth reading: plan shape and work done"""
+    query_planner = explain.get("queryPlanner") or {}
+    execution_stats = explain.get("executionStats") or {}
+    if not query_planner and explain.get("stages"):
+        # Aggregations wrap the cursor stage explain in the first pipeline stage
+        cursor = explain["stages"][0].get("$cursor", {})
+        query_planner = cursor.get("queryPlanner") or {}
+        execution_stats = cursor.get("executionStats") or {}
+
+    stages = []
+    plan = query_planner.get("winningPlan") or {}
+    while plan:
+        stages.append(plan.get("stage") or plan.get("queryPlan", {}).get("stage"))
+        plan = plan.get("inputStage") or plan.get("queryPlan", {}).get("inputStage")
+    return {
+        "winning_plan": [stage for stage in stages if stage],
+        "n_returned": execution_stats.get("nReturned"),
+        "execution_time_ms": execution_stats.get("executionTimeMillis"),
+        "total_keys_examined": execution_stats.get("totalKeysExamined"),
+        "total_docs_examined": execution_stats.get("totalDocsExamined"),
+    }
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Times find/aggregate commands and queues the slow ones for the background writer"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+                 explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self._loop = loop
+        self._queue = queue
+
+    def unbind(self):
+        self._loop = None
+        self._queue = None
+
+    def started(self, event):
+        if self._loop is None or event.command_name not in MONITORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == COLLECTION_NAME:
+            return
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = {
+                "database": event.database_name,
+                "collection": collection,
+                "command": _explainable(event.command_name, event.command),
+                "route": metrics.current_route.get(),
+            }
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        if event.command_name not in MONITORED_COMMANDS:
+            return
+        with self._lock:
+            pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        command = pending["command"]
+        entry = {
+            "recorded_at": datetime.utcnow(),
+            "command": event.command_name,
+            "database": pending["database"],
+            "collection": pending["collection"],
+            "route": pending["route"],
+            "duration_ms": round(duration_ms, 2),
+            "failed": failed,
+        }
+        if event.command_name == "find":
+            entry["filter"] = redact(command.get("filter", {}))
+            if "sort" in command:
+                entry["sort"] = redact(command["sort"], literals_only=True)
+        else:
+            entry["pipeline"] = redact_pipeline(command.get("pipeline"))
+        explain_command = command if not failed and random.random() < self.explain_sample_rate else None
+
+        SLOW_QUERIES.inc(command=event.command_name, route=pending["route"] or "")
+        loop, queue = self._loop, self._queue
+        if loop is not None:
+            loop.call_soon_threadsafe(self._enqueue, queue, (entry, explain_command))
+
+    @staticmethod
+    def _enqueue(queue: asyncio.Queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            SLOW_QUERIES_DROPPED.inc()
+
+
+LISTENER = SlowQueryListener()
+_writer_task: Optional[asyncio.Task] = None
+
+
+async def _ensure_collection(db):
+    try:
+        await db.create_collection(COLLECTION_NAME, capped=True, size=SLOW_QUERY_LOG_SIZE_BYTES)
+    except CollectionInvalid:
+        pass  # Already exists
+
+
+async def _write_entries(db, queue: asyncio.Queue):
+    collection = db[COLLECTION_NAME]
+    while True:
+        entry, explain_command = await queue.get()
+        try:
+            if explain_command is not None:
+                # Capped collection documents cannot grow, so explain before inserting
+                try:
+                    explain = await db.client[entry["database"]].command(
+                        {"explain": explain_command, "verbosity": "executionStats"}
+                    )
+                    entry["explain"] = _explain_summary(explain)
+                except Exception as e:
+                    entry["explain"] = {"error": str(e)}
+            await collection.insert_one(entry)
+        except Exception:
+            logger.exception("Failed to record slow query")
+
+
+async def start(db):
+    """Create the capped collection and start the background writer"""
+    global _writer_task
+    await _ensure_collection(db)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+    LISTENER.bind(asyncio.get_running_loop(), queue)
+    _writer_task = asyncio.create_task(_write_entries(db, queue))
+
+
+async def stop():
+    global _writer_task
+    LISTENER.unbind()
+    if _writer_task is not None:
+        _writer_task.cancel()
+        _writer_task = None
+
+
+async def query(db, route: Optional[str] = None, command: Optional[str] = None,
+                min_duration_ms: Optional[float] = None, limit: int = 50):
+    """Most recent slow-query entries, newest first"""
+    query_filter: Dict[str, Any] = {}
+    if route:
+        query_filter["route"] = route
+    if command:
+        query_filter["command"] = command
+    if min_duration_ms is not None:
+        query_filter["duration_ms"] = {"$gte": min_duration_ms}
+    entries = []
+    async for entry in db[COLLECTION_NAME].find(query_filter).sort("$natural", -1).limit(limit):
+        entry["_id"] = str(entry["_id"])
+        entries.append(entry)
+    return entries
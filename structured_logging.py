@@ -0,0 +1,161 @@
+"""
+Structured, leveled, non-blocking logging.
+
+configure_logging() routes the root and uvicorn loggers through a QueueHandler,
+so callers on the event loop only enqueue a record; a QueueListener thread does
+the formatting and the stdout write. Records are emitted as one JSON object per
+line carrying the request id and route of the request that logged them.
+
+High-volume per-row debug records (bulk upload rows) are marked with
+`extra={"sample": True}` and only LOG_SAMPLE_RATE of them are kept.
+
+    LOG_LEVEL=INFO          # DEBUG, INFO, WARNING, ERROR
+    LOG_FORMAT=json         # json or text
+    LOG_SAMPLE_RATE=0.01    # fraction of sampled debug records kept
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import metrics
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came from `extra=` and is emitted as a field
+_STANDARD_ATTRIBUTES = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message", "asctime", "request_id", "route", "sample",
+}
+
+_listener: Optional[QueueListener] = None
+
+# Credentials that can ride in a query string (the /events/stream ticket, EventSource can't send headers)
+_SECRET_QUERY = re.compile(r"([?&](?:token|ticket)=)[^&\s]*")
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id and route; runs in the calling thread, where the contextvars are set"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        record.route = metrics.current_route.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only `rate` of the records logged with extra={"sample": True}"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, "sample", False):
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "route", None):
+            entry["route"] = record.route
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+class RedactQueryFilter(logging.Filter):
+    """Mask token and ticket query parameters in the path of uvicorn access records"""
+
+    def filter(self, record):
+        args = record.args
+        if record.name == "uvicorn.access" and isinstance(args, tuple) and len(args) >= 3 and isinstance(args[2], str):
+            record.args = args[:2] + (_SECRET_QUERY.sub(r"\1[redacted]", args[2]),) + args[3:]
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Defer all formatting to the listener thread except what must be captured now"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks reference live frames; render them before the record leaves this thread
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None,
+                      sample_rate: Optional[float] = None):
+    """Install the queue-backed handler on the root and uvicorn loggers (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.environ.get("LOG_FORMAT", "json")).lower()
+    sample_rate = float(sample_rate if sample_rate is not None else os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    queue_handler = _NonBlockingQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RedactQueryFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    # uvicorn installs its own synchronous stream handlers before importing the app
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = [queue_handler]
+        uvicorn_logger.propagate = False
+
+    _listener = QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,322 @@
+"""
+Seeded synthetic dataset generator for BiteTracker.
+
+Builds N users x M catches with realistic distributions over lakes, baits,
+species, DMS locations, dates and times. The same seed always produces the
+same dataset, so benchmark runs at a given scale are comparable. Used by the
+admin `/sample-data/` endpoint and by `tools/generate_sample_data.py`.
+"""
+
+import asyncio
+import math
+import random
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+import catch_sync
+import leaderboards
+import sketches
+
+# --- Reference data ---
+# (name, latitude, longitude, relative popularity)
+LAKES: List[Tuple[str, float, float, float]] = [
+    ("Hartbeespoort", -25.7450, 27.8560, 10.0),
+    ("Vaal Dam", -26.8730, 28.1700, 8.0),
+    ("Loskop Dam", -25.4170, 29.3670, 6.0),
+    ("Bronkhorstspruit", -25.8900, 28.7400, 5.0),
+    ("Roodeplaat", -25.6220, 28.3580, 5.0),
+    ("Witbank Dam", -25.8870, 29.3000, 4.0),
+    ("Sterkfontein", -28.4170, 29.0330, 3.0),
+    ("Albert Falls", -29.4330, 30.4170, 3.0),
+    ("Lake Serene", -24.8450, 29.4380, 2.0),
+    ("Lake Clearwater", -24.8250, 29.4530, 1.5),
+]
+
+# (species, relative frequency, median weight kg, log-normal sigma)
+SPECIES: List[Tuple[str, float, float, float]] = [
+    ("Largemouth Bass", 60.0, 1.1, 0.55),
+    ("Smallmouth Bass", 12.0, 0.8, 0.45),
+    ("Tiger Fish", 8.0, 1.6, 0.60),
+    ("Sharptooth Catfish", 8.0, 3.2, 0.70),
+    ("Carp", 7.0, 3.5, 0.65),
+    ("Yellowfish", 5.0, 1.4, 0.50),
+]
+
+# (bait, bait_type, colours, relative popularity)
+BAITS: List[Tuple[str, str, List[str], float]] = [
+    ("Senko", "Soft Plastic", ["Green Pumpkin", "Watermelon", "Black/Blue"], 12.0),
+    ("Texas Rig Worm", "Soft Plastic", ["Junebug", "Green Pumpkin", "Plum"], 10.0),
+    ("Crankbait", "Hard", ["Chartreuse", "Sexy Shad", "Red Craw"], 8.0),
+    ("Spinnerbait", "Wire", ["White", "Chartreuse/White", "Gold"], 7.0),
+    ("Jig", "Jig", ["Black/Blue", "Green Pumpkin", "Brown"], 7.0),
+    ("Chatterbait", "Wire", ["White", "Green Pumpkin"], 5.0),
+    ("Drop Shot", "Finesse", ["Morning Dawn", "Watermelon"], 5.0),
+    ("Jerkbait", "Hard", ["Ghost Minnow", "Clown"], 4.0),
+    ("Topwater Frog", "Topwater", ["Black", "White", "Green"], 4.0),
+    ("Swimbait", "Soft Plastic", ["Shad", "Bluegill"], 3.0),
+]
+
+STRUCTURES = ["Weeds", "Rocky Point", "Drop Off", "Submerged Timber", "Reeds",
+              "Dam Wall", "Channel Edge", "Flat", "Rock Pile", "Point"]
+WATER_QUALITIES = ["Clear", "Stained", "Murky"]
+# (line type, typical line weights in lb)
+LINE_TYPES: List[Tuple[str, List[float]]] = [
+    ("Braid", [20.0, 30.0, 40.0, 50.0]),
+    ("Fluorocarbon", [8.0, 10.0, 12.0, 15.0]),
+    ("Monofilament", [8.0, 10.0, 12.0, 17.0]),
+]
+HOOK_SIZES = ["1", "1/0", "2/0", "3/0", "4/0", "5/0"]
+COMMENTS = [None, None, None, "Good Fight", "Slow retrieve", "Followed twice",
+            "Caught near the edge", "Big one!", "Windy conditions"]
+
+SYNTHETIC_USERNAME_PREFIX = "synthetic_user_"
+
+
+def _cumulative(weights: List[float]) -> List[float]:
+    total = 0.0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+_LAKE_CUM = _cumulative([lake[3] for lake in LAKES])
+_SPECIES_CUM = _cumulative([species[1] for species in SPECIES])
+_BAIT_CUM = _cumulative([bait[3] for bait in BAITS])
+
+
+def format_dms(latitude: float, longitude: float) -> str:
+    """Format decimal coordinates as the DMS string used by the frontend, e.g. 24°50'42"S 29°26'16"E"""
+    def part(value: float, positive: str, negative: str) -> str:
+        hemisphere = positive if value >= 0 else negative
+        value = abs(value)
+        degrees = int(value)
+        minutes_float = (value - degrees) * 60
+        minutes = int(minutes_float)
+        seconds = int(round((minutes_float - minutes) * 60))
+        if seconds == 60:
+            minutes, seconds = minutes + 1, 0
+        if minutes == 60:
+            degrees, minutes = degrees + 1, 0
+        return f"{degrees}°{minutes:02d}'{seconds:02d}\"{hemisphere}"
+
+    return f"{part(latitude, 'N', 'S')} {part(longitude, 'E', 'W')}"
+
+
+def _season_weight(day: date) -> float:
+    """Relative fishing activity by day of year (southern hemisphere, peaks in spring/summer)"""
+    return 1.0 + 0.6 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 340) / 365.0)
+
+
+def _random_time(rng: random.Random) -> str:
+    """Catch time with dawn and dusk peaks plus a uniform background"""
+    roll = rng.random()
+    if roll < 0.4:
+        hour = rng.gauss(6.5, 1.2)
+    elif roll < 0.75:
+        hour = rng.gauss(17.5, 1.3)
+    else:
+        hour = rng.uniform(0, 24)
+    seconds = int((hour % 24) * 3600)
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+class CatchGenerator:
+    """Generates catch documents for one angler.
+
+    Each angler gets a deterministic random stream derived from the dataset seed
+    and their index, along with a few favourite lakes and baits, so catches are
+    skewed the way real logs are and batches can be produced in any order.
+    """
+
+    def __init__(self, seed: int, user_index: int, start_date: date, end_date: date):
+        self.rng = random.Random(f"{seed}:{user_index}")
+        self.start_date = start_date
+        self.span_days = max((end_date - start_date).days, 1)
+        self.favourite_lakes = [self._pick(LAKES, _LAKE_CUM) for _ in range(self.rng.randint(1, 3))]
+        self.favourite_baits = [self._pick(BAITS, _BAIT_CUM) for _ in range(self.rng.randint(2, 4))]
+        self.line_type, self.line_weights = self.rng.choice(LINE_TYPES)
+
+    def _pick(self, items, cumulative):
+        return self.rng.choices(items, cum_weights=cumulative)[0]
+
+    def _random_date(self) -> date:
+        # Rejection-sample against the seasonal activity curve
+        while True:
+            day = self.start_date + timedelta(days=self.rng.randrange(self.span_days))
+            if self.rng.random() * 1.6 <= _season_weight(day):
+                return day
+
+    def catch(self) -> Dict[str, Any]:
+        rng = self.rng
+        lake_name, lake_lat, lake_lon, _ = (
+            rng.choice(self.favourite_lakes) if rng.random() < 0.8 else self._pick(LAKES, _LAKE_CUM)
+        )
+        bait, bait_type, colours, _ = (
+            rng.choice(self.favourite_baits) if rng.random() < 0.7 else self._pick(BAITS, _BAIT_CUM)
+        )
+        species, _, median_weight, sigma = self._pick(SPECIES, _SPECIES_CUM)
+        day = self._random_date()
+        water_temp = 21.0 + 6.0 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 15) / 365.0) + rng.gauss(0, 1.5)
+        boat_depth = min(max(rng.lognormvariate(math.log(4.0), 0.6), 0.5), 40.0)
+
+        return {
+            "date": day.isoformat(),
+            "time": _random_time(rng),
+            "location": format_dms(lake_lat + rng.uniform(-0.03, 0.03), lake_lon + rng.uniform(-0.03, 0.03)),
+            "lake": lake_name,
+            "structure": rng.choice(STRUCTURES),
+            "water_temp": round(water_temp, 1),
+            "water_quality": rng.choices(WATER_QUALITIES, weights=[5, 3, 2])[0],
+            "line_type": self.line_type,
+            "boat_depth": round(boat_depth, 1),
+            "bait_depth": round(boat_depth * rng.uniform(0.1, 1.0), 1),
+            "bait": bait,
+            "bait_type": bait_type,
+            "bait_colour": rng.choice(colours),
+            "scented": rng.random() < 0.35,
+            "fish_weight": round(max(rng.lognormvariate(math.log(median_weight), sigma), 0.05), 2),
+            "species": species,
+            "line_weight": rng.choice(self.line_weights),
+            "weight_pegged": rng.random() < 0.5,
+            "hook_size": rng.choice(HOOK_SIZES),
+            "comments": rng.choice(COMMENTS),
+        }
+
+
+def synthetic_username(user_index: int) -> str:
+    return f"{SYNTHETIC_USERNAME_PREFIX}{user_index:06d}"
+
+
+def generate_catch_batches(
+    user_ids: List[str],
+    catches_per_user: int,
+    seed: int,
+    batch_size: int,
+    start_date: date,
+    end_date: date,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of catch documents, at most batch_size long, for every user in turn"""
+    batch: List[Dict[str, Any]] = []
+    updated_at = catch_sync.now()
+    for user_index, user_id in enumerate(user_ids):
+        generator = CatchGenerator(seed, user_index, start_date, end_date)
+        for _ in range(catches_per_user):
+            catch = generator.catch()
+            catch["user_id"] = user_id
+            catch["synthetic"] = True
+            catch[sketches.MARKER] = True
+            catch["updated_at"] = updated_at
+            batch.append(catch)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+async def clear_synthetic_data(db) -> Dict[str, int]:
+    """Remove every synthetic user and catch, leaving real data untouched"""
+    # Catches created through the API by synthetic users (e.g. during load tests) lack the flag
+    user_ids = [str(user["_id"]) async for user in db.users.find({"synthetic": True}, {"_id": 1})]
+    catches = await db.catches.delete_many({"$or": [{"synthetic": True}, {"user_id": {"$in": user_ids}}]})
+    users = await db.users.delete_many({"synthetic": True})
+    await db[sketches.COLLECTION_NAME].delete_many({"user_id": {"$in": user_ids}})
+    await catch_sync.record_reset(db, user_ids)
+    await leaderboards.remove_users(db, user_ids)
+    return {"catches_deleted": catches.deleted_count, "users_deleted": users.deleted_count}
+
+
+async def ensure_synthetic_users(db, users: int, hashed_password: str) -> List[str]:
+    """Upsert the synthetic users and return their ids in index order"""
+    usernames = [synthetic_username(i) for i in range(users)]
+    created_at = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"username": username},
+            {"$setOnInsert": {
+                "username": username,
+                "email": f"{username}@example.invalid",
+                "full_name": f"Synthetic Angler {i}",
+                "hashed_password": hashed_password,
+                "created_at": created_at,
+                "is_active": True,
+                "synthetic": True,
+            }},
+            upsert=True,
+        )
+        for i, username in enumerate(usernames)
+    ]
+    for start in range(0, len(operations), 1000):
+        await db.users.bulk_write(operations[start:start + 1000], ordered=False)
+
+    ids_by_username = {}
+    async for user in db.users.find({"username": {"$in": usernames}}, {"username": 1}):
+        ids_by_username[user["username"]] = str(user["_id"])
+    return [ids_by_username[username] for username in usernames]
+
+
+async def seed_dataset(
+    db,
+    users: int,
+    catches_per_user: int,
+    hashed_password: str,
+    seed: int = 42,
+    batch_size: int = 5000,
+    concurrency: int = 4,
+    clear: bool = False,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> Dict[str, Any]:
+    """Create users x catches_per_user synthetic catches using parallel insert_many batches.
+
+    At most `concurrency` batches are generated ahead of the database, so memory
+    stays bounded by batch_size * concurrency documents regardless of dataset size.
+    """
+    end_date = end_date or date(2024, 12, 31)
+    start_date = start_date or end_date - timedelta(days=3 * 365)
+    started = datetime.utcnow()
+
+    cleared = await clear_synthetic_data(db) if clear else None
+    user_ids = await ensure_synthetic_users(db, users, hashed_password)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    inserted = 0
+
+    async def insert_batch(batch):
+        nonlocal inserted
+        try:
+            result = await db.catches.insert_many(batch, ordered=False)
+            inserted += len(result.inserted_ids)
+            await sketches.apply(db, added=batch)
+        finally:
+            semaphore.release()
+
+    # Only batches still in flight are kept, so a large dataset doesn't pile up finished tasks
+    tasks: Set[asyncio.Task] = set()
+    failures: List[BaseException] = []
+
+    def finished(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            failures.append(task.exception())
+
+    for batch in generate_catch_batches(user_ids, catches_per_user, seed, batch_size, start_date, end_date):
+        await semaphore.acquire()
+        task = asyncio.create_task(insert_batch(batch))
+        tasks.add(task)
+        task.add_done_callback(finished)
+    await asyncio.gather(*tasks)
+    if failures:
+        raise failures[0]
+
+    return {
+        "users": len(user_ids),
+        "catches_inserted": inserted,
+        "seed": seed,
+        "cleared": cleared,
+        "seconds": round((datetime.utcnow() - started).total_seconds(), 2),
+    }
@@ -0,0 +1,181 @@
+"""
+Clearing data takes users off every leaderboard.
+
+Runs against a small in-memory stand-in for the few MongoDB calls involved,
+so no mongod is needed.
+"""
+
+import asyncio
+import os
+import re
+import sys
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import leaderboards  # noqa: E402
+import main  # noqa: E402
+import synthetic_data  # noqa: E402
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, option) for option in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            for operator, argument in condition.items():
+                if operator == "$in" and value not in argument:
+                    return False
+                if operator == "$nin" and value in argument:
+                    return False
+                if operator == "$ne" and value == argument:
+                    return False
+                if operator == "$gt" and not (value is not None and value > argument):
+                    return False
+                if operator == "$lt" and not (value is not None and value < argument):
+                    return False
+                if operator == "$regex" and not (isinstance(value, str) and re.search(argument, value)):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def skip(self, count):
+        self.documents = self.documents[count:]
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.documents)
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self.documents:
+                yield document
+        return iterate()
+
+
+class Result:
+    def __init__(self, **counts):
+        self.__dict__.update(counts)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.documents = []
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([dict(document) for document in self.documents if matches(document, query or {})])
+
+    async def find_one(self, query, projection=None):
+        found = [document for document in self.documents if matches(document, query)]
+        return dict(found[0]) if found else None
+
+    async def count_documents(self, query):
+        return sum(1 for document in self.documents if matches(document, query))
+
+    async def distinct(self, field):
+        return list({document[field] for document in self.documents if field in document})
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(documents)
+
+    async def delete_many(self, query):
+        kept = [document for document in self.documents if not matches(document, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return Result(deleted_count=deleted)
+
+    async def update_many(self, query, update):
+        return Result(modified_count=0)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name)
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+def seed_boards(db, user_ids):
+    entries = db[leaderboards.COLLECTION_NAME]
+    for rank, user_id in enumerate(user_ids):
+        for board, score in (("points", 100 - rank), ("catch_count", 10 - rank),
+                             (leaderboards.heaviest_board("Tiger Fish"), 5.0 - rank)):
+            entries.documents.append({"_id": {"board": board, "user_id": user_id}, "board": board,
+                                      "user_id": user_id, "score": score})
+
+
+async def board_user_ids(db):
+    on_boards = set()
+    for board in await leaderboards.boards(db):
+        on_boards.update(entry["user_id"] for entry in await leaderboards.page(db, board, 0, 20))
+    return on_boards
+
+
+def test_clear_synthetic_data_removes_synthetic_users_from_every_board(monkeypatch):
+    monkeypatch.setattr(leaderboards, "_top", {})
+
+    async def scenario():
+        db = FakeDatabase()
+        synthetic = [ObjectId(), ObjectId()]
+        real = str(ObjectId())
+        db.users.documents = [{"_id": user_id, "synthetic": True} for user_id in synthetic]
+        seed_boards(db, [str(user_id) for user_id in synthetic] + [real])
+        # Load the in-memory tops first, so they have to be updated too
+        assert await board_user_ids(db) == {str(user_id) for user_id in synthetic} | {real}
+
+        await synthetic_data.clear_synthetic_data(db)
+
+        assert await board_user_ids(db) == {real}
+        for user_id in synthetic:
+            assert await leaderboards.rank(db, "points", str(user_id)) is None
+
+    asyncio.run(scenario())
+
+
+def test_clear_all_data_empties_catch_boards_and_keeps_points(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(main, "db", db)
+    monkeypatch.setattr(main, "catches_collection", db.catches)
+    monkeypatch.setattr(leaderboards, "_top", {})
+
+    async def scenario():
+        user_ids = [str(ObjectId()) for _ in range(3)]
+        seed_boards(db, user_ids)
+        assert len(await board_user_ids(db)) == 3
+
+        await main.clear_all_data()
+
+        # Achievements survive a clear, so the points board does too
+        points = await leaderboards.page(db, "points", 0, 20)
+        assert [entry["user_id"] for entry in points] == user_ids
+        assert await leaderboards.page(db, "catch_count", 0, 20) == []
+        assert await leaderboards.boards(db) == list(leaderboards.FIXED_BOARDS)
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import os
+import sys
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic_data  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic BiteTracker dataset")
+    parser.add_argument("--users", type=int, default=100, help="Number of synthetic users")
+    parser.add_argument("--catches-per-user", type=int, default=1000, help="Catches generated per user")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (same seed, same dataset)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many call")
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--password", default="sample-password", help="Password for every synthetic user")
+    parser.add_argument("--clear", action="store_true", help="Remove existing synthetic users and catches first")
+    args = parser.parse_args()
+
+    # Load environment
+    env_file = ".env.local" if os.path.exists(".env.local") else ".env"
+    load_dotenv(env_file)
+
+    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    db_name = os.getenv("DB_NAME", "bite_tracker_db")
+
+    # Hash once: bcrypt per user would dominate seeding time
+    hashed_password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(args.password)
+
+    async def run():
+        client = AsyncIOMotorClient(mongo_uri)
+        try:
+            return await synthetic_data.seed_dataset(
+                client[db_name],
+                users=args.users,
+                catches_per_user=args.catches_per_user,
+                hashed_password=hashed_password,
+                seed=args.seed,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                clear=args.clear,
+            )
+        finally:
+            client.close()
+
+    result = asyncio.run(run())
+    if result["cleared"]:
+        print(f"Cleared {result['cleared']['catches_deleted']} catches and {result['cleared']['users_deleted']} users")
+    print(f"Inserted {result['catches_inserted']} catches for {result['users']} users in {result['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import os
+import sys
+import asyncio
+import logging
+import argparse
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import migrations  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Apply pending BiteTracker data migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="List migrations and their recorded state")
+    run_parser = subparsers.add_parser("run", help="Apply pending migrations in order (resumes stopped runs)")
+    run_parser.add_argument("--target", help="Stop after this migration version")
+    run_parser.add_argument("--batch-size", type=int, default=migrations.DEFAULT_BATCH_SIZE,
+                            help="Documents per _id-range batch")
+    run_parser.add_argument("--pause-ms", type=float, default=migrations.DEFAULT_PAUSE_MS,
+                            help="Pause between batches to leave headroom for live traffic")
+    run_parser.add_argument("--max-batches", type=int,
+                            help="Stop each migration after this many batches; the next run resumes from there")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Load environment
+    env_file = ".env.local" if os.path.exists(".env.local") else ".env"
+    load_dotenv(env_file)
+
+    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    db_name = os.getenv("DB_NAME", "bite_tracker_db")
+
+    async def run():
+        client = AsyncIOMotorClient(mongo_uri)
+        try:
+            db = client[db_name]
+            if args.command == "status":
+                return await migrations.status(db)
+            return await migrations.run_pending(db, target=args.target, batch_size=args.batch_size,
+                                                pause_ms=args.pause_ms, max_batches=args.max_batches)
+        finally:
+            client.close()
+
+    try:
+        results = asyncio.run(run())
+    except migrations.MigrationError as e:
+        print(f"Migration failed: {e}")
+        return 1
+    except KeyboardInterrupt:
+        print("Stopped; run again to resume from the last checkpoint")
+        return 130
+
+    for result in results:
+        print(f"{result['version']:<36}{result['status']:<10}"
+              f"{result['processed']:>10} processed{result['modified']:>10} modified")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())